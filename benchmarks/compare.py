@@ -0,0 +1,88 @@
+'''
+compare.py
+
+Compares two files of results from run.py -- say, one from before a change and
+one from after -- and flags every case that got slower, or used more memory, by
+more than a given share.
+
+Timings are noisy: another program on the machine, or the processor slowing
+down to stay cool, can make a run a few percent slower for no reason at all.
+So where a file has several runs of the same case at the same size (run.py
+--repeat), the fastest time and smallest peak memory are used, since noise
+only ever makes things slower. Even so, differences smaller than about ten
+percent are best checked by running again.
+
+Usage:
+
+    python compare.py before.jsonl after.jsonl --tolerance 0.1
+
+It exits with status 1 if anything got worse by more than the tolerance, so
+it can be used to fail an automated build.
+'''
+import json
+import sys
+
+# How much worse (as a share: 0.1 is ten percent) a result can be before it's
+# flagged
+TOLERANCE = 0.1
+
+def read_results(path):
+    """
+    Reads a file of results into a dict of {(case, rows): (seconds, peak_kb)},
+    keeping the best of any repeated runs.
+    """
+    best = {}
+    with open(path) as f:
+        for line in f:
+            if not line.strip(): continue
+            result = json.loads(line)
+            key = (result['case'], result['rows'])
+            peak = max(result['peak_kb'], result.get('children_peak_kb', 0))
+            if key in best:
+                seconds, kb = best[key]
+                best[key] = (min(seconds, result['seconds']), min(kb, peak))
+            else:
+                best[key] = (result['seconds'], peak)
+    return best
+
+def change(old, new):
+    """
+    The change from old to new as a share of old.
+    """
+    if old == 0: return 0.0
+    return (new - old) / float(old)
+
+def main(old_path, new_path, tolerance=TOLERANCE, output=sys.stdout):
+    """
+    Prints a line comparing each case and size found in both files, and returns
+    the number of them that got worse by more than the tolerance.
+    """
+    old = read_results(old_path)
+    new = read_results(new_path)
+    worse = 0
+    output.write('%-24s %10s %10s %10s %8s %10s %10s %8s\n' % ('case', 'rows',
+        'old s', 'new s', 'time', 'old KB', 'new KB', 'memory'))
+    for key in sorted(set(old) & set(new)):
+        (old_seconds, old_kb), (new_seconds, new_kb) = old[key], new[key]
+        time_change = change(old_seconds, new_seconds)
+        memory_change = change(old_kb, new_kb)
+        flag = ''
+        if time_change > tolerance or memory_change > tolerance:
+            flag = '  WORSE'
+            worse += 1
+        output.write('%-24s %10d %10.3f %10.3f %+7.1f%% %10d %10d %+7.1f%%%s\n' % (key[0], key[1],
+            old_seconds, new_seconds, 100 * time_change, old_kb, new_kb, 100 * memory_change, flag))
+    for key in sorted(set(old) ^ set(new)):
+        output.write('%-24s %10d   only in %s\n' % (key[0], key[1], key in old and old_path or new_path))
+    return worse
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog OLD NEW [options]')
+    parser.add_option('--tolerance', type='float', default=TOLERANCE,
+        help='Flag results this much worse, as a share (default: %default)')
+    (options, args) = parser.parse_args()
+    if len(args) != 2:
+        parser.error('two results files are required')
+    if main(args[0], args[1], options.tolerance):
+        sys.exit(1)
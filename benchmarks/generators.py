@@ -0,0 +1,126 @@
+'''
+generators.py
+
+Seeded generators of synthetic data for the benchmarks in run.py, one for each
+kind of data the algorithms in this toolkit work on:
+
+* blobs: points scattered around a few centers, for k-means and kNN
+* geo_points: latitude/longitude points bunched around a few cities, with
+  some scattered noise, for DBSCAN
+* categorical_table: rows of categorical values whose distribution depends on
+  the row's class, for Naive Bayes and decision trees
+* zipf_text: documents whose words follow Zipf's law -- a few words are very
+  common and most are rare, as in real text -- for the MapReduce workflow
+
+Every generator takes a seed, and the same seed always gives the same data,
+so two benchmark runs measure exactly the same work. They're all generators in
+the Python sense too, yielding one row at a time, so millions of rows can be
+written straight to a file without being held in memory.
+
+More on Zipf's law: http://en.wikipedia.org/wiki/Zipf%27s_law
+
+Data can also be written out from the command line, for example:
+
+    python generators.py zipf --rows 1000000 --seed 1 -o corpus.txt
+'''
+import csv
+import sys
+from bisect import bisect_right
+from random import Random
+
+# (latitude, longitude) of the cities geo_points bunches its points around
+CITIES = [(37.77, -122.42), (34.05, -118.24), (38.58, -121.49), (32.72, -117.16),
+          (36.74, -119.79)]
+
+def blobs(n, dims=2, centers=5, spread=1.0, seed=0):
+    """
+    Yields n (center, point) pairs: points drawn from a normal distribution
+    around one of the centers, which are themselves placed at random in a box
+    from -10 to 10 on every axis. The center number works as a class label.
+    """
+    rng = Random(seed)
+    middles = [[rng.uniform(-10, 10) for d in range(dims)] for c in range(centers)]
+    for i in xrange(n):
+        c = rng.randrange(centers)
+        yield c, [rng.gauss(x, spread) for x in middles[c]]
+
+def geo_points(n, spread=0.05, noise=0.1, seed=0):
+    """
+    Yields n [latitude, longitude] points. Most fall within about spread
+    degrees of one of the CITIES; a share of them (noise) are scattered
+    anywhere in the box around the cities instead.
+    """
+    rng = Random(seed)
+    lats = [lat for (lat, lon) in CITIES]
+    lons = [lon for (lat, lon) in CITIES]
+    for i in xrange(n):
+        if rng.random() < noise:
+            yield [rng.uniform(min(lats), max(lats)), rng.uniform(min(lons), max(lons))]
+        else:
+            lat, lon = CITIES[rng.randrange(len(CITIES))]
+            yield [rng.gauss(lat, spread), rng.gauss(lon, spread)]
+
+def categorical_table(n, columns=4, values=5, classes=3, seed=0):
+    """
+    Yields n rows of the form [class, value, value ...], the way NaiveBayes
+    expects them. Each class has its own favorite value in each column, which
+    it picks half the time; otherwise it picks any value at random. So the
+    columns say something about the class, but not everything.
+    """
+    rng = Random(seed)
+    favorites = [[rng.randrange(values) for col in range(columns)] for c in range(classes)]
+    for i in xrange(n):
+        c = rng.randrange(classes)
+        row = ['class%d' % c]
+        for col in range(columns):
+            if rng.random() < 0.5:
+                row.append('v%d' % favorites[c][col])
+            else:
+                row.append('v%d' % rng.randrange(values))
+        yield row
+
+def zipf_text(n, vocabulary=10000, length=100, exponent=1.1, seed=0):
+    """
+    Yields n documents as docid|text lines, the input format of
+    inv-index-mapper.py. Each document has length words, and the word of rank r
+    (word w0 being the most common) is picked with a probability proportional
+    to 1 / r ** exponent.
+    """
+    rng = Random(seed)
+    cumulative = []
+    total = 0.0
+    for r in range(1, vocabulary + 1):
+        total += 1.0 / r ** exponent
+        cumulative.append(total)
+    for i in xrange(n):
+        words = ['w%d' % bisect_right(cumulative, rng.random() * total) for j in range(length)]
+        yield 'doc%d|%s' % (i, ' '.join(words))
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog (blobs|geo|categorical|zipf) [options]')
+    parser.add_option('--rows', type='int', default=1000,
+        help='Number of rows (or documents) to generate (default: %default)')
+    parser.add_option('--seed', type='int', default=0,
+        help='Random seed (default: %default)')
+    parser.add_option('-o', '--output', metavar='FILE',
+        help='Write to FILE instead of standard output')
+    (options, args) = parser.parse_args()
+    if len(args) != 1 or args[0] not in ('blobs', 'geo', 'categorical', 'zipf'):
+        parser.error('choose one of blobs, geo, categorical or zipf')
+    output = options.output and open(options.output, 'wb') or sys.stdout
+    try:
+        if args[0] == 'zipf':
+            for line in zipf_text(options.rows, seed=options.seed):
+                output.write(line + '\n')
+        else:
+            writer = csv.writer(output)
+            if args[0] == 'blobs':
+                for (c, point) in blobs(options.rows, seed=options.seed):
+                    writer.writerow(point + ['center%d' % c])
+            elif args[0] == 'geo':
+                writer.writerows(geo_points(options.rows, seed=options.seed))
+            else:
+                writer.writerows(categorical_table(options.rows, seed=options.seed))
+    finally:
+        if options.output: output.close()
@@ -0,0 +1,289 @@
+'''
+run.py
+
+Times the algorithms in this toolkit on synthetic data of growing size, and
+records how long each took and how much memory it used, so changes can be
+checked for speedups -- or slowdowns -- with compare.py.
+
+Each benchmark (a "case") runs in a fresh Python process, for two reasons: a
+process's peak memory use can only go up, so cases run one after another in
+one process would blur together; and a fresh process starts every case on an
+equal footing, without anything left cached by the one before. The process
+builds the case's data first, notes its peak memory so far, then times the
+work itself.
+
+Results are written one JSON object per line, like:
+
+{"case": "kmeans-cluster", "rows": 10000, "seed": 0, "seconds": 1.92,
+ "setup_peak_kb": 10480, "peak_kb": 11032, "children_peak_kb": 0,
+ "commit": "2fd5881", "python": "2.7.18", "host": "...", "time": "..."}
+
+seconds only covers the work being measured, not building the data.
+peak_kb is the most memory the process ever held at once, setup included, and
+setup_peak_kb the most it held before the work started. children_peak_kb is
+the most any one process it started held, which is where the MapReduce cases
+do their work. Memory is as reported by getrusage
+(http://docs.python.org/library/resource.html), in kilobytes.
+
+Usage:
+
+    python run.py --rows 1000,10000 -o results.jsonl
+    python run.py --case kmeans-cluster --case dbscan-run --rows 100000
+
+Some algorithms are quadratic, and would run for days at ten million rows, so
+each case has a largest size it runs at unless --force is given.
+'''
+import json
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import islice
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# The modules in classify and cluster import their neighbors by name
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'classify'), os.path.join(ROOT, 'cluster'), HERE]
+
+from generators import blobs, geo_points, categorical_table, zipf_text
+
+# The sizes run by default
+DEFAULT_ROWS = [1000, 10000]
+
+# The number of observations classified by the classify cases, however many
+# rows the model was trained on. They're drawn from the same generator, with
+# the same seed, as the training rows -- the rows that come after them -- so
+# they follow the same classes. (A different seed would put the blobs'
+# centers, or each class's favorite values, somewhere else entirely.)
+QUERIES = 1000
+
+# kNN has no model: every query measures its distance to every training row,
+# so 1000 queries at a million rows would take hours. knn-classify uses fewer.
+KNN_QUERIES = 10
+
+def split(rows, queries, generator, **options):
+    """
+    Draws rows + queries rows from one of the generators, and returns them as
+    a list of the first rows and a list of the rest.
+    """
+    data = generator(rows + queries, **options)
+    return list(islice(data, rows)), list(data)
+
+def similarity_case(name):
+    """
+    Builds the setup for timing one of the metrics in similarity.py over
+    rows pairs of 10-dimensional vectors.
+    """
+    def setup(rows, seed, workdir):
+        import similarity.similarity
+        metric = getattr(similarity.similarity, name)
+        points = [point for (c, point) in blobs(2 * rows, dims=10, seed=seed)]
+        pairs = zip(points[0::2], points[1::2])
+        def run():
+            for (v1, v2) in pairs: metric(v1, v2)
+        return run
+    return setup
+
+def knn_classify(rows, seed, workdir):
+    from knn import kNNClassifier
+    train, test = split(rows, KNN_QUERIES, blobs, seed=seed)
+    classifier = kNNClassifier([{'class': c, 'vector': point} for (c, point) in train])
+    queries = [point for (c, point) in test]
+    def run():
+        for query in queries: classifier.classify(query, k=5)
+    return run
+
+def kmeans_cluster(rows, seed, workdir):
+    import random
+    from kmeans import KMeans
+    data = [point for (c, point) in blobs(rows, seed=seed)]
+    def run():
+        random.seed(seed) # KMeans picks its starting points with random
+        KMeans(data).cluster(k=5)
+    return run
+
+def dbscan_run(rows, seed, workdir):
+    from dbscan import DBSCAN
+    data = list(geo_points(rows, seed=seed))
+    def run():
+        DBSCAN(data, 0.05, 5).run()
+    return run
+
+def naivebayes_train(rows, seed, workdir):
+    from naivebayes import NaiveBayes
+    data = list(categorical_table(rows, seed=seed))
+    def run():
+        NaiveBayes(data).train()
+    return run
+
+def naivebayes_classify(rows, seed, workdir):
+    from naivebayes import NaiveBayes
+    train, test = split(rows, QUERIES, categorical_table, seed=seed)
+    model = NaiveBayes(train)
+    model.train()
+    queries = [row[1:] for row in test]
+    def run():
+        for query in queries: model.classify(query)
+    return run
+
+def decisiontree_build(rows, seed, workdir):
+    from decisiontree import buildtree
+    data = [row[1:] + row[:1] for row in categorical_table(rows, seed=seed)]
+    def run():
+        buildtree(data)
+    return run
+
+def decisiontree_classify(rows, seed, workdir):
+    from decisiontree import buildtree, classify
+    train, test = split(rows, QUERIES, categorical_table, seed=seed)
+    tree = buildtree([row[1:] + row[:1] for row in train])
+    queries = [row[1:] for row in test]
+    def run():
+        for query in queries: classify(query, tree)
+    return run
+
+def mapreduce_pairwise(rows, seed, workdir):
+    """
+    The whole pairwise document similarity workflow, run with run-local.py on
+    a corpus of rows documents of 50 words each. Under Zipf's law the most
+    common words are in nearly every document, and every pair of documents
+    sharing them would be scored, so as in any real run of the workflow those
+    words are left out with --max-postings.
+    """
+    path = os.path.join(workdir, 'corpus.txt')
+    with open(path, 'w') as f:
+        for line in zipf_text(rows, length=50, seed=seed):
+            f.write(line + '\n')
+    command = [sys.executable, os.path.join(ROOT, 'mapreduce', 'run-local.py'), '-q',
+               '--max-postings', '100',
+               '--workdir', os.path.join(workdir, 'run'), '-o', os.path.join(workdir, 'pairs.txt'),
+               path]
+    def run():
+        subprocess.check_call(command)
+    return run
+
+# name: (setup function, largest number of rows it runs at without --force)
+CASES = dict([('similarity-%s' % name, (similarity_case(name), 1000000))
+              for name in ('euclidean', 'jaccard', 'hamming', 'pearson', 'cosine')])
+CASES.update({
+    'knn-classify': (knn_classify, 1000000),
+    'kmeans-cluster': (kmeans_cluster, 100000),
+    'dbscan-run': (dbscan_run, 10000),
+    'naivebayes-train': (naivebayes_train, 10000000),
+    'naivebayes-classify': (naivebayes_classify, 10000000),
+    'decisiontree-build': (decisiontree_build, 1000000),
+    'decisiontree-classify': (decisiontree_classify, 1000000),
+    'mapreduce-pairwise': (mapreduce_pairwise, 100000),
+})
+
+def peak_kb(who=resource.RUSAGE_SELF):
+    """
+    The most memory a process has held at once, in kilobytes. (Linux reports
+    kilobytes already; Mac OS X reports bytes.)
+    """
+    peak = resource.getrusage(who).ru_maxrss
+    if sys.platform == 'darwin': peak //= 1024
+    return peak
+
+def measure(case, rows, seed):
+    """
+    Runs one case in this process and returns its measurements. Called in the
+    fresh process started by run_case.
+    """
+    workdir = tempfile.mkdtemp(prefix='benchmark-')
+    try:
+        work = CASES[case][0](rows, seed, workdir)
+        setup_peak = peak_kb()
+        start = time.time()
+        work()
+        seconds = time.time() - start
+    finally:
+        shutil.rmtree(workdir)
+    return {'case': case, 'rows': rows, 'seed': seed, 'seconds': seconds,
+            'setup_peak_kb': setup_peak, 'peak_kb': peak_kb(),
+            'children_peak_kb': peak_kb(resource.RUSAGE_CHILDREN)}
+
+def commit():
+    """
+    The git commit the toolkit is at, if it's in a git repository.
+    """
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                           cwd=ROOT, stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_case(case, rows, seed):
+    """
+    Runs one case in a fresh Python process and returns its measurements.
+    """
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                      '--measure', case, str(rows), str(seed)])
+    return json.loads(output)
+
+def main(cases, sizes, seed=0, repeat=1, force=False, output=sys.stdout):
+    """
+    Runs every case at every size, repeat times each, writing a line of results
+    for each run as soon as it finishes.
+    """
+    context = {'commit': commit(), 'python': platform.python_version(),
+               'host': socket.gethostname()}
+    for case in cases:
+        for rows in sizes:
+            if rows > CASES[case][1] and not force:
+                sys.stderr.write('skipping %s at %d rows (more than %d; use --force)\n'
+                                 % (case, rows, CASES[case][1]))
+                continue
+            for i in range(repeat):
+                result = run_case(case, rows, seed)
+                result.update(context)
+                result['time'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+                output.write(json.dumps(result, sort_keys=True) + '\n')
+                output.flush()
+                sys.stderr.write('%s, %d rows: %.3f seconds, %d KB peak\n'
+                                 % (case, rows, result['seconds'], result['peak_kb']))
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--measure']:
+        case, rows, seed = sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+        print json.dumps(measure(case, rows, seed))
+        sys.exit(0)
+
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--case', action='append', metavar='NAME',
+        help='Run only this case (can be given more than once; default: all of them)')
+    parser.add_option('--rows', default=','.join(map(str, DEFAULT_ROWS)), metavar='N,N...',
+        help='Comma-separated sizes to run each case at (default: %default)')
+    parser.add_option('--seed', type='int', default=0,
+        help='Random seed for the synthetic data (default: %default)')
+    parser.add_option('--repeat', type='int', default=1,
+        help='Number of times to run each case at each size (default: %default)')
+    parser.add_option('--force', action='store_true', default=False,
+        help="Run cases at sizes bigger than they're meant to")
+    parser.add_option('--list', action='store_true', default=False,
+        help='List the cases and exit')
+    parser.add_option('-o', '--output', metavar='FILE',
+        help='Append results to FILE instead of writing them to standard output')
+    (options, args) = parser.parse_args()
+    if options.list:
+        for case in sorted(CASES):
+            print '%s (up to %d rows)' % (case, CASES[case][1])
+        sys.exit(0)
+    cases = options.case or sorted(CASES)
+    for case in cases:
+        if case not in CASES:
+            parser.error('no case named %s (see --list)' % case)
+    sizes = [int(size) for size in options.rows.split(',')]
+    output = options.output and open(options.output, 'a') or sys.stdout
+    try:
+        main(cases, sizes, options.seed, options.repeat, options.force, output)
+    finally:
+        if options.output: output.close()
@@ -30,6 +30,11 @@ Finally, more information about decision trees can be found here:
 http://en.wikipedia.org/wiki/Decision_tree
 http://en.wikipedia.org/wiki/Random_forest
 '''
+from array import array
+from bisect import bisect_right
+from itertools import compress, izip
+from random import Random
+from modelfile import ModelWriter, ModelReader
 
 ########## CLASSES ##########
 
@@ -41,6 +46,99 @@ class DecisionNode:
       self.true_branch = tb
       self.false_branch = fb
 
+# Kinds of nodes in a FlatTree
+LEAF = 0
+NUMERIC = 1 # Splits on value >= threshold
+CATEGORICAL = 2 # Splits on value == category
+
+class FlatTree(object):
+    """
+    A decision tree "flattened" out of its DecisionNode objects into a set of
+    parallel arrays, with one slot per node. Node 0 is the root, and each node
+    points to its children by their position in the arrays. Built by
+    flattentree() below.
+
+    Arrays of plain numbers take up far less memory than a web of Python
+    objects, and they can be written to and read from disk in one go.
+    """
+    def __init__(self):
+        self.kind = array('b') # LEAF, NUMERIC or CATEGORICAL
+        self.col = array('i') # Column the node splits on
+        self.threshold = array('d') # Split value for NUMERIC nodes
+        self.category = array('i') # Index into values for CATEGORICAL nodes
+        self.true_branch = array('i')
+        self.false_branch = array('i')
+        self.leaf = array('i') # For LEAF nodes, which results they hold
+        self.values = [] # Categorical split values
+        self.labels = [] # Class names
+        # The results of leaf i are the (label, count) pairs stored between
+        # leaf_start[i] and leaf_start[i + 1] in leaf_class and leaf_count.
+        self.leaf_start = array('i', [0])
+        self.leaf_class = array('i')
+        self.leaf_count = array('i')
+
+    def results(self, node):
+        """
+        Returns the results dict for a leaf node, just like DecisionNode.results.
+        """
+        leaf = self.leaf[node]
+        return dict([(self.labels[self.leaf_class[i]], self.leaf_count[i])
+            for i in range(self.leaf_start[leaf], self.leaf_start[leaf + 1])])
+
+    def classify(self, observation):
+        """
+        Walks an observation down the tree, the same way classify() does.
+        """
+        node = 0
+        while self.kind[node] != LEAF:
+            v = observation[self.col[node]]
+            if self.kind[node] == NUMERIC:
+                match = (isinstance(v, int) or isinstance(v, float)) and v >= self.threshold[node]
+            else:
+                match = v == self.values[self.category[node]]
+            if match: node = self.true_branch[node]
+            else: node = self.false_branch[node]
+        return self.results(node)
+
+    def classify_many(self, observations):
+        """
+        Classifies a whole batch of observations at once. Returns a list with the
+        results dict for each observation, in order.
+
+        Instead of walking each observation from the root to a leaf in turn, the
+        batch moves down the tree together, one level at a time. Each node gets
+        the numbers of the observations that reached it, checks them all against
+        its split in one tight loop over a single column, and hands the two
+        groups down to its children. Each leaf builds its results dict once and
+        every observation that lands there shares it, just as classify()
+        returns the same dict object for every observation reaching a leaf.
+        """
+        results = [None] * len(observations)
+        numbers = (int, float)
+        level = [(0, range(len(observations)))]
+        while level:
+            nextlevel = []
+            for (node, batch) in level:
+                kind = self.kind[node]
+                if kind == LEAF:
+                    leafresults = self.results(node)
+                    for i in batch: results[i] = leafresults
+                    continue
+                col = self.col[node]
+                column = [observations[i][col] for i in batch]
+                if kind == NUMERIC:
+                    threshold = self.threshold[node]
+                    matches = [v >= threshold and isinstance(v, numbers) for v in column]
+                else:
+                    category = self.values[self.category[node]]
+                    matches = [v == category for v in column]
+                true_batch = list(compress(batch, matches))
+                false_batch = [i for (i, match) in izip(batch, matches) if not match]
+                if true_batch: nextlevel.append((self.true_branch[node], true_batch))
+                if false_batch: nextlevel.append((self.false_branch[node], false_batch))
+            level = nextlevel
+        return results
+
 ########## FUNCTIONS ##########
 
 def uniquecounts(rows):
@@ -60,13 +158,19 @@ def entropy(rows):
     """
     Calculates the entropy of a given set.
     """
+    return countentropy(uniquecounts(rows), len(rows))
+
+def countentropy(results, total):
+    """
+    Calculates entropy straight from a dict of class counts, such as the one
+    uniquecounts returns, without needing the rows themselves.
+    """
     from math import log
     log2 = lambda x:log(x) / log(2)  
-    results = uniquecounts(rows)
     # Now calculate the entropy
     ent = 0.0
     for r in results.keys():
-        p = float(results[r]) / len(rows)
+        p = float(results[r]) / total
         ent = ent - p * log2(p)
     return ent
 
@@ -88,55 +192,423 @@ def divideset(rows, column, value):
     set2 = [row for row in rows if not split_function(row)]
     return (set1, set2)
 
-def buildtree(rows):
+def _orderedentropy(counts, first, total):
     """
-    A function for recursively building a decision tree given a set of data,
-    in this case represented as a two-dimensional array of Python lists.
+    Entropy of a set of rows described only by its class counts, plus the row
+    number where each class first turns up in the set.
+
+    The order in which entropy() adds up its terms depends on the order the
+    classes happen to be found in, and adding floating-point numbers in a
+    different order can change the last digit of the result. Rebuilding the
+    counts in first-seen order gives exactly the same answer as entropy(), so
+    the split search below picks exactly the same splits, ties and all.
     """
-    if len(rows)==0: return DecisionNode()
-    current_score = entropy(rows)
+    results = {}
+    for r in sorted(counts, key=first.get):
+        if counts[r] > 0: results[r] = counts[r]
+    return countentropy(results, total)
+
+def _gain(current_score, total, e1, n1, e2):
+    """
+    Information gain from splitting a set in two, given the entropy and size of
+    each half.
+    """
+    p = float(n1) / total
+    return current_score - p * e1 - (1 - p) * e2
+
+def _numericgains(values, labels, current_score):
+    """
+    Information gain for every possible split of a numeric column, where each
+    value v splits the rows into those >= v and those < v.
+
+    Trying every value and dividing the rows each time (as divideset does) means
+    going over every row once per distinct value. Instead, this sorts the rows
+    by value once, then sweeps through them keeping running counts of each
+    class: from the top down for the rows >= v, and from the bottom up for the
+    rows < v.
+
+    A missing value (NaN, "not a number") isn't >= anything, so as in divideset,
+    rows with one go down the false branch of every split, and NaN is never
+    tried as a split itself.
+
+    Returns a dict of value -> (gain, size of the true set, size of the false set).
+    """
+    total = len(values)
+    # NaN is the one value that isn't equal to itself
+    missing = [i for i in range(total) if values[i] != values[i]]
+    order = sorted([i for i in range(total) if values[i] == values[i]],
+                   key=lambda i: values[i])
+    # Group the sorted rows into runs of equal values
+    groups = []
+    for i in order:
+        if groups and values[groups[-1][0]] == values[i]: groups[-1].append(i)
+        else: groups.append([i])
+
+    # Rows >= v, sweeping from the largest value down
+    above = {}
+    counts, first, n = {}, {}, 0
+    for group in reversed(groups):
+        for i in group:
+            counts[labels[i]] = counts.get(labels[i], 0) + 1
+            if labels[i] not in first or i < first[labels[i]]: first[labels[i]] = i
+            n += 1
+        above[values[group[0]]] = (_orderedentropy(counts, first, n), n)
+
+    # Rows < v, sweeping from the smallest value up, starting from the rows
+    # with missing values
+    gains = {}
+    counts, first, n = {}, {}, 0
+    for i in missing:
+        counts[labels[i]] = counts.get(labels[i], 0) + 1
+        if labels[i] not in first: first[labels[i]] = i
+        n += 1
+    for group in groups:
+        value = values[group[0]]
+        e1, n1 = above[value]
+        e2 = _orderedentropy(counts, first, n)
+        gains[value] = (_gain(current_score, total, e1, n1, e2), n1, n)
+        for i in group:
+            counts[labels[i]] = counts.get(labels[i], 0) + 1
+            if labels[i] not in first or i < first[labels[i]]: first[labels[i]] = i
+            n += 1
+    return gains
+
+def _categoricalgains(values, labels, current_score):
+    """
+    Information gain for every possible split of a categorical column, where
+    each value v splits the rows into those == v and those != v.
+
+    One pass over the rows tallies up a histogram of classes for each value.
+    The rows == v are just that value's histogram, and the rows != v are
+    everything else, so no further passes are needed.
+
+    Returns a dict of value -> (gain, size of the true set, size of the false set).
+    """
+    total = len(values)
+    hist = {} # value -> class counts
+    first = {} # value -> row number where each class first turns up
+    totals = {} # class counts over all rows
+    for i in range(total):
+        value, label = values[i], labels[i]
+        counts = hist.setdefault(value, {})
+        if label not in counts:
+            counts[label] = 0
+            first.setdefault(value, {})[label] = i
+        counts[label] += 1
+        totals[label] = totals.get(label, 0) + 1
+
+    # For the rows != v, each class first turns up at the earliest row of any
+    # other value. Keeping the two earliest values per class covers every v.
+    earliest = {}
+    for (value, firsts) in first.items():
+        for (label, i) in firsts.items():
+            best = earliest.get(label, [])
+            best.append((i, value))
+            best.sort()
+            earliest[label] = best[:2]
+
+    gains = {}
+    for (value, counts) in hist.items():
+        n1 = sum(counts.values())
+        others = {}
+        otherfirst = {}
+        for (label, count) in totals.items():
+            others[label] = count - counts.get(label, 0)
+            for (i, v) in earliest[label]:
+                if v != value:
+                    otherfirst[label] = i
+                    break
+        e1 = _orderedentropy(counts, first[value], n1)
+        e2 = _orderedentropy(others, otherfirst, total - n1)
+        gains[value] = (_gain(current_score, total, e1, n1, e2), n1, total - n1)
+    return gains
+
+def _tally(labels):
+    """
+    Same as uniquecounts, but for a plain list of class labels.
+    """
+    results = {}
+    for r in labels:
+        if r not in results: results[r] = 0
+        results[r] += 1
+    return results
+
+def _matches(x, value):
+    """
+    The test divideset uses to decide which side of a split a value falls on.
+    """
+    if isinstance(value, int) or isinstance(value, float):
+        return x >= value
+    return x == value
+
+def _exhaustivegains(values, labels, current_score):
+    """
+    The original, brute-force split search: divide the rows on every value and
+    measure each half. Only used for columns that mix numbers and categories,
+    where the faster searches above don't apply.
+    """
+    gains = {}
+    for value in values:
+        if value in gains: continue
+        set1 = [labels[i] for i in range(len(values)) if _matches(values[i], value)]
+        set2 = [labels[i] for i in range(len(values)) if not _matches(values[i], value)]
+        # Calculate information gain
+        p = float(len(set1)) / len(values)
+        gain = current_score - p * countentropy(_tally(set1), len(set1)) \
+            - (1 - p) * countentropy(_tally(set2), len(set2))
+        gains[value] = (gain, len(set1), len(set2))
+    return gains
+
+def _columnar(rows):
+    """
+    Makes a columnar copy of the training data: one list per column holding that
+    column's values, plus one list of class labels. Splitting a column means
+    scanning one of these lists rather than pulling a value out of every row.
+
+    The rows can also be a Dataset (see dataset/dataset.py) with a label column,
+    which is already stored in columns, so each one is just read straight out.
+    Its empty numeric cells come out as NaN, which splits treat as missing (see
+    _numericgains).
+    """
+    if hasattr(rows, 'rows'):
+        if rows.label is None:
+            raise ValueError('%s has no label column; load it with label= to say '
+                             'which column holds the classes' % rows.directory)
+        return [list(column) for column in rows.features()], list(rows.column(rows.label))
+    column_count = len(rows[0]) - 1
+    columns = [[row[col] for row in rows] for col in range(column_count)]
+    labels = [row[len(row) - 1] for row in rows]
+    return columns, labels
+
+def _binnedgains(codes, labels, current_score):
+    """
+    Information gain for every possible split of a binned numeric column (see
+    _bincolumns), where each bin code b splits the rows into those in bin b or
+    above and those below it.
+
+    One pass over the rows tallies up a histogram of classes for each bin, and
+    then the sweep up and down works on those histograms instead of on the rows,
+    so it costs the same no matter how many rows there are.
+
+    Returns a dict of code -> (gain, size of the true set, size of the false set).
+    """
+    total = len(codes)
+    hist = {}
+    for i in range(total):
+        counts = hist.setdefault(codes[i], {})
+        counts[labels[i]] = counts.get(labels[i], 0) + 1
+    present = sorted(hist)
+
+    # Rows in bin b or above, sweeping from the top bin down
+    above = {}
+    counts, n = {}, 0
+    for code in reversed(present):
+        for (label, count) in hist[code].items():
+            counts[label] = counts.get(label, 0) + count
+            n += count
+        above[code] = (countentropy(counts, n), n)
+
+    # Rows below bin b, sweeping from the bottom bin up
+    gains = {}
+    counts, n = {}, 0
+    for code in present:
+        e1, n1 = above[code]
+        gains[code] = (_gain(current_score, total, e1, n1, countentropy(counts, n)), n1, n)
+        for (label, count) in hist[code].items():
+            counts[label] = counts.get(label, 0) + count
+            n += count
+    return gains
+
+def _bincolumns(columns, bins):
+    """
+    Replaces every numeric column with compact bin codes, for faster splitting
+    on big datasets.
+
+    The values in each column are sorted once and cut into (at most) bins groups
+    of roughly equal size, known as quantiles. Each value is then replaced by the
+    number of its group, stored in an array of single bytes. Splits can then only
+    fall on the boundaries between groups, so there are at most bins - 1 of them
+    to try instead of one per distinct value.
+
+    Returns the new columns along with, for each column, the sorted list of
+    boundary values (or None if the column wasn't binned). A row is in bin b if
+    exactly b boundaries are less than or equal to its value, so "bin >= b"
+    means the same thing as "value >= boundaries[b - 1]". Missing values (NaN)
+    go in bin 0, below every boundary, so they're on the false side of every
+    split, as in divideset.
+    """
+    if bins > 256:
+        raise ValueError("Bin codes are stored in single bytes, so bins can't be more than 256")
+    binned = []
+    edges = []
+    for column in columns:
+        if not all([isinstance(v, int) or isinstance(v, float) for v in column]):
+            binned.append(column)
+            edges.append(None)
+            continue
+        ordered = sorted([v for v in column if v == v])
+        boundaries = sorted(set([ordered[(k * len(ordered)) // bins]
+                                 for k in range(1, bins) if ordered]))
+        binned.append(array('B', [v == v and bisect_right(boundaries, v) or 0 for v in column]))
+        edges.append(boundaries)
+    return binned, edges
+
+def _bestsplit(columns, labels, subset, candidates, edges=None):
+    """
+    Finds the split with the most information gain for the rows whose numbers
+    are in subset, trying each of the column numbers in candidates. Returns
+    (gain, column, value), or a gain of 0.0 if splitting doesn't help. For
+    binned columns (those with edges), the value is a bin code.
+    """
+    nodelabels = [labels[i] for i in subset]
+    current_score = countentropy(_tally(nodelabels), len(nodelabels))
 
     # Set up some variables to track the best criteria
     best_gain = 0.0
-    best_criteria = None
-    best_sets = None
+    best_criteria = (None, None)
+
+    for col in candidates:
+        column = columns[col]
+        values = [column[i] for i in subset]
+
+        if edges is not None and edges[col] is not None:
+            gains = _binnedgains(values, nodelabels, current_score)
+            column_values = gains
+        else:
+            # Loop through every column and tally up every possible
+            # value for that column. Put that into a dictionary.
+            column_values = {}
+            numeric = 0
+            for value in values:
+                if value not in column_values:
+                    column_values[value] = 1
+                    if isinstance(value, int) or isinstance(value, float): numeric += 1
+
+            # Now work out the information gain of splitting on each value, using
+            # whichever search suits the column.
+            if numeric == len(column_values):
+                gains = _numericgains(values, nodelabels, current_score)
+            elif numeric == 0:
+                gains = _categoricalgains(values, nodelabels, current_score)
+            else:
+                gains = _exhaustivegains(values, nodelabels, current_score)
 
-    column_count = len(rows[0]) - 1
-    for col in range(0, column_count):
-
-        # Loop through every column and tally up every possible
-        # value for that column. Put that into a dictionary.
-        column_values = {}
-        for row in rows:
-            column_values[row[col]] = 1
-        
-        # Now split the data into two subsets using the divideset
-        # function above.
         for value in column_values.keys():
-            (set1, set2) = divideset(rows, col, value)
-      
-            # Calculate information gain
-            p = float(len(set1)) / len(rows)
-            gain = current_score - p * entropy(set1) - (1 - p) * entropy(set2)
+            # Missing values aren't tried as splits
+            if value not in gains: continue
+            (gain, size1, size2) = gains[value]
 
             # Decides the best criteria on which to split the tree, such that 
             # entropy is minimized and information gain is maximized.
-            if gain > best_gain and len(set1) > 0 and len(set2) > 0:
+            if gain > best_gain and size1 > 0 and size2 > 0:
                 best_gain =  gain
                 best_criteria = (col, value)
-                best_sets = (set1, set2)
-  
-    # As long as there is still information gain to be had
-    if best_gain > 0:
-        # Recurse and move to the next level of the tree
-        trueBranch = buildtree(best_sets[0])
-        falseBranch = buildtree(best_sets[1])
-        # And build out new nodes
-        return DecisionNode(col=best_criteria[0], value=best_criteria[1],
-                            tb=trueBranch, fb=falseBranch)
-    
-    # Once the treebuild is complete, return the full tree
-    return DecisionNode(results=uniquecounts(rows))
+    return (best_gain, best_criteria[0], best_criteria[1])
+
+def _partition(column, indices, start, end, value):
+    """
+    Rearranges indices[start:end] in place so the rows that go down the true
+    branch of a split come first, keeping rows in their original order on each
+    side. Returns the position where the false branch begins.
+    """
+    true_rows = []
+    false_rows = []
+    for i in indices[start:end]:
+        if _matches(column[i], value): true_rows.append(i)
+        else: false_rows.append(i)
+    indices[start:end] = array('i', true_rows + false_rows)
+    return start + len(true_rows)
+
+def buildtree(rows, max_features=None, rng=None, max_depth=None, min_samples_split=2,
+              min_gain=0.0, bins=None):
+    """
+    A function for building a decision tree given a set of data, in this case
+    represented as a two-dimensional array of Python lists.
+
+    The tree is built the same way a recursive function would build it -- split
+    the rows, then split each half, and so on -- but without actually copying
+    the rows into new lists at every split. Instead, the data is copied once into
+    columns, and every row is referred to by its number in a single array of
+    row numbers. Splitting a node just rearranges its stretch of that array so
+    the true rows come before the false ones, and each child node gets its own
+    stretch.
+
+    Rather than calling itself, buildtree keeps a stack of nodes still waiting
+    to be split. That way, a very deep tree can't run into Python's limit on
+    how deeply functions can call themselves.
+
+    Normally every column is considered at every split. Setting max_features
+    considers only that many columns, picked at random for each split using
+    rng (a random.Random instance), which is how the trees in a random forest
+    are grown (see randomforest.py).
+
+    Left to its own devices, the tree keeps growing until no split gains any
+    information at all, which on a big dataset means an enormous tree that has
+    memorized every quirk of its training data. The other options rein it in,
+    a simple stand-in for pruning:
+
+    max_depth = Stop splitting at this many levels below the root
+    min_samples_split = Don't split nodes with fewer rows than this
+    min_gain = Only split if it gains more information than this
+    bins = Cut each numeric column into this many quantile bins (up to 256)
+        before building, so splits are only tried between bins rather than
+        at every distinct value. See _bincolumns.
+    """
+    if len(rows)==0: return DecisionNode()
+    if rng is None: rng = Random()
+    columns, labels = _columnar(rows)
+    edges = None
+    if bins is not None: columns, edges = _bincolumns(columns, bins)
+    return _growtree(columns, labels, array('i', range(len(rows))), max_features, rng,
+                     edges, max_depth, min_samples_split, min_gain)
+
+def _growtree(columns, labels, indices, max_features=None, rng=None, edges=None,
+              max_depth=None, min_samples_split=2, min_gain=0.0):
+    """
+    Does the work for buildtree, given the training data in columns and an array
+    of the row numbers to build from. The array is rearranged in place. A row
+    number can appear more than once, as in a bootstrap sample.
+    """
+    root = None
+    everycolumn = range(len(columns))
+
+    # Each entry is a stretch of the index array still to be turned into a node,
+    # along with its depth, the parent node and which of the parent's branches
+    # the node goes on.
+    stack = [(0, len(indices), 0, None, True)]
+    while stack:
+        start, end, depth, parent, side = stack.pop()
+        subset = indices[start:end]
+        gain = 0.0
+        if (max_depth is None or depth < max_depth) and end - start >= min_samples_split:
+            candidates = everycolumn
+            if max_features is not None and max_features < len(everycolumn):
+                candidates = sorted(rng.sample(everycolumn, max_features))
+            (gain, col, value) = _bestsplit(columns, labels, subset, candidates, edges)
+
+        # As long as there is still enough information gain to be had, split
+        # the rows and queue up both halves to become the next level of the tree.
+        if gain > min_gain:
+            middle = _partition(columns[col], indices, start, end, value)
+            # A split that sends every row the same way would just be found
+            # again by the node below, forever
+            if middle == start or middle == end: gain = 0.0
+        if gain > min_gain:
+            # For a binned column, the split is on a bin code, but the node
+            # needs the real value so classify can use it.
+            threshold = value
+            if edges is not None and edges[col] is not None: threshold = edges[col][value - 1]
+            node = DecisionNode(col=col, value=threshold)
+            stack.append((middle, end, depth + 1, node, False))
+            stack.append((start, middle, depth + 1, node, True))
+        # Otherwise this is a leaf, holding the counts of each class
+        else:
+            node = DecisionNode(results=_tally([labels[i] for i in subset]))
+
+        if parent is None: root = node
+        elif side: parent.true_branch = node
+        else: parent.false_branch = node
+    return root
 
 def classify(observation, tree=None):
     """
@@ -144,25 +616,120 @@ def classify(observation, tree=None):
     the observation is represented as a Python list of attributes and should match
     the order and length of the items in the training set.
     """
-    # Exit condition. Once results are assigned to the tree, return them and
-    # stop recursion.
-    if tree.results != None:
-        return tree.results
-    else:
+    if isinstance(tree, FlatTree):
+        return tree.classify(observation)
+    # Walk down the tree one node at a time (in a loop rather than by recursing,
+    # so deep trees don't hit Python's recursion limit). Once results are
+    # assigned to a node, return them and stop.
+    while tree.results == None:
         v = observation[tree.col]
-        branch = None
         # Deal with continuous variables.
         if isinstance(v, int) or isinstance(v, float):
-            if v >= tree.value: branch = tree.true_branch
-            else: branch = tree.false_branch
+            if v >= tree.value: tree = tree.true_branch
+            else: tree = tree.false_branch
         # Deal with standard categorical data.
         else:
             # If the value matches the value of a given
             # node in the tree, move down to the next
-            # branch and recurse.
-            if v == tree.value: branch = tree.true_branch
-            else: branch = tree.false_branch
-        return classify(observation, branch)
+            # branch and keep going.
+            if v == tree.value: tree = tree.true_branch
+            else: tree = tree.false_branch
+    return tree.results
+
+def classify_many(observations, tree):
+    """
+    Classifies a list of observations at once, returning a list of results. The
+    tree is flattened first if it hasn't been already (see flattentree below),
+    so if you're classifying several batches with the same tree, flatten it
+    once up front and pass in the FlatTree.
+    """
+    if not isinstance(tree, FlatTree): tree = flattentree(tree)
+    return tree.classify_many(observations)
+
+def flattentree(tree):
+    """
+    Flattens a tree of DecisionNodes into a FlatTree. Nodes are numbered in the
+    order they're visited, starting from the root.
+    """
+    flat = FlatTree()
+    values = {}
+    labels = {}
+    # Each entry is a node still to be numbered, along with its parent's number
+    # and which of the parent's branches it hangs off of.
+    stack = [(tree, -1, True)]
+    while stack:
+        node, parent, side = stack.pop()
+        n = len(flat.kind)
+        if parent >= 0:
+            if side: flat.true_branch[parent] = n
+            else: flat.false_branch[parent] = n
+        flat.true_branch.append(-1)
+        flat.false_branch.append(-1)
+        if node.results != None or node.true_branch == None:
+            flat.kind.append(LEAF)
+            flat.col.append(-1)
+            flat.threshold.append(0.0)
+            flat.category.append(-1)
+            flat.leaf.append(len(flat.leaf_start) - 1)
+            for (label, count) in (node.results or {}).items():
+                flat.leaf_class.append(labels.setdefault(label, len(labels)))
+                flat.leaf_count.append(count)
+            flat.leaf_start.append(len(flat.leaf_class))
+        else:
+            flat.col.append(node.col)
+            flat.leaf.append(-1)
+            if isinstance(node.value, int) or isinstance(node.value, float):
+                flat.kind.append(NUMERIC)
+                flat.threshold.append(node.value)
+                flat.category.append(-1)
+            else:
+                flat.kind.append(CATEGORICAL)
+                flat.threshold.append(0.0)
+                flat.category.append(values.setdefault(node.value, len(values)))
+            stack.append((node.false_branch, n, False))
+            stack.append((node.true_branch, n, True))
+    flat.values = sorted(values, key=values.get)
+    flat.labels = sorted(labels, key=labels.get)
+    return flat
+
+def savetree(tree, path):
+    """
+    Saves a tree (either DecisionNodes or a FlatTree) to a compact binary file
+    (see modelfile.py), which loadtree() can read back in milliseconds.
+    """
+    if not isinstance(tree, FlatTree): tree = flattentree(tree)
+    with open(path, 'wb') as f:
+        writer = ModelWriter(f, 'TREE')
+        for a in (tree.kind, tree.col, tree.threshold, tree.category, tree.true_branch,
+                  tree.false_branch, tree.leaf, tree.leaf_start, tree.leaf_class, tree.leaf_count):
+            writer.write_array(a)
+        writer.write_values(tree.values)
+        writer.write_values(tree.labels)
+    return
+
+def loadtree(path):
+    """
+    Loads a tree saved with savetree(). Returns a FlatTree, which can be passed
+    to classify() just like a tree of DecisionNodes.
+    """
+    reader = ModelReader(path, 'TREE')
+    try:
+        tree = FlatTree()
+        tree.kind = reader.read_array()
+        tree.col = reader.read_array()
+        tree.threshold = reader.read_array()
+        tree.category = reader.read_array()
+        tree.true_branch = reader.read_array()
+        tree.false_branch = reader.read_array()
+        tree.leaf = reader.read_array()
+        tree.leaf_start = reader.read_array()
+        tree.leaf_class = reader.read_array()
+        tree.leaf_count = reader.read_array()
+        tree.values = reader.read_values()
+        tree.labels = reader.read_values()
+    finally:
+        reader.close()
+    return tree
 
 ########## MAIN ##########
 
@@ -193,4 +760,12 @@ if __name__ == '__main__':
     tree = buildtree(training_data)
 
     # Classify an unknown observation
-    print classify([1000000, 'y', 100.0, 90.0, 'n', 'interesting'], tree)
\ No newline at end of file
+    print classify([1000000, 'y', 100.0, 90.0, 'n', 'interesting'], tree)
+
+    # Or flatten the tree into arrays and classify a batch of observations at once
+    flat = flattentree(tree)
+    print classify_many([[1000000, 'y', 100.0, 90.0, 'n'], [50, 'n', 10.0, 20.0, 'n']], flat)
+    # Missing numbers (NaN) go down the false branch, and are never split on
+    nan = float('nan')
+    tree = buildtree([[1.5, 'A'], [nan, 'B'], [3.0, 'A'], [nan, 'B']])
+    assert (tree.col, tree.value) == (0, 1.5) and classify([nan], tree) == {'B': 2}
@@ -19,6 +19,11 @@ ways. This algorithm could easily be adapated to predict continuous variables (l
 to find clusters of similar words, or to weight points based on their proximity to
 an input vector.
 
+For documents, the TextkNNClassifier class below does the same job without comparing
+a new document to every training document. It keeps its training set as an inverted
+index -- the same TF-IDF index the scripts in the mapreduce directory build -- and only
+looks at documents that share at least one word with the one being classified.
+
 More information about k Nearest Neighbors can be found here:
 
 Toby Segaran's Programming Collective Intelligence:
@@ -31,13 +36,14 @@ http://mines.humanoriented.com/classes/2010/fall/csci568/portfolio_exports/sdaug
 A Programmer's Guide to Data Mining:
 http://guidetodatamining.com/home/toc/chapter-5/
 '''
+import heapq
 import math
 import operator
-from similiarity.similarity import euclidean
+from similarity.similarity import euclidean
 
 class kNNClassifier(object):
     def __init__(self, data):
-        self.data = data # Input data
+        self.data = data # Input data, or a Dataset (see dataset/dataset.py) with a label
         self.distancelist = [] # Ranked list of distances of points from an input vector
 
     def _getdistances(self, v1, distance=euclidean):
@@ -46,9 +52,15 @@ class kNNClassifier(object):
         to an input vector v1. This step passes for training in k Nearest Neighbors,
         populating a list so that the top k items can be used to calculate a result.
         """
-        for i in range(len(self.data)):
-            v2 = self.data[i]['vector']
-            self.distancelist.append((distance(v1, v2), data[i]['class']))
+        self.distancelist = []
+        if hasattr(self.data, 'rows'):
+            # Read a Dataset a row at a time, as (class, feature, feature ...)
+            for row in self.data.rows(label='first', numeric=True):
+                self.distancelist.append((distance(v1, row[1:]), row[0]))
+        else:
+            for i in range(len(self.data)):
+                v2 = self.data[i]['vector']
+                self.distancelist.append((distance(v1, v2), self.data[i]['class']))
         self.distancelist.sort(key=lambda x: x[0], reverse=True)
         return
 
@@ -85,6 +97,162 @@ class kNNClassifier(object):
         # Return the class value (or values) with the highest counts
         return [x[0] for x in finalcounts if x[1] == finalcounts[0][1]]
 
+class TextkNNClassifier(object):
+    def __init__(self, data=None, tokenize=None):
+        """
+        A k Nearest Neighbors classifier for documents, which finds neighbors by
+        cosine similarity of TF-IDF weights, the way the pairwise similarity
+        workflow in the mapreduce directory does. Like TextNaiveBayes, it takes
+        rows with the class name first and the text of a document second; or a
+        labeled index from that workflow can be loaded with load_index.
+
+        kNNClassifier measures the distance from a new point to every point in
+        its training set. That's fine for a few columns, but a document has one
+        column for every word in the vocabulary, and nearly all of them are
+        zero. Two documents that share no words have a cosine similarity of 0,
+        so only the documents that share a word with the new one can be its
+        neighbors. An inverted index lists, for each word, the documents it
+        appears in and its weight in each, so walking the lists for just the
+        new document's words adds up every dot product that isn't zero. The
+        work depends on how many words the new document has (and how common
+        they are), not on how big the training set is.
+
+        tokenize is the function that breaks a document into words. By default
+        it just splits on whitespace, as inv-index-mapper.py does.
+        """
+        self.data = data
+        self.tokenize = tokenize or (lambda document: document.split())
+        self.index = {} # For each term, a list of (docid, TF-IDF weight) pairs
+        self.idf = {} # For each term, its IDF weight
+        self.norms = {} # For each document, the length of its TF-IDF vector
+        self.labels = {} # For each document, its class
+        self.documents = 0 # The number of documents the IDF weights count
+
+    def _frequencies(self, document):
+        """
+        The term frequency of each word in a document: how many times it appears
+        as a share of all the words in the document, as in inv-index-mapper.py.
+        """
+        words = self.tokenize(document)
+        counts = {}
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+        length = float(len(words))
+        return dict([(word, count / length) for (word, count) in counts.iteritems()])
+
+    def train(self):
+        """
+        Builds the inverted index from the (class, document) rows passed in as
+        data, weighting each word in each document by its term frequency times
+        log(documents / documents containing the word). Each row's position in
+        data is used as its document ID.
+        """
+        postings = {}
+        self.labels = {}
+        for (docid, row) in enumerate(self.data):
+            self.labels[docid] = row[0]
+            for (word, tf) in self._frequencies(row[1]).iteritems():
+                postings.setdefault(word, []).append((docid, tf))
+        self.documents = len(self.data)
+        self.index = {}
+        self.idf = {}
+        for (word, tfs) in postings.iteritems():
+            idf = math.log(float(self.documents) / len(tfs))
+            self.idf[word] = idf
+            self.index[word] = [(docid, tf * idf) for (docid, tf) in tfs]
+        self._refresh()
+        return
+
+    def load_index(self, path, labels, documents=None):
+        """
+        Uses an inverted index written by inv-index-reducer.py (or
+        index-merge.py) as the training set, without recomputing any of its
+        weights. labels is a dict of {docid: class}; documents without a label
+        are left out, since they couldn't vote anyway. The IDF weights for new
+        documents come from how many documents each term appears in, out of the
+        number of documents in the index, unless that number is given.
+        """
+        self.index = {}
+        self.idf = {}
+        self.labels = labels
+        docids = set()
+        lists = []
+        with open(path) as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                postings = [field.rsplit(':', 1) for field in fields[1:]]
+                if documents is None:
+                    docids.update([docid for (docid, weight) in postings])
+                lists.append((fields[0], len(postings),
+                    [(docid, float(weight)) for (docid, weight) in postings if docid in labels]))
+        self.documents = documents or len(docids)
+        for (term, df, postings) in lists:
+            self.idf[term] = math.log(float(self.documents) / df)
+            if postings: self.index[term] = postings
+        self._refresh()
+        return
+
+    def _refresh(self):
+        """
+        Works out the length of every document's TF-IDF vector, for turning dot
+        products into cosines.
+
+        A word in every document has an IDF of 0, and so a weight of 0 wherever
+        it appears. Those postings can't add anything to a dot product, so
+        they're dropped. A document made up only of such words has a vector of
+        length 0, which has no direction to measure an angle from, so it's
+        never anyone's neighbor.
+        """
+        squares = {}
+        for (term, postings) in self.index.items():
+            postings = [(docid, weight) for (docid, weight) in postings if weight != 0]
+            if postings:
+                self.index[term] = postings
+            else:
+                del self.index[term]
+            for (docid, weight) in postings:
+                squares[docid] = squares.get(docid, 0.0) + weight * weight
+        self.norms = dict([(docid, math.sqrt(total)) for (docid, total) in squares.iteritems()
+                           if total > 0])
+
+    def neighbors(self, document, k=3):
+        """
+        Finds the k training documents most similar to a document, as a list of
+        (similarity, docid, class) tuples, most similar first, with ties in order
+        of document ID. Documents that share no words with it aren't neighbors
+        at all, so fewer than k can come back.
+        """
+        scores = {}
+        norm = 0.0
+        for (word, tf) in self._frequencies(document).iteritems():
+            if word not in self.idf: continue
+            weight = tf * self.idf[word]
+            norm += weight * weight
+            for (docid, other) in self.index.get(word, ()):
+                scores[docid] = scores.get(docid, 0.0) + weight * other
+        norm = math.sqrt(norm)
+        # Only documents with a non-zero dot product (and so a non-zero length)
+        # have an angle to the query worth ranking.
+        scores = [(docid, dot) for (docid, dot) in scores.iteritems()
+                  if dot > 0 and self.norms.get(docid)]
+        best = heapq.nsmallest(k, scores,
+            key=lambda (docid, dot): (-dot / self.norms[docid], docid))
+        return [(dot / (self.norms[docid] * norm), docid, self.labels[docid])
+                for (docid, dot) in best]
+
+    def classify(self, document, k=3):
+        """
+        Classifies a document by a vote of its k nearest neighbors, the same way
+        kNNClassifier.classify does, and returns the class (or classes, if
+        there's a tie) with the most votes.
+        """
+        klasses = {}
+        for (similarity, docid, klass) in self.neighbors(document, k):
+            klasses[klass] = klasses.get(klass, 0) + 1
+        if not klasses: return []
+        top = max(klasses.itervalues())
+        return [klass for (klass, count) in sorted(klasses.iteritems()) if count == top]
+
 if __name__ == '__main__':
     data = [
         {'class': 'a', 'vector': (1, 2)},
@@ -93,4 +261,20 @@ if __name__ == '__main__':
         {'class': 'c', 'vector': (4, 2)},
     ]
     c = kNNClassifier(data)
-    print c.classify((1,3))
\ No newline at end of file
+    print c.classify((1,3))
+
+    tips = [['parking', 'meter broken on main street again'],
+        ['parking', 'ticketed while the meter was broken'],
+        ['noise', 'loud music from the bar every night'],
+        ['noise', 'construction noise starts before dawn every day']]
+    t = TextkNNClassifier(tips)
+    t.train()
+    print t.neighbors('the meter on elm street is broken', k=2)
+    print t.classify('music at the bar all night', k=1)
+
+    # "x" is in every document, so it carries no weight, and document 2 (just
+    # "x") has no neighbors and is no one's neighbor
+    t = TextkNNClassifier([['a', 'x y'], ['b', 'x z'], ['c', 'x']])
+    t.train()
+    assert t.neighbors('x y', k=2) == [(1.0, 0, 'a')]
+    assert t.neighbors('x', k=2) == []
\ No newline at end of file
@@ -0,0 +1,164 @@
+'''
+modelfile.py
+
+Helpers for saving trained models to disk in a compact binary format, and for
+loading them back quickly. Used by naivebayes.py and decisiontree.py.
+
+Training a model on a big dataset can take minutes, but the trained model
+itself is usually just a handful of tables of numbers. Rather than retrain every
+time a program starts (or pickle a tangle of nested Python objects), those
+tables can be written out as raw arrays of numbers, one after another, with a
+little header in front of each saying what kind of numbers they are and how many
+there are.
+
+Loading is then mostly a matter of copying bytes straight into Python arrays.
+Files are opened with mmap (http://docs.python.org/library/mmap.html), so the
+operating system serves them out of its page cache: when many worker processes
+load the same model file, it is read off the disk once and every later load is
+just a memory copy. (Python's array module can't point into a mapped file
+directly, so each process still ends up with its own copy of the tables.)
+
+Every file starts with:
+
+    4 bytes   'CARM', so we can tell a model file from anything else
+    2 bytes   the format version
+    4 bytes   what kind of model it is (e.g. 'NBAY' or 'TREE')
+    1 byte    the byte order the numbers were written in ('<' or '>')
+
+followed by the model's own blocks, each padded out to 8 bytes.
+'''
+import mmap
+import struct
+import sys
+from array import array
+
+MAGIC = 'CARM'
+# Bumped whenever the blocks of any kind of model change, so old files are
+# refused rather than misread
+FORMAT_VERSION = 2
+BYTE_ORDER = '<' if sys.byteorder == 'little' else '>'
+
+_HEADER = struct.Struct('<4sH4sc5x')
+_ARRAY_HEADER = struct.Struct('<cB6xQ')
+_COUNT = struct.Struct('<Q')
+
+class ModelFileError(Exception):
+    """
+    Raised when a file isn't a model file this code knows how to read.
+    """
+    pass
+
+def _pad(n):
+    return (8 - n % 8) % 8
+
+class ModelWriter(object):
+    """
+    Writes the blocks of a model file, in order.
+    """
+    def __init__(self, f, kind):
+        self.f = f
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, kind, BYTE_ORDER))
+
+    def write_int(self, n):
+        self.f.write(_COUNT.pack(n))
+
+    def write_array(self, a):
+        """
+        Writes a Python array: its type code, item size and length, followed by
+        its raw bytes.
+        """
+        data = a.tostring()
+        self.f.write(_ARRAY_HEADER.pack(a.typecode, a.itemsize, len(a)))
+        self.f.write(data)
+        self.f.write('\0' * _pad(len(data)))
+
+    def write_values(self, values):
+        """
+        Writes a list of simple Python values (strings, numbers, booleans or
+        None), such as class names or the categories in a column. Each value is
+        stored as a one-letter type tag and its text, and all of the text is
+        packed into one block.
+        """
+        tags = []
+        texts = []
+        for value in values:
+            if value is None:
+                tags.append('n'); texts.append('')
+            elif isinstance(value, bool):
+                tags.append('b'); texts.append(value and '1' or '0')
+            elif isinstance(value, (int, long)):
+                tags.append('i'); texts.append(str(value))
+            elif isinstance(value, float):
+                tags.append('f'); texts.append(repr(value))
+            elif isinstance(value, unicode):
+                tags.append('u'); texts.append(value.encode('utf-8'))
+            elif isinstance(value, str):
+                tags.append('s'); texts.append(value)
+            else:
+                raise TypeError("Can't save a value of type %s" % type(value).__name__)
+        self.write_array(array('c', ''.join(tags)))
+        self.write_array(array('I', [len(text) for text in texts]))
+        self.write_array(array('c', ''.join(texts)))
+
+class ModelReader(object):
+    """
+    Reads the blocks of a model file back, in the order they were written.
+    """
+    def __init__(self, path, kind=None):
+        with open(path, 'rb') as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.buf) < _HEADER.size:
+            raise ModelFileError("%s is too short to be a model file" % path)
+        magic, version, filekind, byteorder = _HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            raise ModelFileError("%s is not a model file" % path)
+        if version != FORMAT_VERSION:
+            raise ModelFileError("%s uses model format version %d, expected %d"
+                % (path, version, FORMAT_VERSION))
+        if kind is not None and filekind != kind:
+            raise ModelFileError("%s holds a %s model, not %s" % (path, filekind, kind))
+        self.kind = filekind
+        self.swap = byteorder != BYTE_ORDER
+        self.offset = _HEADER.size
+
+    def read_int(self):
+        (n,) = _COUNT.unpack_from(self.buf, self.offset)
+        self.offset += _COUNT.size
+        return n
+
+    def read_array(self):
+        typecode, itemsize, length = _ARRAY_HEADER.unpack_from(self.buf, self.offset)
+        self.offset += _ARRAY_HEADER.size
+        a = array(typecode)
+        if a.itemsize != itemsize:
+            raise ModelFileError("Array items are %d bytes in the file but %d here"
+                % (itemsize, a.itemsize))
+        size = itemsize * length
+        # buffer() hands the mapped bytes straight to the array, without first
+        # making a temporary string out of them.
+        a.fromstring(buffer(self.buf, self.offset, size))
+        if self.swap: a.byteswap()
+        self.offset += size + _pad(size)
+        return a
+
+    def read_values(self):
+        tags = self.read_array()
+        lengths = self.read_array()
+        text = self.read_array().tostring()
+        values = []
+        start = 0
+        for i in range(len(tags)):
+            value = text[start:start + lengths[i]]
+            start += lengths[i]
+            tag = tags[i]
+            if tag == 's': pass
+            elif tag == 'u': value = value.decode('utf-8')
+            elif tag == 'i': value = int(value)
+            elif tag == 'f': value = float(value)
+            elif tag == 'b': value = value == '1'
+            else: value = None
+            values.append(value)
+        return values
+
+    def close(self):
+        self.buf.close()
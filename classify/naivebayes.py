@@ -22,6 +22,14 @@ deal with continuous numerical data as well using one of two approaches: making
 the continuous data discrete by fitting it into bins, or by assuming the data fits
 a Gaussian (normal) distribution and altering the algorithm accordingly.
 
+Naive Bayes is also a classic way to classify text, such as sorting tips or
+complaints by topic. For that, the TextNaiveBayes class below uses what's known
+as the "multinomial" model, which looks at how often each word appears in a
+document rather than at a fixed set of columns. To keep memory in check no
+matter how many different words show up, words are "hashed" into a fixed
+number of buckets by the HashingVectorizer class instead of being stored
+one by one.
+
 A good explanation of these approaches can be found here under the "Parameter
 Estimation" section: http://en.wikipedia.org/wiki/Naive_Bayes_classifier
 
@@ -35,9 +43,22 @@ Toby Segaran's Programming Collective Intelligence:
 http://www.amazon.com/Programming-Collective-Intelligence-Building-Applications/dp/0596529325
 http://blog.kiwitobes.com/?p=44
 '''
+import copy
+import csv
+import math
+import zlib
+from array import array
+from multiprocessing import Pool
+from modelfile import ModelWriter, ModelReader, ModelFileError
+
+# No probability should ever be set to exactly zero, as it will wipe out all other
+# probabilities when they are multiplied. Features never seen with a class get this
+# instead.
+MISSING_PROBABILITY = .0000001
+LOG_MISSING_PROBABILITY = math.log(MISSING_PROBABILITY)
 
 class NaiveBayes(object): 
-    def __init__(self, data):
+    def __init__(self, data=None):
         """
         Bayesean classifiers require two types of probabilities to be created in
         training in order to properly classify input. They are known as "prior"
@@ -53,10 +74,32 @@ class NaiveBayes(object):
         The classifier also needs access to a set of conditional probabilities
         based on the features of each class. For instance, the probability that
         a certain attribute is associated with type 'A' vs. type 'B'.
+
+        Once trained, those probabilities are also compiled into a more compact
+        form for classification: every class and every feature value gets an
+        integer code, and the probabilities are stored in flat arrays indexed by
+        those codes, as logarithms and as they are. See _compile() below.
+
+        Underneath it all, though, the model is nothing more than a few tallies:
+        how many items are in each class, and how often each feature value shows
+        up within each class. Those tallies can be built up a chunk of rows at a
+        time with partial_fit() and added together with merge(), and the
+        probabilities are only worked out from them when it's time to classify.
         """
         self.data = data # Input. Assumes first item in each row is class name.    
+        self.total = 0 # Total number of items counted so far
+        self.classes = {} # Each distinct class in the data, with counts
+        self.counts = {} # Counts of features, grouped under each class
+        self.width = 0 # Number of feature columns
+        self.stale = True # Whether the counts have changed since the last compile
         self.prior = {}
         self.conditional = {}
+        self.categories = [] # Class names, in the order of the compiled tables
+        self.vocabularies = [] # For each column, a dict of feature value -> code
+        self.log_prior = array('d')
+        self.log_conditional = [] # For each column, an array of log probabilities
+        self.prior_table = array('d') # The same, not as logs, for settling ties
+        self.conditional_tables = []
 
     def _calculate_prior(self, total, classes):
         """
@@ -90,9 +133,10 @@ class NaiveBayes(object):
                 tmp[col] = tmp2
 
             tmp3 = []
-            # 
-            for i in range(1, len(self.data[0])):
-                tmp3.append(tmp[i])
+            # Line the columns up in order. (A class might never have seen a
+            # value in a column if rows were ragged, hence the empty default.)
+            for i in range(1, self.width + 1):
+                tmp3.append(tmp.get(i, {}))
             self.conditional[category] = tmp3
         return
         
@@ -102,16 +146,37 @@ class NaiveBayes(object):
         from data provided in a training set. The larger and more varied the
         training set, the better luck you will have classifying new observations.
         """
-        total = len(self.data) # Total number of items in the dataset
-        classes = {} # Each distinct class in the data, with counts
-        counts = {} # Counts of features, grouped under each class
-        
+        self.total = 0
+        self.classes = {}
+        self.counts = {}
+        self.width = 0
+        self.partial_fit(self.data)
+        self._refresh()
+        return
+
+    def partial_fit(self, rows):
+        """
+        Adds a chunk of training rows to the model's counts. Rows can come from
+        any iterable, such as a csv.reader, so a training set never has to fit in
+        memory all at once. Call it as many times as you like; the probabilities
+        are worked out the next time something is classified.
+
+        A Dataset (see dataset/dataset.py) with a label column works too, and
+        is read a row at a time. Its numbers are turned back into text, so they
+        match the strings classify() is given (see Dataset.rows).
+        """
+        if hasattr(rows, 'rows'): rows = rows.rows(label='first', text=True)
+        classes = self.classes
+        counts = self.counts
+
         # For each row of data in the training set
-        for instance in self.data:
+        for instance in rows:
             category = instance[0]
             classes.setdefault(category, 0)
             counts.setdefault(category, {})
             classes[category] += 1
+            self.total += 1
+            self.width = max(self.width, len(instance) - 1)
             
             col = 0
             # For each column in the data row, total the rote counts of each
@@ -127,41 +192,609 @@ class NaiveBayes(object):
                 else:
                     tmp[columnValue] = 1
                 counts[category][col] = tmp
-        
-        # Feed those counts to the probability functions above in order to calculate
-        # prior and conditional probabilities.
-        self._calculate_prior(total, classes)
-        self._calculate_conditional(counts, classes)
+        self.stale = True
+        return
+
+    def merge(self, other):
+        """
+        Adds the counts from another NaiveBayes model into this one. Because the
+        model is just counts, training on two halves of a dataset and merging
+        them gives exactly the same model as training on the whole thing.
+        """
+        self.total += other.total
+        self.width = max(self.width, other.width)
+        for (category, count) in other.classes.items():
+            self.classes[category] = self.classes.get(category, 0) + count
+            columns = self.counts.setdefault(category, {})
+            for (col, valueCounts) in other.counts[category].items():
+                tmp = columns.setdefault(col, {})
+                for (value, count) in valueCounts.items():
+                    tmp[value] = tmp.get(value, 0) + count
+        self.stale = True
+        return self
+
+    def subtract(self, other):
+        """
+        The opposite of merge(): takes the counts from another model, trained on
+        some of the same rows, back out of this one. Anything whose count drops
+        to zero is forgotten entirely, so the result is exactly the model you'd
+        get by training on the remaining rows alone.
+        """
+        self.total -= other.total
+        for (category, count) in other.classes.items():
+            self.classes[category] -= count
+            columns = self.counts[category]
+            for (col, valueCounts) in other.counts[category].items():
+                tmp = columns[col]
+                for (value, count) in valueCounts.items():
+                    tmp[value] -= count
+                    if tmp[value] == 0: del tmp[value]
+            if self.classes[category] == 0:
+                del self.classes[category]
+                del self.counts[category]
+        self.stale = True
+        return self
+
+    def _features(self, row):
+        """
+        The part of a training row that gets passed to classify().
+        """
+        return row[1:]
+
+    def _refresh(self):
+        """
+        Feed the counts to the probability functions above in order to calculate
+        prior and conditional probabilities, but only if they've changed since
+        the last time.
+        """
+        if not self.stale: return
+        self.prior = {}
+        self.conditional = {}
+        self._calculate_prior(self.total, self.classes)
+        self._calculate_conditional(self.counts, self.classes)
+        self._compile()
+        self.stale = False
+        return
+
+    def _compile(self):
+        """
+        Compiles the prior and conditional probabilities into integer-coded
+        lookup tables.
+
+        Multiplying lots of small probabilities together quickly produces numbers
+        too small for a computer to represent (known as "underflow"), so the
+        tables hold logarithms instead. Adding logs is the same as multiplying
+        the original probabilities, and the class with the highest sum is still
+        the most likely one.
+
+        Each column gets a vocabulary that maps its feature values to codes, and
+        a flat array with one slot per (value, class) combination. The log
+        probability of value code v in class c lives at v * len(categories) + c.
+
+        The probabilities themselves are kept too, laid out the same way, for
+        settling ties (see _best). Taking the log of a probability and then
+        undoing it with exp() doesn't always give back exactly the same number.
+        """
+        self.categories = list(self.conditional.keys())
+        classcount = len(self.categories)
+        self.prior_table = array('d', [self.prior[category] for category in self.categories])
+        self.log_prior = array('d', [math.log(p) for p in self.prior_table])
+        self.vocabularies = []
+        self.log_conditional = []
+        self.conditional_tables = []
+        width = len(self.conditional[self.categories[0]]) if self.categories else 0
+        for i in range(width):
+            vocabulary = {}
+            for category in self.categories:
+                for value in self.conditional[category][i]:
+                    vocabulary.setdefault(value, len(vocabulary))
+            # Start every slot off as missing, then fill in what training saw.
+            table = array('d', [MISSING_PROBABILITY]) * (len(vocabulary) * classcount)
+            for c in range(classcount):
+                for (value, probability) in self.conditional[self.categories[c]][i].items():
+                    table[vocabulary[value] * classcount + c] = probability
+            self.vocabularies.append(vocabulary)
+            self.conditional_tables.append(table)
+            self.log_conditional.append(array('d', [math.log(p) for p in table]))
         return
+
+    def _score(self, instances):
+        """
+        Adds up the log probabilities of every class for every instance in a
+        list. Returns one flat array holding len(categories) scores per instance.
+        Works a column at a time so each lookup table is only fetched once.
+        """
+        classcount = len(self.categories)
+        scores = self.log_prior * len(instances)
+        for i in range(len(self.log_conditional)):
+            vocabulary = self.vocabularies[i]
+            table = self.log_conditional[i]
+            for n in range(len(instances)):
+                code = vocabulary.get(instances[n][i])
+                base = n * classcount
+                if code is None:
+                    # A value training never saw is equally unlikely in every class
+                    for c in range(classcount):
+                        scores[base + c] += LOG_MISSING_PROBABILITY
+                else:
+                    row = code * classcount
+                    for c in range(classcount):
+                        scores[base + c] += table[row + c]
+        return scores
     
     def classify(self, instance):
         """
         Classifies a new observation based on the probabilities calculated in
-        training.
-        """
-        categories = {}
-        # Loop through every set of conditional probabilities in the training set
-        for (category, vector) in self.conditional.items():
-            prob = 1
-            # For every feature in each class of conditional probabilities
-            for i in range(len(vector)):
-                # No probability should ever be set to exactly zero, as it will
-                # wipe out all other probabilities when they are multiplied.
-                colProbability = .0000001
-                # If a feature from the input class matches one in the training vector
-                if instance[i] in vector[i]:
-                    # Get the probability for that feature
-                    colProbability = vector[i][instance[i]]
-                # Apply each conditional probability to the total probability
-                prob = prob * colProbability
-            # Now apply the prior probability
-            prob = prob * self.prior[category]
-            categories[category] = prob
-        # Total and sort all the probabilities that the classifier input 
-        cat = list(categories.items())
-        cat.sort(key=lambda catTuple: catTuple[1], reverse = True)
-        # Return the class with the highest probability
-        return(cat[0])
+        training. Returns the most likely class along with its (unnormalized)
+        probability.
+        """
+        self._refresh()
+        scores = self._score([instance])
+        best = self._best(scores, 0, instance)
+        return (self.categories[best], math.exp(scores[best]))
+
+    def classify_many(self, instances):
+        """
+        Classifies a whole list of observations at once. Returns two lists: the
+        most likely class for each observation, and for each observation a dict
+        of posterior probabilities for every class, normalized to add up to 1.
+        """
+        self._refresh()
+        classcount = len(self.categories)
+        scores = self._score(instances)
+        winners = []
+        posteriors = []
+        for n in range(len(instances)):
+            best = self._best(scores, n * classcount, instances[n])
+            row = scores[n * classcount:(n + 1) * classcount]
+            # Subtract the best score before converting out of log space so the
+            # largest term is exactly 1 and nothing underflows to zero.
+            exps = [math.exp(score - row[best]) for score in row]
+            total = sum(exps)
+            winners.append(self.categories[best])
+            posteriors.append(dict(zip(self.categories, [e / total for e in exps])))
+        return winners, posteriors
+
+    def _best(self, scores, base, instance):
+        """
+        Picks the index of the highest scoring class for one instance, without
+        sorting every class.
+
+        Classes that tie in theory can come out a hair apart once rounding error
+        creeps in, and multiplying probabilities rounds differently than adding
+        logs does. So near-ties are settled the way classify() always settled
+        them: by multiplying out the raw probabilities, in order, and keeping the
+        first class with the biggest product. The probabilities come from the
+        compiled tables, not the training counts, so a model read back in with
+        load() settles ties exactly the same way as the model that was saved.
+        """
+        classcount = len(self.categories)
+        best = 0
+        for c in range(1, classcount):
+            if scores[base + c] > scores[base + best]: best = c
+        tied = [c for c in range(classcount)
+            if scores[base + best] - scores[base + c] < 1e-9]
+        if len(tied) > 1:
+            products = [self._product(c, instance) for c in tied]
+            # If everything underflowed to zero, the logs are the better guide
+            if max(products) > 0:
+                best = tied[products.index(max(products))]
+        return best
+
+    def _product(self, c, instance):
+        """
+        Multiplies out the raw probability of an instance belonging to the class
+        with index c, in the same order the original classifier did.
+        """
+        classcount = len(self.categories)
+        prob = 1
+        for i in range(len(self.log_conditional)):
+            code = self.vocabularies[i].get(instance[i])
+            if code is None:
+                prob = prob * MISSING_PROBABILITY
+            else:
+                prob = prob * self.conditional_tables[i][code * classcount + c]
+        return prob * self.prior_table[c]
+
+    def save(self, path):
+        """
+        Saves the compiled model to a compact binary file (see modelfile.py),
+        which load() below can read back in a few milliseconds. Only the lookup
+        tables are saved, not the counts, so a loaded model is ready to classify
+        but can't be trained any further.
+        """
+        self._refresh()
+        with open(path, 'wb') as f:
+            writer = ModelWriter(f, 'NBAY')
+            writer.write_values(self.categories)
+            writer.write_array(self.log_prior)
+            writer.write_array(self.prior_table)
+            writer.write_int(len(self.vocabularies))
+            for i in range(len(self.vocabularies)):
+                vocabulary = self.vocabularies[i]
+                # Values in code order, so their positions are their codes
+                writer.write_values(sorted(vocabulary, key=vocabulary.get))
+                writer.write_array(self.log_conditional[i])
+                writer.write_array(self.conditional_tables[i])
+        return
+
+class HashingVectorizer(object):
+    """
+    Turns a document into a sparse vector of word counts, represented as a dict
+    of {bucket: count}.
+
+    Rather than keep a dictionary of every word it has ever seen, which grows
+    without limit on a big corpus, the vectorizer runs each word through a hash
+    function that maps it to one of n_features numbered buckets. Occasionally two
+    words land in the same bucket, but with enough buckets that rarely matters
+    much, and the memory used never grows past n_features.
+
+    More on the "hashing trick" here: http://en.wikipedia.org/wiki/Feature_hashing
+
+    tokenizer is the function that breaks a document into words, if it
+    shouldn't just be split on whitespace.
+    """
+    def __init__(self, n_features=2 ** 18, tokenizer=None):
+        self.n_features = n_features
+        self.tokenizer = tokenizer
+
+    def tokenize(self, document):
+        """
+        Tokenizes a document into words, the same way the inverted index mapper
+        in the mapreduce directory does. By default that's crudely splitting on
+        whitespace. To lowercase words, strip punctuation or drop stopwords as
+        the mapper's options do, build the vectorizer with a tokenizer from
+        make_tokenizer in mapreduce/tokenizer.py.
+        """
+        if self.tokenizer is not None: return self.tokenizer(document)
+        return document.split()
+
+    def transform(self, document):
+        """
+        Returns the sparse {bucket: count} vector for a single document.
+        """
+        vector = {}
+        for word in self.tokenize(document):
+            if isinstance(word, unicode): word = word.encode('utf-8')
+            # crc32 gives the same answer on every machine and in every process,
+            # which Python's built-in hash() doesn't promise.
+            bucket = (zlib.crc32(word) & 0xffffffff) % self.n_features
+            vector[bucket] = vector.get(bucket, 0) + 1
+        return vector
+
+class TextNaiveBayes(object):
+    def __init__(self, data=None, n_features=2 ** 18, alpha=1.0, tokenize=None):
+        """
+        A multinomial Naive Bayes classifier for documents. Like NaiveBayes, it
+        expects rows with the class name first, but here the second item is
+        the text of a document.
+
+        The prior probabilities work the same way as in NaiveBayes. The
+        conditional probabilities are the chances that any given word in a
+        document of a class is a particular word (or really, lands in a
+        particular hash bucket). A word that appears three times in a document
+        counts three times.
+
+        Alpha is the number of made-up extra appearances given to every bucket
+        in every class, known as Laplace or "additive" smoothing. It serves the
+        same purpose as MISSING_PROBABILITY above: a word that never appeared
+        in a class shouldn't rule that class out completely.
+
+        tokenize is the function that breaks a document into words. By default
+        it just splits on whitespace, as inv-index-mapper.py does; to match an
+        index built with the mapper's other options, use make_tokenizer from
+        mapreduce/tokenizer.py with the same ones. It isn't saved with the
+        model, so pass it to load() too.
+        """
+        self.data = data
+        self.vectorizer = HashingVectorizer(n_features, tokenize)
+        self.alpha = alpha
+        self.total = 0 # Total number of documents counted so far
+        self.classes = {} # Number of documents in each class
+        self.word_counts = {} # For each class, {bucket: word count} for the buckets used
+        self.word_totals = {} # For each class, the total number of words
+        self.stale = True
+        self.categories = []
+        self.log_prior = array('d')
+        self.log_likelihood = array('d') # Log probabilities, n_features * classes
+
+    def train(self):
+        """
+        Train the classifier on the documents passed in as data.
+        """
+        self.total = 0
+        self.classes = {}
+        self.word_counts = {}
+        self.word_totals = {}
+        self.partial_fit(self.data)
+        self._refresh()
+        return
+
+    def partial_fit(self, rows):
+        """
+        Adds a chunk of (class, document) rows to the model's counts. Only the
+        buckets a document actually uses get touched, so the cost of counting
+        depends on the length of the documents, not the number of buckets.
+        """
+        for row in rows:
+            category = row[0]
+            if category not in self.classes:
+                self.classes[category] = 0
+                self.word_counts[category] = {}
+                self.word_totals[category] = 0
+            self.classes[category] += 1
+            self.total += 1
+            counts = self.word_counts[category]
+            for (bucket, count) in self.vectorizer.transform(row[1]).items():
+                counts[bucket] = counts.get(bucket, 0) + count
+                self.word_totals[category] += count
+        self.stale = True
+        return
+
+    def merge(self, other):
+        """
+        Adds the counts from another TextNaiveBayes model into this one. Both
+        models need the same number of buckets.
+        """
+        if other.vectorizer.n_features != self.vectorizer.n_features:
+            raise ValueError("Can't merge models with different numbers of buckets")
+        self.total += other.total
+        for (category, count) in other.classes.items():
+            if category not in self.classes:
+                self.classes[category] = 0
+                self.word_counts[category] = {}
+                self.word_totals[category] = 0
+            self.classes[category] += count
+            self.word_totals[category] += other.word_totals[category]
+            counts = self.word_counts[category]
+            for (bucket, n) in other.word_counts[category].items():
+                counts[bucket] = counts.get(bucket, 0) + n
+        self.stale = True
+        return self
+
+    def subtract(self, other):
+        """
+        The opposite of merge(), as with NaiveBayes.subtract.
+        """
+        self.total -= other.total
+        for (category, count) in other.classes.items():
+            self.classes[category] -= count
+            self.word_totals[category] -= other.word_totals[category]
+            counts = self.word_counts[category]
+            for (bucket, n) in other.word_counts[category].items():
+                counts[bucket] -= n
+                if counts[bucket] == 0: del counts[bucket]
+            if self.classes[category] == 0:
+                del self.classes[category]
+                del self.word_counts[category]
+                del self.word_totals[category]
+        self.stale = True
+        return self
+
+    def _features(self, row):
+        return row[1]
+
+    def _refresh(self):
+        """
+        Works out log prior and conditional probabilities from the counts, if
+        they've changed since last time. As with NaiveBayes, the conditional
+        probabilities are laid out in one flat array, with bucket b of class c
+        at b * len(categories) + c.
+
+        Most buckets were never used by a class, and all of those have the same
+        smoothed probability. So the array starts out filled with each class's
+        probability for an unused bucket, and only the buckets that were used
+        are worked out one by one.
+        """
+        if not self.stale: return
+        self.categories = list(self.classes.keys())
+        classcount = len(self.categories)
+        n_features = self.vectorizer.n_features
+        self.log_prior = array('d', [math.log(float(self.classes[category]) / self.total)
+            for category in self.categories])
+        denominators = [math.log(self.word_totals[category] + self.alpha * n_features)
+            for category in self.categories]
+        self.log_likelihood = array('d', [math.log(self.alpha) - denominator
+            for denominator in denominators]) * n_features
+        for c in range(classcount):
+            denominator = denominators[c]
+            for (bucket, count) in self.word_counts[self.categories[c]].items():
+                self.log_likelihood[bucket * classcount + c] = \
+                    math.log(count + self.alpha) - denominator
+        self.stale = False
+        return
+
+    def classify(self, document):
+        """
+        Classifies a single document. Returns the most likely class along with
+        its posterior probability.
+        """
+        winners, posteriors = self.classify_many([document])
+        return (winners[0], posteriors[0][winners[0]])
+
+    def classify_many(self, documents):
+        """
+        Classifies a list of documents. Returns the most likely class for each
+        document, along with a dict of normalized posterior probabilities.
+        """
+        self._refresh()
+        classcount = len(self.categories)
+        table = self.log_likelihood
+        winners = []
+        posteriors = []
+        for document in documents:
+            scores = self.log_prior[:]
+            # Only the buckets that appear in the document matter
+            for (bucket, count) in self.vectorizer.transform(document).items():
+                row = bucket * classcount
+                for c in range(classcount):
+                    scores[c] += count * table[row + c]
+            best = 0
+            for c in range(1, classcount):
+                if scores[c] > scores[best]: best = c
+            exps = [math.exp(score - scores[best]) for score in scores]
+            total = sum(exps)
+            winners.append(self.categories[best])
+            posteriors.append(dict(zip(self.categories, [e / total for e in exps])))
+        return winners, posteriors
+
+    def save(self, path):
+        """
+        Saves the model to a compact binary file. As with NaiveBayes.save, a
+        loaded model can classify but not be trained any further.
+        """
+        self._refresh()
+        with open(path, 'wb') as f:
+            writer = ModelWriter(f, 'TXNB')
+            writer.write_int(self.vectorizer.n_features)
+            writer.write_values([self.alpha])
+            writer.write_values(self.categories)
+            writer.write_array(self.log_prior)
+            writer.write_array(self.log_likelihood)
+        return
+
+def load(path, tokenize=None):
+    """
+    Loads a NaiveBayes or TextNaiveBayes model saved with save(). A
+    TextNaiveBayes model's tokenize function isn't saved with it, so pass the
+    one it was trained with, if it wasn't the default.
+    """
+    reader = ModelReader(path)
+    try:
+        if reader.kind == 'NBAY':
+            model = NaiveBayes()
+            model.categories = reader.read_values()
+            model.log_prior = reader.read_array()
+            model.prior_table = reader.read_array()
+            model.width = reader.read_int()
+            for i in range(model.width):
+                values = reader.read_values()
+                model.vocabularies.append(dict(zip(values, range(len(values)))))
+                model.log_conditional.append(reader.read_array())
+                model.conditional_tables.append(reader.read_array())
+        elif reader.kind == 'TXNB':
+            n_features = reader.read_int()
+            model = TextNaiveBayes(n_features=n_features, alpha=reader.read_values()[0],
+                                   tokenize=tokenize)
+            model.categories = reader.read_values()
+            model.log_prior = reader.read_array()
+            model.log_likelihood = reader.read_array()
+        else:
+            raise ModelFileError("%s holds a %s model, not a Naive Bayes one" % (path, reader.kind))
+    finally:
+        reader.close()
+    model.stale = False
+    return model
+
+def _empty_like(model):
+    """
+    A new model of the same kind as model, with the same settings but none of
+    its counts.
+    """
+    if isinstance(model, TextNaiveBayes):
+        return TextNaiveBayes(n_features=model.vectorizer.n_features, alpha=model.alpha,
+                              tokenize=model.vectorizer.tokenizer)
+    return NaiveBayes()
+
+def _count_chunk(task):
+    """
+    Counts one chunk of training data in a worker process for train_parallel.
+    The empty model it starts from arrives as a fresh copy in each worker.
+    """
+    model, chunk = task
+    if isinstance(chunk, basestring):
+        # A path to a CSV file, which the worker reads for itself
+        with open(chunk, 'rb') as f:
+            model.partial_fit(csv.reader(f))
+    else:
+        model.partial_fit(chunk)
+    return model
+
+def train_parallel(chunks, processes=None, model=None):
+    """
+    Counts several chunks of training data at the same time, one per process,
+    and merges the results into a single model. Each chunk can be a list of rows
+    or the path to a CSV file (for example, the pieces of a big training file
+    cut up with the Unix split command). Passing file paths means the rows never
+    have to be shipped between processes at all.
+
+    Works for either kind of classifier. Pass a TextNaiveBayes as model to
+    count documents instead of categorical rows. The chunks are counted from
+    scratch and added to model, so a model that's already been trained on some
+    rows ends up trained on those and the chunks both.
+    """
+    if model is None: model = NaiveBayes()
+    empty = _empty_like(model)
+    pool = Pool(processes)
+    try:
+        models = pool.map(_count_chunk, [(empty, chunk) for chunk in chunks])
+    finally:
+        pool.close()
+        pool.join()
+    for m in models:
+        model.merge(m)
+    return model
+
+# Shared with the worker processes started by cross_validate. Setting it before
+# the pool starts means each worker inherits it, rather than having the counts
+# and the data pickled and sent over for every fold.
+_cv_state = None
+
+def _init_cv(state):
+    global _cv_state
+    _cv_state = state
+
+def _score_fold(k):
+    """
+    Builds the model for fold k by subtracting the fold's counts from the counts
+    for the whole dataset, then scores it on the rows that were left out.
+    """
+    full, template, data, folds = _cv_state
+    held_out = data[k::folds]
+    fold = copy.deepcopy(template)
+    fold.partial_fit(held_out)
+    model = copy.deepcopy(full)
+    model.subtract(fold)
+    winners, posteriors = model.classify_many([model._features(row) for row in held_out])
+    correct = 0
+    for (winner, row) in zip(winners, held_out):
+        if winner == row[0]: correct += 1
+    return float(correct) / len(held_out)
+
+def cross_validate(data, folds=10, processes=None, model=None):
+    """
+    Estimates how well the classifier does on data it hasn't seen, using k-fold
+    cross-validation: http://en.wikipedia.org/wiki/Cross-validation_(statistics)
+
+    The rows are dealt out into a number of folds, like cards. Each fold in turn
+    is held out while a model is trained on the rest, and the model is scored on
+    how many of the held-out rows it classifies correctly. Returns a list of
+    those scores (the share of rows classified correctly), one per fold. If the
+    rows are sorted in some meaningful way, shuffle them first.
+
+    Normally that means training one model per fold, on mostly the same rows
+    each time. But since a Naive Bayes model is just counts, the whole dataset
+    only has to be counted once: each fold's model is the full counts with the
+    held-out fold's counts subtracted. The folds are then scored in parallel,
+    one per process.
+
+    Pass an empty TextNaiveBayes as model to cross-validate a text classifier.
+
+    There have to be at least two folds, and no more folds than rows, so that
+    every fold holds out at least one row to score.
+    """
+    if not 2 <= folds <= len(data):
+        raise ValueError("Can't split %d rows into %d folds: there have to be at least 2 "
+                         "folds, and no more than there are rows" % (len(data), folds))
+    if model is None: model = NaiveBayes()
+    full = copy.deepcopy(model)
+    full.partial_fit(data)
+    pool = Pool(processes, _init_cv, [(full, model, data, folds)])
+    try:
+        return pool.map(_score_fold, range(folds))
+    finally:
+        pool.close()
+        pool.join()
         
 if __name__ == '__main__':
     data  = [['i100', 'both', 'sedentary', 'moderate', 'yes'],
@@ -183,4 +816,37 @@ if __name__ == '__main__':
     b = NaiveBayes(data)
     b.train()
     print b.classify(['health', 'moderate', 'moderate', 'yes'])
-    print b.classify(['appearance', 'moderate', 'moderate', 'no'])
\ No newline at end of file
+    print b.classify(['appearance', 'moderate', 'moderate', 'no'])
+    print b.classify_many([['health', 'moderate', 'moderate', 'yes'],
+        ['appearance', 'moderate', 'moderate', 'no']])
+
+    # The same model, counted in three chunks in parallel and merged together
+    c = train_parallel([data[:5], data[5:10], data[10:]])
+    print c.classify(['health', 'moderate', 'moderate', 'yes'])
+
+    # How well does it do on rows it hasn't seen?
+    print cross_validate(data, folds=5)
+
+    # Text classification works the same way, but each row holds a document
+    tips = [['parking', 'meter broken on main street again'],
+        ['parking', 'ticketed while the meter was broken'],
+        ['noise', 'loud music from the bar every night'],
+        ['noise', 'construction noise starts before dawn every day']]
+    t = TextNaiveBayes(tips, n_features=2 ** 10)
+    t.train()
+    print t.classify('the meter on elm street is broken')
+    print t.classify_many(['music all night', 'broken meter'])[0]
+    # A model read back in with load() settles ties the same way as the original
+    import os, tempfile
+    t = NaiveBayes([['b', 'y', 'y'], ['a', 'w', 'w'], ['b', 'y', 'x']])
+    t.train()
+    path = tempfile.mktemp()
+    t.save(path)
+    assert load(path).classify(['w', 'x']) == t.classify(['w', 'x'])
+    os.remove(path)
+
+    # X and Z tie here in theory, and the original classifier picked X
+    t = NaiveBayes([['Z', 'd', 'd'], ['Z', 'd', 'a'], ['Y', 'd', 'c'], ['Z', 'a', 'b'],
+                    ['X', 'c', 'c'], ['X', 'a', 'b'], ['Z', 'd', 'a'], ['Z', 'a', 'c']])
+    t.train()
+    assert t.classify(['c', 'd'])[0] == 'X'
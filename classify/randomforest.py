@@ -0,0 +1,153 @@
+'''
+randomforest.py
+
+An implementation of a Random Forest classifier, built out of the decision trees in
+decisiontree.py.
+
+A single decision tree tends to "memorize" its training data: it keeps splitting
+until every leaf is pure, so it picks up every quirk and bit of noise along the
+way (this is known as overfitting). A Random Forest gets around that problem by
+growing lots of trees, each one a little different, and letting them vote.
+
+Two tricks make the trees different from one another:
+
+1. Each tree is trained on a "bootstrap sample" of the data: a random sample the
+same size as the training set, drawn with replacement, so some rows show up more
+than once and others (about a third) not at all.
+
+2. At every split, each tree only considers a few columns, picked at random,
+rather than all of them. That keeps one or two strong columns from dominating
+every tree.
+
+Each tree on its own is a worse classifier than a single tree trained on all the
+data. But their mistakes tend to be different, so when they vote, the mistakes
+cancel out. To classify an observation, the forest averages the class
+distributions of the leaves it lands in across all of the trees.
+
+Because the trees have nothing to do with each other, they can be grown at the
+same time, one per processor core.
+
+More information about Random Forests can be found here:
+
+http://en.wikipedia.org/wiki/Random_forest
+Leo Breiman's original paper: http://www.stat.berkeley.edu/~breiman/randomforest2001.pdf
+'''
+import math
+from array import array
+from multiprocessing import Pool
+from random import Random
+from decisiontree import _columnar, _growtree, flattentree
+
+# Shared with the worker processes that grow the trees. Setting it before the
+# pool starts means every worker inherits the training data when it's created,
+# rather than having a copy pickled and sent over for every tree.
+_forest_state = None
+
+def _init_forest(state):
+    global _forest_state
+    _forest_state = state
+
+def _growforesttree(seed):
+    """
+    Grows one tree of the forest on a bootstrap sample of the training data, in
+    a worker process. The tree is flattened before it's sent back, because a few
+    arrays are much quicker to pickle than thousands of node objects.
+    """
+    columns, labels, max_features = _forest_state
+    rng = Random(seed)
+    n = len(labels)
+    # A bootstrap sample is just a list of row numbers, some repeated
+    indices = array('i', [rng.randrange(n) for i in range(n)])
+    return flattentree(_growtree(columns, labels, indices, max_features, rng))
+
+class RandomForest(object):
+    """
+    A Random Forest classifier. Training data is the same as for buildtree: a
+    list of rows, with the class in the last column.
+
+    data = Training data
+    trees = The number of trees to grow
+    max_features = The number of columns to consider at each split. Defaults to
+        the square root of the number of columns, a common rule of thumb.
+    processes = The number of worker processes. Defaults to one per core.
+    seed = Seed for the random number generator, so results can be reproduced
+    """
+    def __init__(self, data, trees=100, max_features=None, processes=None, seed=None):
+        self.data = data
+        self.ntrees = trees
+        self.max_features = max_features
+        self.processes = processes
+        self.seed = seed
+        self.trees = [] # The trained trees, as FlatTrees
+
+    def train(self):
+        """
+        Grows the trees, in parallel.
+        """
+        columns, labels = _columnar(self.data)
+        max_features = self.max_features
+        if max_features is None:
+            max_features = max(1, int(math.sqrt(len(columns))))
+        rng = Random(self.seed)
+        seeds = [rng.getrandbits(32) for i in range(self.ntrees)]
+        pool = Pool(self.processes, _init_forest, [(columns, labels, max_features)])
+        try:
+            self.trees = pool.map(_growforesttree, seeds)
+        finally:
+            pool.close()
+            pool.join()
+        return
+
+    def classify_many(self, observations):
+        """
+        Classifies a list of observations. Returns, for each observation, a dict
+        of the share of the forest's vote each class received: the average of
+        the class distributions of the leaves the observation lands in.
+        """
+        votes = [{} for observation in observations]
+        for tree in self.trees:
+            # Each tree classifies the whole batch at once, and the distribution
+            # of each leaf is only worked out once per tree.
+            shares = {}
+            results = tree.classify_many(observations)
+            for i in range(len(observations)):
+                leaf = results[i]
+                if id(leaf) not in shares:
+                    total = float(sum(leaf.values()))
+                    shares[id(leaf)] = [(label, count / total) for (label, count) in leaf.items()]
+                vote = votes[i]
+                for (label, share) in shares[id(leaf)]:
+                    vote[label] = vote.get(label, 0.0) + share
+        for vote in votes:
+            for label in vote:
+                vote[label] /= len(self.trees)
+        return votes
+
+    def classify(self, observation):
+        """
+        Classifies a single observation. See classify_many.
+        """
+        return self.classify_many([observation])[0]
+
+if __name__ == '__main__':
+    # The same campaign finance sample used in decisiontree.py: amount of donation;
+    # whether it's to the opposite party than a donor usually gives to; percentile
+    # rank of the donation given all donations; percentile rank of the donation
+    # given donations by that specific donor; and whether the contributor has given
+    # to the candidate before. The last item is the classification.
+    training_data=[
+        [1000000, 'y', 100.0, 100.0, 'y', 'interesting'],
+        [100, 'n', 20.0, 30.0, 'n', 'boring'],
+        [2000, 'y', 70.0, 60.0, 'n', 'interesting'],
+        [10000, 'n', 80.0, 80.0, 'y', 'boring'],
+        [500, 'y', 20.0, 10.0, 'y', 'boring'],
+        [500000, 'n', 90.0, 100.0, 'y', 'interesting'],
+        [15000000, 'n', 100.0, 100.0, 'y', 'interesting'],
+        [13000, 'y', 70.0, 30.0, 'n', 'boring'],
+        [8000, 'y', 50.0, 70.0, 'n', 'interesting'],
+        [10, 'y', 0.0, 0.0, 'y', 'boring'],
+        ]
+
+    forest = RandomForest(training_data, trees=50, seed=1)
+    forest.train()
+    print forest.classify([1000000, 'y', 100.0, 90.0, 'n'])
@@ -32,11 +32,16 @@ class DBSCAN(object):
     Simple implementation of the DBSCAN algorithm, written to mirror the Wikipedia
     pseudocode as closely as possible: http://en.wikipedia.org/wiki/DBSCAN
     
-    d = Full dataset of point instances
+    d = Full dataset of point instances, or a Dataset (see dataset/dataset.py),
+        whose numeric columns are used
     eps = Maximum search radius
     min_pts = The minimum number of points necessary to qualify a cluster
     """
     def __init__(self, d, eps, min_pts):
+        # Every point is compared with every other, so a Dataset's rows are
+        # read into memory once, rather than unpacked from its column files
+        # on every comparison
+        if hasattr(d, 'rows'): d = list(d.rows(numeric=True))
         self.d = d
         self.dist = self._euclidean
         self.eps = eps
@@ -116,9 +121,10 @@ class DBSCAN(object):
         judging nearest neighbors. Just be sure the p1 and p2 vectors are the
         same length.
         """
+        v1, v2 = self.d[p1], self.d[p2]
         sum = 0
-        for i in range((len(self.d[p1]))):
-            sum += (self.d[p1][i] - self.d[p2][i]) ** 2
+        for i in range(len(v1)):
+            sum += (v1[i] - v2[i]) ** 2
         return math.sqrt(sum)
         
 if __name__ == '__main__':
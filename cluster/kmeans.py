@@ -35,10 +35,18 @@ http://home.dei.polimi.it/matteucc/Clustering/tutorial_html/AppletKM.html
 '''
 import random
 import math
-from similiarity.similarity import euclidean
+from similarity.similarity import euclidean
 
 class KMeans(object):
     def __init__(self, data):
+        if hasattr(data, 'rows'):
+            # A Dataset (see dataset/dataset.py) already knows the range of
+            # each of its numeric columns, so there's no need to scan them.
+            # Every pass compares every row with every cluster, so the rows
+            # are read into memory once rather than unpacked on every pass.
+            self.rows = list(data.rows(numeric=True))
+            self.ranges = [(column.min, column.max) for column in data.features(numeric=True)]
+            return
         self.rows = data
         # Get the min and max values of each dimension in the input vector
         self.ranges=[(min([row[i] for row in self.rows]), max([row[i] for row in self.rows])) 
@@ -91,8 +99,9 @@ class KMeans(object):
                 avgs = [0.0] * len(self.rows[0])
                 if len(bestmatches[i]) > 0:
                     for rowid in bestmatches[i]:
-                        for m in range(len(self.rows[rowid])):
-                            avgs[m] += self.rows[rowid][m]
+                        row = self.rows[rowid]
+                        for m in range(len(row)):
+                            avgs[m] += row[m]
                     for j in range(len(avgs)):
                         avgs[j] /= len(bestmatches[i])
                     clusters[i] = avgs
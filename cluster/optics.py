@@ -0,0 +1,196 @@
+"""
+optics.py
+
+An implementation of the OPTICS ordering algorithm, written as a companion to the
+DBSCAN implementation in dbscan.py and following the pseudocode on the OPTICS
+Wikipedia page as closely as possible:
+
+http://en.wikipedia.org/wiki/OPTICS_algorithm
+
+The hardest part of using DBSCAN is picking a good search radius (eps). Every new
+guess means running the whole algorithm again, and because each point has to be
+compared against every other point, that gets expensive fast on large datasets.
+
+OPTICS gets around that problem by doing the expensive work only once. It walks the
+dataset using a maximum search radius and records two numbers for every point: its
+"core distance" (how far you have to look to find min_pts neighbors) and its
+"reachability distance" (how close it is to the dense region it was reached from).
+It also records the order in which the points were visited.
+
+With those three things in hand, the clusters DBSCAN would find for any eps at or
+below the maximum can be read off the ordering in linear time -- no more
+distance calculations required. Core points always land in the same clusters DBSCAN
+would put them in. Border points (points that sit on the edge of two clusters) may
+end up in a different one of those clusters, which is also true of DBSCAN itself
+depending on the order in which it happens to visit the data. To make that work,
+run() also remembers the closest core point to every point, which costs no extra
+distance calculations.
+
+More information about OPTICS can be found here:
+
+Ankerst, Breunig, Kriegel and Sander's original paper:
+http://www.dbs.ifi.lmu.de/Publikationen/Papers/OPTICS.pdf
+"""
+import heapq
+from dbscan import DBSCAN
+
+class OPTICS(DBSCAN):
+    """
+    Simple implementation of the OPTICS algorithm, written to mirror the Wikipedia
+    pseudocode as closely as possible: http://en.wikipedia.org/wiki/OPTICS_algorithm
+
+    d = Full dataset of point instances
+    max_eps = Largest search radius you might want to extract clusters for
+    min_pts = The minimum number of points necessary to qualify a cluster
+    """
+    def __init__(self, d, max_eps, min_pts):
+        DBSCAN.__init__(self, d, max_eps, min_pts)
+        self.ordering = []
+        self.reachability = []
+        self.core_distance = []
+        self.border_distance = []
+        self.border_of = []
+
+    def run(self):
+        """
+        Equivalent to the OPTICS function in the Wikipedia pseudocode. Builds the
+        ordering, core distances and reachability distances that extract() uses.
+        A distance of None stands in for UNDEFINED.
+        """
+        self.ordering = []
+        self.reachability = [None for i in self.d]
+        self.core_distance = [None for i in self.d]
+        self.border_distance = [None for i in self.d]
+        self.border_of = [None for i in self.d]
+        processed = [False for i in self.d]
+        # for each unprocessed point p of DB
+        for p in range(0, len(self.d)):
+            if processed[p]: continue
+            # N = getNeighbors(p, eps)
+            n = self._getNeighborDistances(p)
+            # mark p as processed and output p to the ordered list
+            processed[p] = True
+            self.ordering.append(p)
+            self.core_distance[p] = self._coreDistance(n)
+            # if core-distance(p) != UNDEFINED
+            if self.core_distance[p] is None: continue
+            # Seeds = empty priority queue
+            seeds = []
+            self._update(n, p, seeds, processed)
+            # for each next q in Seeds
+            while seeds:
+                r, q = heapq.heappop(seeds)
+                # Points whose reachability improved are pushed again rather than
+                # moved inside the heap, so skip the stale copies.
+                if processed[q] or r != self.reachability[q]: continue
+                # N' = getNeighbors(q, eps)
+                n_prime = self._getNeighborDistances(q)
+                # mark q as processed and output q to the ordered list
+                processed[q] = True
+                self.ordering.append(q)
+                self.core_distance[q] = self._coreDistance(n_prime)
+                # if core-distance(q) != UNDEFINED
+                if self.core_distance[q] is not None:
+                    self._update(n_prime, q, seeds, processed)
+
+    def extract(self, eps):
+        """
+        Reads DBSCAN-equivalent clusters for a given eps off the ordering built by
+        run(), in linear time. Sets and returns self.cluster and self.assigned in
+        the same shape DBSCAN produces them, with -1 marking noise.
+        """
+        if eps > self.eps:
+            raise ValueError("eps can't be larger than the max_eps used in run()")
+        self.assigned = [None for i in self.d]
+        self.cluster = []
+        c = -1
+        for p in self.ordering:
+            r = self.reachability[p]
+            # Not reachable from the current cluster at this radius ...
+            if r is None or r > eps or c < 0:
+                core = self.core_distance[p]
+                # ... but dense enough to start a new one.
+                if core is not None and core <= eps:
+                    c = len(self.cluster)
+                    self.cluster.append([p])
+                    self.assigned[p] = c
+                else:
+                    self.assigned[p] = -1
+            else:
+                self.cluster[c].append(p)
+                self.assigned[p] = c
+        # A border point that came up in the ordering before any of its core
+        # neighbors looks like noise above. Hang it off the closest one instead.
+        for p in self.ordering:
+            if self.assigned[p] > -1: continue
+            b = self.border_distance[p]
+            if b is not None and b <= eps:
+                c = self.assigned[self.border_of[p]]
+                self.cluster[c].append(p)
+                self.assigned[p] = c
+        return self.cluster, self.assigned
+
+    def _getNeighborDistances(self, p):
+        """
+        Like DBSCAN's _getNeighbors, but keeps the distance to each neighbor
+        because OPTICS needs it for core and reachability distances.
+        """
+        neighbors = []
+        for i in range(0, len(self.d)):
+            if i == p: continue
+            dist = self.dist(p, i)
+            if dist <= self.eps:
+                neighbors.append((i, dist))
+        return neighbors
+
+    def _coreDistance(self, n):
+        """
+        The distance to the closest neighbor that makes a point a core point, or
+        None if the point doesn't have enough neighbors within max_eps. As in
+        dbscan.py, the point itself counts toward min_pts.
+        """
+        if len(n) + 1 < self.min_pts: return None
+        if self.min_pts <= 1: return 0.0
+        return sorted([dist for (i, dist) in n])[self.min_pts - 2]
+
+    def _update(self, n, p, seeds, processed):
+        """
+        Implementation of the update portion of OPTICS, which pushes the neighbors
+        of core point p onto the seeds queue with their new reachability distance.
+        """
+        core = self.core_distance[p]
+        for (o, dist) in n:
+            # Remember the closest core point each point could hang off of as a
+            # border point. extract() needs this for points that were visited
+            # before the core points next to them.
+            if self.border_distance[o] is None or max(core, dist) < self.border_distance[o]:
+                self.border_distance[o] = max(core, dist)
+                self.border_of[o] = p
+            if processed[o]: continue
+            new_reach_dist = max(core, dist)
+            if self.reachability[o] is None or new_reach_dist < self.reachability[o]:
+                self.reachability[o] = new_reach_dist
+                heapq.heappush(seeds, (new_reach_dist, o))
+
+if __name__ == '__main__':
+    inputs = [
+        [64.8027076551225, 124.777542503783],
+        [61.2784691017587, 124.768467478454],
+        [65.8575859381817, 121.369165009353],
+        [64.9835283006541, 125.391495652962],
+        [62.1238012316264, 123.204219085909],
+        [63.9025102113464, 122.528127324581],
+        [161.896748456871, 25.0696552938316],
+        [159.447019318864, 27.3158016372379],
+        [163.291358458344, 26.5271370541305],
+        [160.764837651327, 23.8744532838390],
+        [162.004512038571, 28.1947305126488],
+        [124.536306126043, 102.949803235009],
+        [23.1287293771747, 60.9901472011115],
+    ]
+
+    a = OPTICS(inputs, max_eps=10, min_pts=4)
+    a.run()
+    # One expensive pass above, then cheap extractions for as many radii as you like.
+    for eps in [2, 4, 10]:
+        print eps, a.extract(eps)
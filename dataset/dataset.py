@@ -0,0 +1,528 @@
+'''
+dataset.py
+
+A loader that turns a CSV file into a store the algorithms in this toolkit can
+all read from, without holding the whole file in memory as Python objects.
+
+Reading a CSV into a list of lists is the easy way to get data into KMeans or
+buildtree, but it's an expensive one. Every value becomes its own Python
+object -- a float takes 24 bytes, and a string several times its length -- plus
+a pointer to it in a list, so a file can easily take up ten times its own size
+in memory, and parsing it all can take longer than the algorithm itself.
+
+Instead, load() reads the file once, a row at a time, and writes each column out
+to its own file in a cache directory next to it:
+
+* Numeric columns are stored as raw 8-byte floating point numbers, one after
+  another, with empty cells stored as NaN ("not a number"). Algorithms that
+  measure distances won't take numeric columns with empty cells.
+* Everything else is treated as a categorical column: each distinct value gets
+  an integer code, the codes are stored as raw 4-byte integers, and the
+  dictionary of values is stored once, in a small JSON file.
+
+A JSON file of metadata says which column is which. The next time load() is
+called on the same file, it finds the cache and opens it straight away, without
+reading the CSV at all.
+
+The column files are opened with mmap (http://docs.python.org/library/mmap.html),
+so the operating system reads them into memory only as they're used and shares
+them between processes. Values are unpacked one at a time as they're asked for,
+or a chunk at a time when a column is read from start to finish.
+
+Which columns are numeric is worked out from the first SNIFF_ROWS rows. If a
+column looks numeric there but turns out not to be further down, load() stops
+and says so; pass the column's type in types to get past it.
+
+The algorithms (KMeans, DBSCAN, kNNClassifier, NaiveBayes, buildtree and
+RandomForest) all accept a Dataset in place of their usual list of rows. One
+column can be set aside as the label -- the class the classifiers learn to
+predict -- and each algorithm asks the Dataset for rows in the shape it's used to
+with rows(), or reads whole columns with column().
+
+Example:
+
+    from dataset.dataset import load
+    data = load('contributions.csv', label='party')
+    tree = buildtree(data)
+'''
+import csv
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import chain, islice, izip
+
+# The number of rows used to guess which columns are numeric
+SNIFF_ROWS = 1000
+
+# The number of rows of each column collected in memory before being written out
+WRITE_BUFFER_ROWS = 65536
+
+# The number of values read at a time when a column is read from start to finish
+READ_CHUNK_VALUES = 65536
+
+# Bumped whenever the layout of the cache changes, so old caches are rebuilt
+FORMAT_VERSION = 2
+
+METADATA = 'metadata.json'
+
+NUMERIC = 'numeric'
+CATEGORICAL = 'categorical'
+
+BYTE_ORDER = '<' if sys.byteorder == 'little' else '>'
+
+class Column(object):
+    """
+    One column of numbers, read out of a memory-mapped file of raw values. It
+    works like a read-only list: it has a length, can be indexed and iterated
+    over, and can be copied into an array with values().
+    """
+    def __init__(self, name, path, typecode, length):
+        self.name = name
+        self.typecode = typecode
+        self.length = length
+        self._struct = struct.Struct(BYTE_ORDER + typecode)
+        self._file = None
+        self._map = None
+        if length:
+            self._file = open(path, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.length))]
+        if i < 0: i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError('%s index out of range' % self.name)
+        return self._struct.unpack_from(self._map, i * self._struct.size)[0]
+
+    def __iter__(self):
+        for start in range(0, self.length, READ_CHUNK_VALUES):
+            for value in self.values(start, start + READ_CHUNK_VALUES):
+                yield value
+
+    def values(self, start=0, stop=None):
+        """
+        Copies a stretch of the column (all of it, by default) into an array.
+        """
+        if stop is None or stop > self.length: stop = self.length
+        values = array(self.typecode)
+        if start < stop:
+            values.fromstring(self._map[start * values.itemsize:stop * values.itemsize])
+        return values
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+
+class NumericColumn(Column):
+    """
+    A column of floating point numbers. min and max are the smallest and
+    largest values in it, leaving out missing ones, and missing is how many
+    missing (NaN) values it has.
+    """
+    kind = NUMERIC
+
+    def __init__(self, name, path, length, min=None, max=None, missing=0):
+        Column.__init__(self, name, path, 'd', length)
+        self.min = min
+        self.max = max
+        self.missing = missing
+
+class CategoricalColumn(object):
+    """
+    A column of categorical values, stored as integer codes. Indexing and
+    iterating give back the values themselves; codes is the Column of codes,
+    and dictionary the list of values, so that dictionary[code] is the value
+    a code stands for.
+    """
+    kind = CATEGORICAL
+
+    def __init__(self, name, path, length, dictionary):
+        self.name = name
+        self.codes = Column(name, path, 'i', length)
+        self.dictionary = dictionary
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.dictionary[code] for code in self.codes[i]]
+        return self.dictionary[self.codes[i]]
+
+    def __iter__(self):
+        dictionary = self.dictionary
+        for code in self.codes:
+            yield dictionary[code]
+
+    def close(self):
+        self.codes.close()
+
+class Rows(object):
+    """
+    A read-only, list-like view of some of a Dataset's columns as rows. Each row
+    is put together as a list when it's asked for, so a Rows can stand in for
+    the list of lists an algorithm expects, without the whole thing ever being
+    in memory at once.
+
+    With text set, numbers are written back out as text (see _format_number),
+    so every value in a row is a string, as it would be from a csv.reader.
+    """
+    def __init__(self, columns, text=False):
+        self.columns = columns
+        self.length = columns and len(columns[0]) or 0
+        self._numeric = [text and column.kind == NUMERIC for column in columns]
+        self._text = True in self._numeric
+
+    def __len__(self):
+        return self.length
+
+    def _row(self, values):
+        if not self._text: return list(values)
+        # Not "numeric and _format_number(value) or value": a missing value
+        # formats as '', which is false
+        return [_format_number(value) if numeric else value
+                for (numeric, value) in zip(self._numeric, values)]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.length))]
+        return self._row([column[i] for column in self.columns])
+
+    def __iter__(self):
+        for row in izip(*self.columns):
+            yield self._row(row)
+
+class Dataset(object):
+    """
+    A CSV file's columns, as stored in a cache directory by build(). Use load()
+    to get one.
+
+    label = The name of the column holding each row's class, if there is one.
+        It's left out of features(), and rows() can put it first or last.
+    """
+    def __init__(self, directory, label=None):
+        self.directory = directory
+        with open(os.path.join(directory, METADATA)) as f:
+            self.metadata = json.load(f)
+        if self.metadata['byte_order'] != BYTE_ORDER:
+            raise ValueError('%s was built on a machine with a different byte order' % directory)
+        self.length = self.metadata['rows']
+        # JSON gives back unicode; the csv module gave us bytes in the file's encoding
+        encoding = self.metadata['encoding']
+        self.names = [column['name'].encode(encoding) for column in self.metadata['columns']]
+        if label is not None and label not in self.names:
+            raise KeyError('%s has no column named %r' % (directory, label))
+        self.label = label
+        self._columns = {}
+        for (name, column) in zip(self.names, self.metadata['columns']):
+            path = os.path.join(directory, column['file'])
+            if column['kind'] == NUMERIC:
+                self._columns[name] = NumericColumn(name, path, self.length, column['min'],
+                                                    column['max'], column['missing'])
+            else:
+                with open(os.path.join(directory, column['dictionary'])) as f:
+                    dictionary = [value.encode(encoding) for value in json.load(f)]
+                self._columns[name] = CategoricalColumn(name, path, self.length, dictionary)
+
+    def __len__(self):
+        return self.length
+
+    def column(self, name):
+        """
+        Returns the column with the given name, as a NumericColumn or a
+        CategoricalColumn.
+        """
+        return self._columns[name]
+
+    def features(self, numeric=False):
+        """
+        Returns every column but the label, in the order they're in the file.
+        With numeric set, only the numeric ones are returned, for algorithms
+        that measure distances between rows. There's no distance to or from a
+        missing value, so then a ValueError is raised if any of those columns
+        has one, rather than letting NaN quietly turn every distance into NaN.
+        """
+        columns = [self._columns[name] for name in self.names if name != self.label
+                   and (not numeric or self._columns[name].kind == NUMERIC)]
+        if numeric:
+            for column in columns:
+                if column.missing:
+                    raise ValueError('column %r of %s has %d missing values, so distances '
+                                     "can't be measured. Fill them in, or leave those rows "
+                                     'out of the CSV.' % (column.name, self.directory,
+                                                          column.missing))
+        return columns
+
+    def rows(self, label=None, numeric=False, text=False):
+        """
+        Returns the features as a list-like Rows view, in the shape the
+        algorithms in this toolkit expect. label says where to put the label
+        column: 'first' (as NaiveBayes and kNNClassifier want it), 'last' (as
+        buildtree does) or None to leave it out (as KMeans and DBSCAN do).
+
+        text turns numbers back into strings, for algorithms like NaiveBayes
+        that treat every value as a category and are trained or queried with
+        rows straight from a csv.reader too. A number comes back the way
+        _format_number writes it, which is how most CSV files write numbers,
+        but not all: a column written like 0.30 or 1e6 comes back as 0.3 or
+        1000000, and won't match the same values read from the file. Give such
+        columns the categorical type in load() to keep them exactly as written.
+        """
+        columns = self.features(numeric)
+        if label is not None:
+            if self.label is None:
+                raise ValueError('%s has no label column' % self.directory)
+            if label == 'first':
+                columns = [self._columns[self.label]] + columns
+            elif label == 'last':
+                columns = columns + [self._columns[self.label]]
+            else:
+                raise ValueError("label must be 'first', 'last' or None, not %r" % label)
+        return Rows(columns, text)
+
+    def close(self):
+        for column in self._columns.values(): column.close()
+
+def _parse_number(value):
+    """
+    Parses a numeric cell. Empty cells are missing values, stored as NaN.
+    """
+    value = value.strip()
+    if not value: return float('nan')
+    return float(value)
+
+def _format_number(value):
+    """
+    Writes a number from a numeric column back out as text: whole numbers
+    without a decimal point (500, not 500.0), missing values as empty cells,
+    and anything else as the shortest text that reads back as the same number.
+    """
+    if math.isnan(value): return ''
+    if value.is_integer(): return '%d' % value
+    return repr(value)
+
+def _looks_numeric(values):
+    """
+    Whether a column's first values are all numbers (or empty), with at least
+    one number among them.
+    """
+    found = False
+    for value in values:
+        if not value.strip(): continue
+        try:
+            float(value)
+        except ValueError:
+            return False
+        found = True
+    return found
+
+def _source(path):
+    """
+    What the cache remembers about the CSV file it was built from, to tell when
+    the file has changed since.
+    """
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+def _write_metadata(directory, metadata, encoding):
+    """
+    Replaces a cache's metadata file in one step, so it's never half written.
+    """
+    path = os.path.join(directory, METADATA)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(metadata, f, indent=1, encoding=encoding)
+    os.rename(path + '.tmp', path)
+
+def _check_text(value, encoding, path, line):
+    """
+    Makes sure a name or categorical value can be stored as text in the given
+    encoding, before building gets any further.
+    """
+    try:
+        value.decode(encoding)
+    except UnicodeDecodeError:
+        raise ValueError("%s, line %d: %r isn't valid %s. Pass the file's encoding with "
+                         "encoding=, or encoding='latin-1' to take it byte for byte."
+                         % (path, line, value, encoding))
+
+def _clear(directory):
+    """
+    Deletes the files of the cache in directory, if there is one. Only the
+    files its metadata lists are deleted, so nothing else that happens to be in
+    the directory is touched; and a directory that has other files in it but
+    no metadata isn't used at all.
+    """
+    path = os.path.join(directory, METADATA)
+    if not os.path.exists(path):
+        if os.listdir(directory):
+            raise ValueError("%s isn't empty, and doesn't hold a dataset cache. Use an "
+                             "empty directory for the cache." % directory)
+        return
+    with open(path) as f:
+        metadata = json.load(f)
+    os.remove(path)
+    for column in metadata.get('columns', []):
+        for name in (column.get('file'), column.get('dictionary')):
+            if name and os.path.exists(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+
+def build(path, directory, types=None, delimiter=',', encoding='utf-8'):
+    """
+    Reads a CSV file with a header row, one row at a time, and writes its
+    columns into directory. types is an optional dict of {column name: 'numeric'
+    or 'categorical'}; any column not in it is guessed from the first SNIFF_ROWS
+    rows. encoding is the character encoding of the file, which the JSON
+    files of column names and categorical values need to know to store text.
+    A file with a mix of encodings, or that isn't really text, can be read as
+    'latin-1', which has a character for every possible byte.
+
+    Before any column is written, the metadata file lists the files the build
+    is about to write, so they can be cleaned up even if it fails part of the
+    way through. It only gets the rest of the metadata (and so only looks like
+    a finished cache) at the very end. The files of an old cache are deleted
+    rather than written over, so a Dataset that still has them open keeps
+    working.
+    """
+    if not os.path.isdir(directory): os.makedirs(directory)
+    _clear(directory)
+
+    with open(path, 'rb') as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        names = next(reader)
+        for name in names: _check_text(name, encoding, path, 1)
+        head = list(islice(reader, SNIFF_ROWS))
+        kinds = []
+        for (i, name) in enumerate(names):
+            if types and name in types:
+                kinds.append(types[name])
+            elif _looks_numeric([row[i] for row in head if i < len(row)]):
+                kinds.append(NUMERIC)
+            else:
+                kinds.append(CATEGORICAL)
+
+        columns = []
+        for (i, name) in enumerate(names):
+            if kinds[i] == NUMERIC:
+                columns.append({'name': name, 'kind': kinds[i], 'file': '%05d.f64' % i})
+            else:
+                columns.append({'name': name, 'kind': kinds[i], 'file': '%05d.i32' % i,
+                                'dictionary': '%05d.json' % i})
+        _write_metadata(directory, {'columns': columns}, encoding)
+
+        files = [open(os.path.join(directory, column['file']), 'wb') for column in columns]
+        buffers = [array(kind == NUMERIC and 'd' or 'i') for kind in kinds]
+        codes = [{} for name in names] # For each categorical column, value -> code
+        mins = [None] * len(names)
+        maxes = [None] * len(names)
+        missing = [0] * len(names)
+        count = 0
+        try:
+            for row in chain(head, reader):
+                # The rows read ahead for guessing types are long past by now
+                line = count < len(head) and count + 2 or reader.line_num
+                if len(row) != len(names):
+                    raise ValueError('%s, line %d: expected %d columns, found %d'
+                                     % (path, line, len(names), len(row)))
+                for i in range(len(names)):
+                    if kinds[i] == NUMERIC:
+                        try:
+                            value = _parse_number(row[i])
+                        except ValueError:
+                            raise ValueError("%s, line %d: column %r looked numeric, but has the "
+                                             "value %r. Pass types={%r: 'categorical'} to load it."
+                                             % (path, line, names[i], row[i], names[i]))
+                        if math.isnan(value):
+                            missing[i] += 1
+                        else:
+                            if mins[i] is None or value < mins[i]: mins[i] = value
+                            if maxes[i] is None or value > maxes[i]: maxes[i] = value
+                    else:
+                        value = codes[i].get(row[i])
+                        if value is None:
+                            _check_text(row[i], encoding, path, line)
+                            value = codes[i][row[i]] = len(codes[i])
+                    buffers[i].append(value)
+                count += 1
+                if count % WRITE_BUFFER_ROWS == 0:
+                    for i in range(len(names)):
+                        buffers[i].tofile(files[i])
+                        buffers[i] = array(buffers[i].typecode)
+            for i in range(len(names)):
+                buffers[i].tofile(files[i])
+        finally:
+            for f in files: f.close()
+
+    for (i, column) in enumerate(columns):
+        if kinds[i] == NUMERIC:
+            column['min'] = mins[i]
+            column['max'] = maxes[i]
+            column['missing'] = missing[i]
+        else:
+            dictionary = [None] * len(codes[i])
+            for (value, code) in codes[i].iteritems(): dictionary[code] = value
+            with open(os.path.join(directory, column['dictionary']), 'w') as f:
+                json.dump(dictionary, f, encoding=encoding)
+    _write_metadata(directory, {'version': FORMAT_VERSION, 'byte_order': BYTE_ORDER,
+                                'encoding': encoding, 'source': _source(path), 'rows': count,
+                                'columns': columns}, encoding)
+
+def load(path, label=None, types=None, directory=None, delimiter=',', encoding='utf-8'):
+    """
+    Returns a Dataset of the CSV file at path, building the cache first unless
+    there's already one for the file as it is now. The cache goes in directory,
+    or <path>.cache by default, which has to be empty or hold a cache already.
+
+    label = The name of the column holding the class, for the classifiers
+    types = A dict of {column name: 'numeric' or 'categorical'}, for columns
+        whose type shouldn't be guessed
+    encoding = The character encoding of the file (see build)
+    """
+    if directory is None: directory = path + '.cache'
+    try:
+        with open(os.path.join(directory, METADATA)) as f:
+            metadata = json.load(f)
+        current = (metadata['version'] == FORMAT_VERSION and metadata['source'] == _source(path)
+                   and metadata['encoding'] == encoding)
+        if current and types:
+            kinds = dict([(column['name'], column['kind']) for column in metadata['columns']])
+            current = all([kinds.get(name) == kind for (name, kind) in types.items()])
+    except (IOError, ValueError, KeyError):
+        current = False
+    if not current:
+        build(path, directory, types, delimiter, encoding)
+    return Dataset(directory, label)
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+    parser = OptionParser(usage='%prog CSV [options]')
+    parser.add_option('--cache', metavar='DIR',
+        help='Where to put the cache (default: CSV.cache)')
+    parser.add_option('--categorical', action='append', default=[], metavar='COLUMN',
+        help='Treat COLUMN as categorical, even if it looks numeric')
+    parser.add_option('--numeric', action='append', default=[], metavar='COLUMN',
+        help='Treat COLUMN as numeric, even if it looks categorical')
+    parser.add_option('--encoding', default='utf-8',
+        help='Character encoding of the CSV file (default: %default)')
+    (options, args) = parser.parse_args()
+    if len(args) != 1:
+        parser.error('one CSV file is required')
+    types = dict([(name, CATEGORICAL) for name in options.categorical] +
+                 [(name, NUMERIC) for name in options.numeric])
+    data = load(args[0], types=types, directory=options.cache, encoding=options.encoding)
+    print '%d rows in %s' % (len(data), data.directory)
+    for name in data.names:
+        column = data.column(name)
+        if column.kind == NUMERIC:
+            print '    %s: numeric, %r to %r' % (name, column.min, column.max)
+        else:
+            print '    %s: categorical, %d values' % (name, len(column.dictionary))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+from itertools import groupby
+from operator import itemgetter
+import sys
+from optparse import OptionParser
+
+# Only print document pairs whose cosine similarity is above this. Must be the
+# same number prefix-reducer.py is given.
+SIMILARITY_THRESHOLD = 0.9
+
+def read_mapper_output(file, separator):
+    """
+    Generator to limit memory usage while reading input.
+    """
+    for line in file:
+        yield line.rstrip().split(separator)
+
+def report_counter(name, amount):
+    """
+    Reports a counter the way Hadoop Streaming expects it, on stderr.
+    """
+    sys.stderr.write('reporter:counter:allpairs,%s,%d\n' % (name, amount))
+
+def parse_record(fields):
+    """
+    Parses a record written by prefix-reducer.py into the document ID, the
+    length of its prefix, its biggest weight, the sum of its weights, and its
+    vector: a list of ((document frequency, term), weight) pairs sorted from
+    rarest term to most common.
+    """
+    vector = []
+    for field in fields[5:]:
+        term, df, weight = field.rsplit(':', 2)
+        vector.append(((int(df), term), float(weight)))
+    return fields[1], int(fields[2]), float(fields[3]), float(fields[4]), vector
+
+def first_common_term(vector1, prefix1, vector2, prefix2):
+    """
+    The rarest term two documents both have in their prefixes. Both vectors are
+    sorted in the same order, so this is a walk down the two of them at once.
+    """
+    i = j = 0
+    while i < prefix1 and j < prefix2:
+        key1, key2 = vector1[i][0], vector2[j][0]
+        if key1 == key2: return key1[1]
+        if key1 < key2: i += 1
+        else: j += 1
+    return None
+
+def dot_product(vector1, vector2):
+    """
+    The dot product of two sorted vectors, which is their cosine similarity
+    since they've been normalized to a length of 1.
+    """
+    total = 0.0
+    i = j = 0
+    while i < len(vector1) and j < len(vector2):
+        key1, key2 = vector1[i][0], vector2[j][0]
+        if key1 == key2:
+            total += vector1[i][1] * vector2[j][1]
+            i += 1
+            j += 1
+        elif key1 < key2:
+            i += 1
+        else:
+            j += 1
+    return total
+
+def main(threshold=SIMILARITY_THRESHOLD, separator='\t'):
+    """
+    The last step of the all-pairs similarity search, which finds every pair of
+    documents with a cosine similarity above a threshold without scoring every
+    pair that shares a word.
+
+    The pipeline is:
+
+    norms-mapper -> sort -> norms-reducer (document norms, see pairwise-reducer.py)
+    prefix-mapper -> sort -> prefix-reducer (see those scripts)
+    cat -> sort -> allpairs-reducer
+
+    prefix-reducer.py indexes each document only under its rarest terms, and
+    guarantees that any pair similar enough to print has at least one of them
+    in common. So documents only meet here under rare terms, with short
+    posting lists, and each term's list is compared pair by pair:
+
+    1. First against a cheap upper bound. A pair's score can't be more than one
+       document's biggest weight times the sum of the other's weights, so if
+       that's not above the threshold, the pair is skipped.
+
+    2. A pair meets under every prefix term the two documents share, but is
+       only scored under the rarest of them, so it's never printed twice.
+
+    3. Then the full vectors that came along with the records are used to work
+       out the actual score, which is printed if it's above the threshold.
+
+    This is the approach described in Bayardo, Ma and Srikant, "Scaling Up All
+    Pairs Similarity Search": http://www2007.org/papers/paper342.pdf
+
+    Input (from prefix-reducer.py, sorted):
+
+    term    docid   prefix_length   max_weight  weight_sum  term1:df1:weight1   term2:df2:weight2 ...
+    ...
+
+    Output (in the same form as pairwise-reducer.py --norms):
+
+    "docid1|docid2"        0.95
+    ...
+    """
+    data = read_mapper_output(sys.stdin, separator)
+    candidates = bounded = duplicates = emitted = 0
+
+    # Input from the mapper is sorted by key by map/reduce. This groups the
+    # input by term.
+    for term, group in groupby(data, itemgetter(0)):
+        documents = [parse_record(fields) for fields in group]
+        for i in range(len(documents)):
+            docid1, prefix1, maxweight1, total1, vector1 = documents[i]
+            for j in range(i + 1, len(documents)):
+                docid2, prefix2, maxweight2, total2, vector2 = documents[j]
+                # Don't produce output for a document compared against itself.
+                if docid1[:8] == docid2[:8]: continue
+                candidates += 1
+
+                if min(maxweight1 * total2, maxweight2 * total1) <= threshold:
+                    bounded += 1
+                    continue
+                if first_common_term(vector1, prefix1, vector2, prefix2) != term:
+                    duplicates += 1
+                    continue
+
+                similarity = dot_product(vector1, vector2)
+                if similarity > threshold:
+                    emitted += 1
+                    if docid2 < docid1:
+                        print "%s|%s\t%s" % (docid2, docid1, similarity)
+                    else:
+                        print "%s|%s\t%s" % (docid1, docid2, similarity)
+
+    report_counter('candidate pairs', candidates)
+    report_counter('pairs pruned by bound', bounded)
+    report_counter('duplicate pairs', duplicates)
+    report_counter('pairs emitted', emitted)
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('--threshold', type='float', default=SIMILARITY_THRESHOLD,
+        help='Only print pairs with a cosine similarity above this (default: %default)')
+    (options, args) = parser.parse_args()
+    main(options.threshold)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+import ast
+import sys
+
+def read_index(stdin):
+    """
+    Generator to limit memory usage while reading input.
+    """
+    for line in stdin:
+        yield line.rstrip('\r\n')
+
+def format_postings(term, postings, separator='\t'):
+    """
+    Formats a term and its posting list the same way inv-index-reducer.py does:
+
+    term    docid1:weight1    docid2:weight2 ...
+    """
+    fields = [term]
+    for (docid, weight) in postings:
+        fields.append('%s:%r' % (docid, weight))
+    return separator.join(fields)
+
+def main(separator='\t'):
+    """
+    Converts an inverted index written by older versions of inv-index-reducer.py,
+    which printed each term's posting list as a Python dictionary:
+
+    term        {'docidx': 0.5, 'docidy': 1.0 ...}
+
+    into the tab-separated format the reducer writes now:
+
+    term        docidx:0.5      docidy:1.0 ...
+
+    The dictionaries are read with ast.literal_eval, which only understands plain
+    Python values, so unlike eval it can't be made to run arbitrary code. Postings
+    are written out sorted by document ID, the order the reducer produces them in.
+    """
+    for line in read_index(sys.stdin):
+        if not line: continue
+        term, postings = line.split(separator, 1)
+        postings = ast.literal_eval(postings)
+        print format_postings(term, sorted((str(docid), float(weight))
+            for (docid, weight) in postings.items()))
+
+if __name__ == "__main__":
+    main()
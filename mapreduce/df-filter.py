@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+import sys
+from optparse import OptionParser
+from indexfiles import read_document_count
+
+# The number of documents in your entire document set, if it isn't given with
+# --documents or read from a statistics file with --stats. Should match the
+# number inv-index-reducer.py used.
+DOCUMENT_SET_LENGTH = 100
+
+def read_index(stdin):
+    """
+    Generator to limit memory usage while reading input.
+    """
+    for line in stdin:
+        yield line.rstrip()
+
+def report_counter(name, amount):
+    """
+    Reports a counter the way Hadoop Streaming expects it, on stderr.
+    """
+    sys.stderr.write('reporter:counter:df-filter,%s,%d\n' % (name, amount))
+
+def cutoff(max_postings=None, max_df=None, documents=DOCUMENT_SET_LENGTH):
+    """
+    The longest posting list to keep, given a maximum number of postings and/or
+    a maximum document frequency (the share of all documents a term appears in,
+    between 0 and 1). None means keep everything.
+    """
+    limits = []
+    if max_postings is not None: limits.append(max_postings)
+    if max_df is not None: limits.append(int(max_df * documents))
+    return min(limits) if limits else None
+
+def main(max_postings=None, report=None):
+    """
+    Sits between inv-index-reducer.py and pairwise-mapper.py and drops terms
+    that appear in too many documents.
+
+    The pairwise mapper emits one line for every pair of documents that share a
+    term, so a term in n documents costs n(n-1)/2 lines: 4,950 for a term in 100
+    documents, and about 5 billion for one in 100,000. Terms that common are
+    mostly words like "the" and "section", which get a tiny IDF weight and say
+    next to nothing about which documents are alike, so dropping them costs
+    very little accuracy for what can be most of the job's work.
+
+    Lines of the index (see inv-index-reducer.py) with more than max_postings
+    postings are dropped, and everything else is passed through unchanged. The
+    number of pair emissions kept and avoided are reported as counters. If
+    report is a file name, the dropped terms are written there with their
+    document frequencies, most common first. That file can be given to
+    inv-index-mapper.py with --stopwords, so the terms are left out from the
+    start next time.
+    """
+    kept = dropped = 0
+    emitted = avoided = 0
+    stopwords = []
+    for line in read_index(sys.stdin):
+        # There's a tab in front of every posting
+        n = line.count('\t')
+        pairs = n * (n - 1) / 2
+        if max_postings is not None and n > max_postings:
+            dropped += 1
+            avoided += pairs
+            stopwords.append((n, line.split('\t', 1)[0]))
+            continue
+        kept += 1
+        emitted += pairs
+        print line
+
+    report_counter('terms kept', kept)
+    report_counter('terms dropped', dropped)
+    report_counter('pair emissions kept', emitted)
+    report_counter('pair emissions avoided', avoided)
+
+    if report is not None:
+        stopwords.sort(key=lambda (n, term): (-n, term))
+        with open(report, 'w') as f:
+            for (n, term) in stopwords:
+                f.write('%s\t%d\n' % (term, n))
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('--max-postings', type='int',
+        help='Drop terms that appear in more than this many documents')
+    parser.add_option('--max-df', type='float',
+        help='Drop terms that appear in more than this share (0 to 1) of documents')
+    parser.add_option('--documents', type='int',
+        help='Number of documents in the set, for --max-df (default: %d)' % DOCUMENT_SET_LENGTH)
+    parser.add_option('--stats', metavar='FILE',
+        help='Read the number of documents from a stats-reducer.py output FILE')
+    parser.add_option('--report', metavar='FILE',
+        help='Write the dropped terms and their document frequencies to FILE')
+    (options, args) = parser.parse_args()
+    documents = options.documents
+    if documents is None and options.stats:
+        documents = read_document_count(options.stats)
+    if documents is None:
+        documents = DOCUMENT_SET_LENGTH
+    main(cutoff(options.max_postings, options.max_df, documents), options.report)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+import sys, math
+from optparse import OptionParser
+
+def read_index(file, separator='\t'):
+    """
+    Generator that reads a raw inverted index (inv-index-reducer.py --raw) one
+    term at a time, as the term and its list of (docid, term frequency) pairs.
+    The frequencies are left as the text they were written as, so they're
+    copied through exactly.
+    """
+    for line in file:
+        fields = line.rstrip().split(separator)
+        yield fields[0], [tuple(field.rsplit(':', 1)) for field in fields[1:]]
+
+def format_postings(term, postings, separator='\t'):
+    """
+    Formats a term and its posting list the same way inv-index-reducer.py does.
+    """
+    fields = [term]
+    for (docid, weight) in postings:
+        fields.append('%s:%s' % (docid, weight))
+    return separator.join(fields)
+
+def get_idf(docs_containing_term, documents):
+    return math.log(float(documents) / float(docs_containing_term))
+
+def merge_indexes(old, new, new_ids):
+    """
+    Merges the terms of two raw indexes, both sorted by term, into one. Where a
+    term is in both, the posting lists are combined. Documents in new_ids have
+    all of their old postings dropped, so a document that's been changed since
+    it was last indexed is replaced rather than counted twice.
+    """
+    old_term, old_postings = next(old, (None, None))
+    for (term, postings) in new:
+        # Terms that only the old index has
+        while old_term is not None and old_term < term:
+            kept = [posting for posting in old_postings if posting[0] not in new_ids]
+            if kept: yield old_term, kept
+            old_term, old_postings = next(old, (None, None))
+        if old_term == term:
+            kept = [posting for posting in old_postings if posting[0] not in new_ids]
+            postings = sorted(kept + postings)
+            old_term, old_postings = next(old, (None, None))
+        yield term, postings
+    while old_term is not None:
+        kept = [posting for posting in old_postings if posting[0] not in new_ids]
+        if kept: yield old_term, kept
+        old_term, old_postings = next(old, (None, None))
+
+def main(old_path, raw_path, new_ids_path=None, documents=None, stats_path=None,
+         output=sys.stdout):
+    """
+    Adds newly indexed documents to an existing index, so a few new documents
+    don't mean indexing the whole archive over again.
+
+    It takes a raw index of the new documents (inv-index-reducer.py --raw, which
+    keeps plain term frequencies) on stdin, and the raw index of the archive
+    from old_path. They're merged into a new raw index of everything, written
+    to raw_path, for next time. Then that's re-weighted into the TF-IDF index
+    the pairwise job reads, which goes to stdout. Every IDF weight changes when
+    the number of documents does, which is why the archive's index has to be
+    kept raw. The number of documents is the number in the merged index,
+    unless it's given.
+
+    If new_ids_path is given, the IDs of the new documents are written there,
+    for pairwise-mapper.py --new-ids. If stats_path is given, the number of
+    documents is written there in the form stats-reducer.py uses, for stages
+    like df-filter.py --stats.
+
+    Both indexes are read one term at a time, except that the new documents'
+    index is read into memory first (it's small) to find out which documents
+    are new.
+
+    Input (on stdin and in old_path):
+
+    term        docidx:tf       docidy:tf ...
+
+    Output (to stdout, the same as inv-index-reducer.py):
+
+    term        docidx:tfidf    docidy:tfidf ...
+    """
+    new = list(read_index(sys.stdin))
+    new_ids = set()
+    for (term, postings) in new:
+        new_ids.update([docid for (docid, tf) in postings])
+
+    docids = set()
+    if old_path is not None:
+        old_file = open(old_path)
+        old = read_index(old_file)
+    else:
+        old_file = None
+        old = iter([])
+    try:
+        with open(raw_path, 'w') as raw:
+            for (term, postings) in merge_indexes(old, iter(new), new_ids):
+                if documents is None:
+                    docids.update([docid for (docid, tf) in postings])
+                raw.write(format_postings(term, postings) + '\n')
+    finally:
+        if old_file is not None: old_file.close()
+    if documents is None:
+        documents = len(docids)
+
+    # Now that the number of documents is known, weight the merged index.
+    with open(raw_path) as raw:
+        for (term, postings) in read_index(raw):
+            idf = get_idf(len(postings), documents)
+            output.write(format_postings(term, [(docid, repr(float(tf) * idf))
+                for (docid, tf) in postings]) + '\n')
+
+    if stats_path is not None:
+        with open(stats_path, 'w') as f:
+            f.write('count\tdocuments\t%d\n' % documents)
+
+    if new_ids_path is not None:
+        with open(new_ids_path, 'w') as f:
+            for docid in sorted(new_ids):
+                f.write(docid + '\n')
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('--old', metavar='FILE',
+        help='Raw index of the documents already indexed (default: none)')
+    parser.add_option('--raw-output', metavar='FILE',
+        help='Where to write the merged raw index')
+    parser.add_option('--new-ids', metavar='FILE',
+        help='Where to write the IDs of the new documents')
+    parser.add_option('--stats-output', metavar='FILE',
+        help='Where to write the number of documents in the merged index')
+    parser.add_option('--documents', type='int',
+        help='Number of documents in the merged index (default: count them)')
+    (options, args) = parser.parse_args()
+    if not options.raw_output:
+        parser.error('--raw-output is required')
+    main(options.old, options.raw_output, options.new_ids, options.documents,
+         options.stats_output)
@@ -0,0 +1,58 @@
+"""
+indexfiles.py
+
+Reads the files the jobs of the document similarity workflow hand to each
+other: lines of the inverted index, the statistics written by stats-reducer.py
+and the document norms written by norms-reducer.py. Several scripts read each
+of them, and they all have to read them the same way, so the code is here.
+
+On Hadoop Streaming, ship this file along with any script that uses it
+(-file indexfiles.py), as with tokenizer.py.
+"""
+
+def read_postings(fields):
+    """
+    Turns docid:weight fields into a list of (docid, weight) pairs. Document
+    IDs can contain colons; the weight is whatever follows the last one.
+    """
+    postings = []
+    for field in fields:
+        docid, weight = field.rsplit(':', 1)
+        postings.append((docid, float(weight)))
+    return postings
+
+def parse_postings(line, separator='\t'):
+    """
+    Parses one line of the inverted index written by inv-index-reducer.py:
+
+    term    docid1:weight1    docid2:weight2 ...
+
+    Returns the term and a list of (docid, weight) pairs.
+    """
+    fields = line.split(separator)
+    return fields[0], read_postings(fields[1:])
+
+def read_document_count(path, separator='\t'):
+    """
+    Reads the number of documents in the document set out of the statistics
+    file written by stats-reducer.py. It's on the first line, so the rest of
+    the file (which can be big) isn't read.
+    """
+    with open(path) as f:
+        for line in f:
+            fields = line.rstrip().split(separator)
+            if fields[:2] == ['count', 'documents']:
+                return int(fields[2])
+            if fields[0] != 'count': break
+    raise ValueError("%s doesn't say how many documents there are" % path)
+
+def read_norms(path, separator='\t'):
+    """
+    Reads the document norms written by norms-reducer.py into a dictionary.
+    """
+    norms = {}
+    with open(path) as f:
+        for line in f:
+            docid, norm = line.rstrip().split(separator)
+            norms[docid] = float(norm)
+    return norms
@@ -1,6 +1,15 @@
 #!/usr/bin/python
 
 import sys
+from optparse import OptionParser
+from tokenizer import make_tokenizer, add_options, from_options
+
+# Write output in batches of this many lines, rather than one line at a time.
+OUTPUT_BUFFER_LINES = 10000
+
+# The most terms --stats keeps document frequencies for in memory at once. When
+# the table fills up, it's written out and emptied.
+STATS_MAX_TERMS = 100000
 
 def freq(word, document):
   """
@@ -33,7 +42,15 @@ def read_mapper_input(stdin):
     for line in stdin:
         yield line.rstrip()
 
-def main():
+def write_stats(name, counts, output=sys.stdout):
+    """
+    Writes out and empties a table of counts for --stats.
+    """
+    output.write(''.join(['%s\t%s\t%d\n' % (name, key, count)
+        for (key, count) in counts.iteritems()]))
+    counts.clear()
+
+def main(tokenize=None, output=sys.stdout, stats=False):
     """
     The first step in this comparison process is to create an inverted index to
     make document comparison faster and more efficient.
@@ -56,25 +73,73 @@ def main():
     document 2       1
     ...
     word    docidx   tf 
+    
+    With stats set, the mapper produces statistics about the document set for
+    stats-reducer.py instead: the number of documents, the number of documents
+    each term appears in (its document frequency) and the number of words in
+    each document. Because it breaks documents into words with the same code,
+    the numbers always agree with the index.
+    
+    count    documents   1
+    df       this        1
+    df       document    2
+    length   docid       5
+    ...
     """
+    if tokenize is None: tokenize = make_tokenizer()
+    buffer = []
+    documents = 0
+    df = {}
     for line in read_mapper_input(sys.stdin):
         # Split document ID and document string
         docid = line.split('|')[0]
         document = line.split('|')[1]
         
         frequencies = {}
-        # Crudely tokenize document into words and tally up word counts. This
-        # works best if preprocessing strips punctuation, removes stopwords,
-        # performs stemming, etc.
-        for word in document.split():
+        # Tokenize the document into words once and tally up word counts.
+        # Everything the tf function above works out can be had from this one
+        # pass, rather than re-splitting the whole document for every word.
+        words = tokenize(document)
+        for word in words:
             try:
                 frequencies[word] += 1
             except KeyError:
                 frequencies[word] = 1
+        wordcount = float(len(words))
+        
+        if stats:
+            # Document frequencies are added up in memory and written out at
+            # the end (or when the table gets too big), rather than once for
+            # every word in every document.
+            documents += 1
+            buffer.append('length\t%s\t%d\n' % (docid, len(words)))
+            for word in frequencies:
+                try:
+                    df[word] += 1
+                except KeyError:
+                    df[word] = 1
+                    if len(df) >= STATS_MAX_TERMS: write_stats('df', df, output)
+            if len(buffer) >= OUTPUT_BUFFER_LINES:
+                output.write(''.join(buffer))
+                buffer = []
+            continue
         
-        # Print term frequencies to stdout for ingestion by reducer.
+        # Queue up term frequencies for ingestion by reducer, and write them to
+        # stdout in big batches.
         for word in frequencies:
-            print '%s\t%s\t%s' % (word, docid, tf(word, document))
+            buffer.append('%s\t%s\t%s\n' % (word, docid, frequencies[word] / wordcount))
+        if len(buffer) >= OUTPUT_BUFFER_LINES:
+            output.write(''.join(buffer))
+            buffer = []
+    output.write(''.join(buffer))
+    if stats:
+        write_stats('count', {'documents': documents}, output)
+        write_stats('df', df, output)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = OptionParser()
+    add_options(parser)
+    parser.add_option('--stats', action='store_true', default=False,
+        help='Produce document set statistics for stats-reducer.py instead')
+    (options, args) = parser.parse_args()
+    main(from_options(options), stats=options.stats)
\ No newline at end of file
@@ -3,12 +3,15 @@
 from itertools import groupby
 from operator import itemgetter
 import sys, math
+from optparse import OptionParser
+from indexfiles import read_document_count
 
-# The number of doucments in your entire document set
+# The number of doucments in your entire document set, if it isn't given with
+# --documents or read from a statistics file with --stats
 DOCUMENT_SET_LENGTH = 100
 
-def get_idf(docs_containing_term):
-    return math.log(float(DOCUMENT_SET_LENGTH) / float(docs_containing_term))
+def get_idf(docs_containing_term, documents=DOCUMENT_SET_LENGTH):
+    return math.log(float(documents) / float(docs_containing_term))
 
 def read_mapper_output(file, separator):
     """
@@ -17,7 +20,22 @@ def read_mapper_output(file, separator):
     for line in file:
         yield line.rstrip().split(separator, 2)
 
-def main(separator='\t'):
+def format_postings(term, postings, separator='\t'):
+    """
+    Formats a term and its posting list -- the documents it appears in, with a
+    weight for each -- as one line of the inverted index:
+
+    term    docid1:weight1    docid2:weight2 ...
+
+    Every field is separated by a tab. Weights are written with repr so they
+    come back exactly the same when they're read in by the next stage.
+    """
+    fields = [term]
+    for (docid, weight) in postings:
+        fields.append('%s:%r' % (docid, weight))
+    return separator.join(fields)
+
+def main(documents=DOCUMENT_SET_LENGTH, raw=False, separator='\t'):
     """
     This reducer consolidates input from mapper into an inverted index.
     
@@ -29,36 +47,60 @@ def main(separator='\t'):
     ...
     word    docidx   tf
     
-    Output:
+    Output (see format_postings above):
     
-    this        {"1": 0.5}
-    document    {"1": 0.5, "2", 1}
+    this        1:0.5
+    document    1:0.5       2:1.0
     ...
-    term        {"docidx": tf, "docidy": count1 ...}
+    term        docidx:tfidf    docidy:tfidf ...
+    
+    IDF weights depend on the number of documents in the whole document set.
+    Run the statistics pass (inv-index-mapper.py --stats and stats-reducer.py)
+    first and pass its output in with --stats, or give the number with
+    --documents.
+    
+    With raw set, the plain term frequencies from the mapper are written out
+    instead of TF-IDF weights. A raw index can have new documents merged into it
+    later and be re-weighted (see index-merge.py), which a weighted one can't,
+    because its weights depend on how many documents there were at the time.
     """
     data = read_mapper_output(sys.stdin, separator)
     
     # Input from the mapper is sorted by key by map/reduce. This groups the
     # input by key and then consolidates the values.
     for current_word, group in groupby(data, itemgetter(0)):
-        fileDict = {}
-        # Groups mapper input by term and creates a dictionary containing the ID
-        # for each document in which that term appeared, along with the frequency
+        postings = []
+        seen = set()
+        # Groups mapper input by term and creates a list containing the ID for
+        # each document in which that term appeared, along with the frequency
         # score calculated by the mapper.
         for current_word, fileName, count in group:
-            fileDict[fileName] = float(count)
+            if fileName in seen: continue
+            seen.add(fileName)
+            postings.append((fileName, float(count)))
         
-        # Loops through each dictionary and calculates TF-IDF weights
-        for item in fileDict.items():
-            tf = item[1] # Term frequency from the mapper
-            docs_containing_term = float(len(fileDict)) # The number of documents containing the term
-            idf = get_idf(docs_containing_term) # IDF score from function above
-            
-            # Assign TF-IDF score to each item in the index
-            fileDict[item[0]] = tf * idf
+        docs_containing_term = float(len(postings)) # The number of documents containing the term
+        if raw:
+            idf = 1.0
+        else:
+            idf = get_idf(docs_containing_term, documents) # IDF score from function above
         
-        # Return inverted index with TF-IDF weights
-        print "%s\t%s" % (current_word, str(fileDict))
+        # Assign TF-IDF score to each item in the index, and return inverted
+        # index with TF-IDF weights
+        print format_postings(current_word, [(docid, tf * idf) for (docid, tf) in postings])
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = OptionParser()
+    parser.add_option('--stats', metavar='FILE',
+        help='Read the number of documents from a stats-reducer.py output FILE')
+    parser.add_option('--documents', type='int',
+        help='Number of documents in the document set (default: %d)' % DOCUMENT_SET_LENGTH)
+    parser.add_option('--raw', action='store_true', default=False,
+        help='Write term frequencies rather than TF-IDF weights')
+    (options, args) = parser.parse_args()
+    documents = options.documents
+    if documents is None and options.stats:
+        documents = read_document_count(options.stats)
+    if documents is None:
+        documents = DOCUMENT_SET_LENGTH
+    main(documents, options.raw)
\ No newline at end of file
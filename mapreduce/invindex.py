@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+"""
+invindex.py
+
+A binary, memory-mapped version of the inverted index built by inv-index-mapper.py
+and inv-index-reducer.py, for finding the documents most like a given document
+(or a bit of text) interactively, rather than comparing every pair of documents
+in a batch job.
+
+The reducer's output is a text file, which is fine for feeding into another
+MapReduce job but no good for looking things up in: to find one term, you'd have
+to read through the whole file. So build() converts it into a single binary file
+laid out as a handful of arrays:
+
+1. The terms, sorted, with an array of where each one starts. Finding a term is
+a binary search (http://en.wikipedia.org/wiki/Binary_search_algorithm): about 20
+steps for a million terms.
+
+2. The postings for each term -- the documents it's in and its weight in each --
+in two long arrays, one of document numbers and one of weights, with each term's
+postings next to each other, plus an array of where each term's postings start.
+
+3. The document IDs, sorted, so document numbers can be turned back into IDs and
+IDs into numbers; the length (norm) of each document's vector of weights, for
+working out cosine similarities; and the same postings turned around by document
+(a "forward index"), so the terms in any one document can be looked up.
+
+The file is opened with mmap (http://docs.python.org/library/mmap.html), which
+makes it look like one big string without reading any of it. Only the pieces a
+query actually touches -- a few steps of binary search, and the posting lists of
+the terms in the query -- get read off the disk, so a query takes milliseconds
+whatever the size of the index, and only the first query to touch a piece of
+the file waits for the disk.
+
+A query scores every document that shares a term with it by walking those
+terms' posting lists and adding up products of weights, then divides by the
+norms to get cosine similarities. That's the same score pairwise-reducer.py
+--norms gives, for one document at a time.
+
+Usage:
+
+    python invindex.py build index.txt index.bin --stats stats.txt
+    python invindex.py query index.bin --document 200920100AB1111
+    python invindex.py query index.bin --text "school district budget"
+"""
+import heapq, math, mmap, struct, sys
+from array import array
+from operator import itemgetter
+from optparse import OptionParser
+import tokenizer
+from indexfiles import parse_postings, read_document_count
+
+MAGIC = 'CARI'
+FORMAT_VERSION = 1
+BYTE_ORDER = sys.byteorder == 'little' and '<' or '>'
+
+# Magic, format version, byte order, number of documents (for IDF weights),
+# number of terms, number of documents in the index
+_HEADER = struct.Struct('<4sHc1xQQQ')
+# Type code, item size, number of items, where the items start
+_SECTION = struct.Struct('<cB6xQQ')
+
+# The arrays in an index file, in order, with their type codes
+SECTIONS = [
+    ('terms', 'c'),             # Every term, one after another
+    ('term_starts', 'L'),       # Where each term starts in terms, plus the end
+    ('postings_starts', 'L'),   # Where each term's postings start, plus the end
+    ('postings_docs', 'I'),     # Document numbers, by term
+    ('postings_weights', 'd'),  # Weights, by term
+    ('docids', 'c'),            # Every document ID, one after another
+    ('docid_starts', 'L'),      # Where each document ID starts, plus the end
+    ('norms', 'd'),             # The norm of each document's vector of weights
+    ('forward_starts', 'L'),    # Where each document's terms start, plus the end
+    ('forward_terms', 'I'),     # Term numbers, by document
+    ('forward_weights', 'd'),   # Weights, by document
+]
+
+class IndexFileError(Exception):
+    """
+    Raised when a file isn't an index file this code knows how to read.
+    """
+    pass
+
+def read_index(file, separator='\t'):
+    """
+    Generator that reads an inverted index written by inv-index-reducer.py one
+    term at a time, as the term and a list of (docid, weight) pairs.
+    """
+    for line in file:
+        yield parse_postings(line.rstrip(), separator)
+
+def _pad(n):
+    return (8 - n % 8) % 8
+
+def build(index_path, path, documents=None):
+    """
+    Builds a binary index file at path from the inverted index at index_path,
+    which must be sorted by term, the way inv-index-reducer.py writes it.
+
+    documents is the number of documents in the whole document set, which query
+    text needs for its IDF weights. It should be the number the reducer used,
+    and defaults to the number of documents in the index.
+    """
+    # First pass: which documents there are, and how many terms each has, so
+    # the forward index can be laid out before any of it is filled in.
+    counts = {}
+    previous = None
+    with open(index_path) as f:
+        for (term, postings) in read_index(f):
+            if previous is not None and term <= previous:
+                raise ValueError("%s isn't sorted by term (%r comes after %r)"
+                    % (index_path, term, previous))
+            previous = term
+            for (docid, weight) in postings:
+                counts[docid] = counts.get(docid, 0) + 1
+    docids = sorted(counts)
+    numbers = dict([(docid, n) for (n, docid) in enumerate(docids)])
+    forward_starts = array('L', [0])
+    for docid in docids:
+        forward_starts.append(forward_starts[-1] + counts[docid])
+    total = forward_starts[-1]
+    forward_terms = array('I', [0]) * total
+    forward_weights = array('d', [0.0]) * total
+    cursors = forward_starts[:-1]
+    squares = array('d', [0.0]) * len(docids)
+
+    # Second pass: fill in the terms and postings, and the forward index from
+    # the postings.
+    terms = []
+    term_starts = array('L', [0])
+    postings_starts = array('L', [0])
+    postings_docs = array('I')
+    postings_weights = array('d')
+    with open(index_path) as f:
+        for (t, (term, postings)) in enumerate(read_index(f)):
+            terms.append(term)
+            term_starts.append(term_starts[-1] + len(term))
+            for (n, weight) in sorted([(numbers[docid], weight) for (docid, weight) in postings]):
+                postings_docs.append(n)
+                postings_weights.append(weight)
+                cursor = cursors[n]
+                forward_terms[cursor] = t
+                forward_weights[cursor] = weight
+                cursors[n] = cursor + 1
+                squares[n] += weight * weight
+            postings_starts.append(len(postings_docs))
+
+    docid_starts = array('L', [0])
+    for docid in docids:
+        docid_starts.append(docid_starts[-1] + len(docid))
+    arrays = {
+        'terms': array('c', ''.join(terms)),
+        'term_starts': term_starts,
+        'postings_starts': postings_starts,
+        'postings_docs': postings_docs,
+        'postings_weights': postings_weights,
+        'docids': array('c', ''.join(docids)),
+        'docid_starts': docid_starts,
+        'norms': array('d', [math.sqrt(square) for square in squares]),
+        'forward_starts': forward_starts,
+        'forward_terms': forward_terms,
+        'forward_weights': forward_weights,
+    }
+    if documents is None: documents = len(docids)
+
+    # Work out where each array goes, then write the header, the table of
+    # arrays, and the arrays themselves, each starting on an 8-byte boundary.
+    offset = _HEADER.size + _SECTION.size * len(SECTIONS)
+    table = []
+    for (name, typecode) in SECTIONS:
+        a = arrays[name]
+        table.append(_SECTION.pack(typecode, a.itemsize, len(a), offset))
+        size = a.itemsize * len(a)
+        offset += size + _pad(size)
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, BYTE_ORDER, documents,
+                             len(terms), len(docids)))
+        f.write(''.join(table))
+        for (name, typecode) in SECTIONS:
+            a = arrays[name]
+            a.tofile(f)
+            f.write('\0' * _pad(a.itemsize * len(a)))
+
+class InvertedIndex(object):
+    """
+    An index file built by build(), opened for queries. Nothing is read from
+    the file until a query needs it.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.buf) < _HEADER.size:
+            raise IndexFileError("%s is too short to be an index file" % path)
+        magic, version, byteorder, documents, nterms, ndocs = _HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            raise IndexFileError("%s is not an index file" % path)
+        if version != FORMAT_VERSION:
+            raise IndexFileError("%s uses index format version %d, expected %d"
+                % (path, version, FORMAT_VERSION))
+        if byteorder != BYTE_ORDER:
+            raise IndexFileError("%s was built on a machine with a different byte order; "
+                "rebuild it here" % path)
+        self.documents = documents
+        self.nterms = nterms
+        self.ndocs = ndocs
+        self.sections = {}
+        for (i, (name, typecode)) in enumerate(SECTIONS):
+            code, itemsize, length, offset = _SECTION.unpack_from(
+                self.buf, _HEADER.size + i * _SECTION.size)
+            if array(code).itemsize != itemsize:
+                raise IndexFileError("%s items are %d bytes in the file but %d here"
+                    % (name, itemsize, array(code).itemsize))
+            self.sections[name] = (struct.Struct('@' + code), length, offset)
+
+    def close(self):
+        self.buf.close()
+
+    def _item(self, name, i):
+        """
+        Reads one item of one of the arrays in the file.
+        """
+        item, length, offset = self.sections[name]
+        return item.unpack_from(self.buf, offset + i * item.size)[0]
+
+    def _slice(self, name, start, end):
+        """
+        Reads a run of items of one of the arrays in the file into an array.
+        """
+        item, length, offset = self.sections[name]
+        a = array(item.format[1])
+        a.fromstring(buffer(self.buf, offset + start * item.size, (end - start) * item.size))
+        return a
+
+    def _string(self, name, starts, i):
+        start = self._item(starts, i)
+        end = self._item(starts, i + 1)
+        return self._slice(name, start, end).tostring()
+
+    def term(self, t):
+        """
+        The text of term number t.
+        """
+        return self._string('terms', 'term_starts', t)
+
+    def docid(self, n):
+        """
+        The ID of document number n.
+        """
+        return self._string('docids', 'docid_starts', n)
+
+    def _search(self, value, count, get):
+        # Binary search for value among count sorted strings
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if get(mid) < value: lo = mid + 1
+            else: hi = mid
+        if lo < count and get(lo) == value: return lo
+        return -1
+
+    def lookup(self, term):
+        """
+        The number of a term, or -1 if it isn't in the index.
+        """
+        return self._search(term, self.nterms, self.term)
+
+    def document(self, docid):
+        """
+        The number of a document, or -1 if it isn't in the index.
+        """
+        return self._search(docid, self.ndocs, self.docid)
+
+    def postings(self, t):
+        """
+        The documents term number t is in, and its weight in each, as two arrays.
+        """
+        start = self._item('postings_starts', t)
+        end = self._item('postings_starts', t + 1)
+        return (self._slice('postings_docs', start, end),
+                self._slice('postings_weights', start, end))
+
+    def vector(self, n):
+        """
+        The terms in document number n, and their weights, as two arrays.
+        """
+        start = self._item('forward_starts', n)
+        end = self._item('forward_starts', n + 1)
+        return (self._slice('forward_terms', start, end),
+                self._slice('forward_weights', start, end))
+
+    def norm(self, n):
+        return self._item('norms', n)
+
+    def _query(self, terms, weights, k, exclude=None):
+        """
+        Scores every document sharing a term with a query vector, given as
+        parallel lists of term numbers and weights, and returns the k with the
+        highest cosine similarity as (docid, similarity) pairs, best first.
+        """
+        scores = {}
+        for (t, weight) in zip(terms, weights):
+            # Terms in every document have no weight and can't add anything
+            if not weight: continue
+            docs, doc_weights = self.postings(t)
+            for i in range(len(docs)):
+                n = docs[i]
+                scores[n] = scores.get(n, 0.0) + weight * doc_weights[i]
+        if exclude is not None: scores.pop(exclude, None)
+        query_norm = math.sqrt(sum([weight * weight for weight in weights]))
+        if not query_norm: return []
+        results = []
+        for (n, score) in scores.iteritems():
+            norm = self.norm(n)
+            if norm: results.append((score / (query_norm * norm), n))
+        best = heapq.nsmallest(k, results, key=lambda (similarity, n): (-similarity, n))
+        return [(self.docid(n), similarity) for (similarity, n) in best]
+
+    def query_document(self, docid, k=10):
+        """
+        Finds the k documents most like the one with the given ID, by cosine
+        similarity, as a list of (docid, similarity) pairs, best first.
+        """
+        n = self.document(docid)
+        if n < 0: raise KeyError(docid)
+        terms, weights = self.vector(n)
+        return self._query(terms, weights, k, exclude=n)
+
+    def query_text(self, text, k=10, tokenize=None):
+        """
+        Finds the k documents most like a piece of text, by cosine similarity, as
+        a list of (docid, similarity) pairs, best first. The text is weighted
+        the way inv-index-mapper.py and inv-index-reducer.py weight documents:
+        each word's frequency in the text times its IDF in the document set.
+        Words that aren't in the index are ignored. Pass a tokenize function
+        from tokenizer.make_tokenizer, built with the options the documents were
+        indexed with, to break the text into words the same way.
+        """
+        if tokenize is None: tokenize = tokenizer.make_tokenizer()
+        words = tokenize(text)
+        frequencies = {}
+        for word in words:
+            frequencies[word] = frequencies.get(word, 0) + 1
+        terms = []
+        weights = []
+        for (word, count) in frequencies.iteritems():
+            t = self.lookup(word)
+            if t < 0: continue
+            df = self._item('postings_starts', t + 1) - self._item('postings_starts', t)
+            terms.append(t)
+            weights.append(count / float(len(words)) * math.log(float(self.documents) / df))
+        return self._query(terms, weights, k)
+
+if __name__ == '__main__':
+    parser = OptionParser(usage='%prog build INDEX OUTPUT [options]\n'
+                                '       %prog query OUTPUT (--document DOCID | --text TEXT) [options]')
+    parser.add_option('--stats', metavar='FILE',
+        help='build: read the number of documents from a stats-reducer.py output FILE')
+    parser.add_option('--documents', type='int',
+        help='build: number of documents in the document set (default: those in the index)')
+    parser.add_option('--document', metavar='DOCID',
+        help='query: find the documents most like this one')
+    parser.add_option('--text',
+        help='query: find the documents most like this text')
+    parser.add_option('-k', type='int', default=10,
+        help='query: number of documents to find (default: %default)')
+    # The same options as inv-index-mapper.py, which the documents should have
+    # been indexed with
+    tokenizer.add_options(parser, 'query: ')
+    (options, args) = parser.parse_args()
+
+    if len(args) == 3 and args[0] == 'build':
+        documents = options.documents
+        if documents is None and options.stats:
+            documents = read_document_count(options.stats)
+        build(args[1], args[2], documents)
+    elif len(args) == 2 and args[0] == 'query':
+        index = InvertedIndex(args[1])
+        if options.document is not None:
+            results = index.query_document(options.document, options.k)
+        elif options.text is not None:
+            results = index.query_text(options.text, options.k, tokenizer.from_options(options))
+        else:
+            parser.error('query needs --document or --text')
+        for (docid, similarity) in results:
+            print '%s\t%s' % (docid, similarity)
+    else:
+        parser.error('expected "build INDEX OUTPUT" or "query OUTPUT"')
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+import sys
+from indexfiles import parse_postings
+
+# The most documents whose sums are held in memory at once. When the table fills
+# up, it's written out and emptied.
+MAX_DOCUMENTS = 100000
+
+def read_mapper_input(stdin):
+    """
+    Generator to limit memory usage while reading input.
+    """
+    for line in stdin:
+        yield line.rstrip()
+
+def write_sums(sums, output=sys.stdout):
+    """
+    Writes out and empties the table of sums of squared weights.
+    """
+    output.write(''.join(['%s\t%r\n' % (docid, total) for (docid, total) in sums.iteritems()]))
+    sums.clear()
+
+def main():
+    """
+    The first half of working out the length (or norm) of each document's
+    vector of TF-IDF weights: the square root of the sum of its squared weights.
+    Dividing the sum of the products of two documents' weights by both of their
+    norms gives their cosine similarity, which pairwise-reducer.py --norms uses.
+
+    The norms are worked out from the inverted index, which already has every
+    weight in it, so there's no need for another pass over the documents.
+
+    Input (the inverted index):
+
+    word        docid1:0.5      docid2:1.0
+    word2       docid1:0.25
+    ...
+
+    Output (squared weights, added up per document in memory first):
+
+    docid1      0.3125
+    docid2      1.0
+    ...
+    """
+    sums = {}
+    for line in read_mapper_input(sys.stdin):
+        word, postings = parse_postings(line)
+        for (docid, weight) in postings:
+            try:
+                sums[docid] += weight * weight
+            except KeyError:
+                sums[docid] = weight * weight
+                if len(sums) >= MAX_DOCUMENTS: write_sums(sums)
+    write_sums(sums)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+from itertools import groupby
+from operator import itemgetter
+import sys, math
+
+def read_mapper_output(file, separator):
+    """
+    Generator that yields lines from the mapper.
+    """
+    for line in file:
+        yield line.rstrip().split(separator, 1)
+
+def main(separator='\t'):
+    """
+    The second half of working out the norm of each document's vector of TF-IDF
+    weights (see norms-mapper.py): adds up the squared weights for each document
+    and takes the square root.
+
+    Input:
+
+    docid1      0.25
+    docid1      0.0625
+    docid2      1.0
+    ...
+
+    Output:
+
+    docid1      0.5590169943749475
+    docid2      1.0
+    ...
+    """
+    data = read_mapper_output(sys.stdin, separator)
+
+    # Input from the mapper is sorted by key by map/reduce. This groups the
+    # input by document and then adds up the values.
+    for docid, group in groupby(data, itemgetter(0)):
+        total = 0.0
+        for docid_inner, value in group:
+            total += float(value)
+        print '%s\t%r' % (docid, math.sqrt(total))
+
+if __name__ == "__main__":
+    main()
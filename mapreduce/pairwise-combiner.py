@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+from itertools import groupby
+from operator import itemgetter
+import sys
+
+def read_mapper_output(file, separator):
+    """
+    Generator that yields lines from the mapper.
+    """
+    for line in file:
+        yield line.rstrip().split(separator, 1)
+
+def main(separator='\t'):
+    """
+    Pre-sums the scores for each document pair on the mapper's side of the
+    shuffle, so the shuffle carries one line per pair per map task rather than
+    one per pair per shared word. Common words are shared by a lot of the same
+    pairs, so that's a lot fewer lines.
+
+    A combiner is like a reducer that runs on the sorted output of a single
+    mapper (in Hadoop, on each batch of it that gets spilled to disk) and
+    whose output is fed to the real reducer. It only adds scores up. The
+    reducer still does the filtering, since a pair's total isn't known until
+    every map task's share of it has arrived. Sums are written with repr so no
+    precision is lost before the reducer adds them together.
+
+    Input (same as pairwise-reducer.py):
+
+    "docid1|docid2"        10.0
+    "docid1|docid2"        5.0
+    ...
+
+    Output:
+
+    "docid1|docid2"        15.0
+    ...
+    """
+    data = read_mapper_output(sys.stdin, separator)
+
+    # Input is sorted by key, just like the reducer's, so lines for the same
+    # document pair are next to each other.
+    for docset, group in groupby(data, itemgetter(0)):
+        total = 0.0
+        for docset_inner, count in group:
+            total += float(count)
+        print '%s\t%r' % (docset, total)
+
+if __name__ == "__main__":
+    main()
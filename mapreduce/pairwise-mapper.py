@@ -1,6 +1,12 @@
 #!/usr/bin/env python
 
 import sys
+from optparse import OptionParser
+from indexfiles import read_postings
+
+# The most document pairs held in memory at once by --aggregate. When the table
+# fills up, it's written out and emptied.
+AGGREGATE_MAX_PAIRS = 200000
 
 def read_mapper_input(stdin):
     """
@@ -9,6 +15,31 @@ def read_mapper_input(stdin):
     for line in stdin:
         yield line.rstrip()
 
+def parse_blocks(line, separator='\t'):
+    """
+    Parses one line of input, which is either a line of the inverted index (see
+    parse_postings in indexfiles.py) or, for a long posting list cut up by
+    posting-splitter.py, two blocks of it separated by a | field:
+
+    term    docid1:weight1    docid2:weight2 ...    |    docid3:weight3 ...
+
+    Returns the term, the postings, and the second block's postings, which are
+    None for an ordinary line.
+    """
+    fields = line.split(separator)
+    if '|' not in fields:
+        return fields[0], read_postings(fields[1:]), None
+    i = fields.index('|')
+    return fields[0], read_postings(fields[1:i]), read_postings(fields[i + 1:])
+
+def product(postings1, postings2):
+    """
+    Every pair with one posting from each list, like itertools.product.
+    """
+    for posting1 in postings1:
+        for posting2 in postings2:
+            yield posting1, posting2
+
 def combinations(iterable, r):
     """
     Implementation of itertools combinations method. Re-implemented here because
@@ -37,13 +68,68 @@ def combinations(iterable, r):
             indices[j] = indices[j-1] + 1
         yield tuple(pool[i] for i in indices)
 
-def main():
+def new_pairs(postings, new_ids, other=None):
+    """
+    Like combinations(postings, 2) (or product(postings, other), if other is
+    given), but only the pairs with at least one document in new_ids: new
+    documents paired with old ones, and with each other. Pairs of old documents
+    were scored the last time around.
+    """
+    if other is not None:
+        for (posting1, posting2) in product(postings, other):
+            if posting1[0] in new_ids or posting2[0] in new_ids:
+                yield posting1, posting2
+        return
+    for i in range(len(postings)):
+        if postings[i][0] not in new_ids: continue
+        for j in range(len(postings)):
+            if j == i: continue
+            # New pairs come up twice; only take them once
+            if j < i and postings[j][0] in new_ids: continue
+            yield postings[i], postings[j]
+
+def read_ids(path):
+    """
+    Reads a list of document IDs, one per line.
+    """
+    with open(path) as f:
+        return set([line.strip() for line in f if line.strip()])
+
+def write_totals(totals, output=sys.stdout):
+    """
+    Writes out and empties the table of pair scores kept by --aggregate.
+    """
+    output.write(''.join(['%s|%s\t%r\n' % (docid1, docid2, total)
+        for ((docid1, docid2), total) in totals.iteritems()]))
+    totals.clear()
+
+def report_counter(name, amount):
+    """
+    Reports a counter the way Hadoop Streaming expects it, on stderr.
+    """
+    sys.stderr.write('reporter:counter:pairwise,%s,%d\n' % (name, amount))
+
+def main(aggregate=False, max_pairs=AGGREGATE_MAX_PAIRS, cosine=False, new_ids=None):
     """
     Accepts an inverted index as input from stdin, as described below, and groups
     TF-IDF weights for each document so they can later be summed by the reducer.
     
-    word        {"docid": 10.0}
-    word2       {"docid1": 5.0, "docid2": weight2, etc.}
+    With aggregate set, scores for the same pair are added up in memory before
+    they're written out (what's called in-mapper combining), in a table of at
+    most max_pairs pairs that's written out whenever it fills up. A pair can
+    still come out more than once, but far less often than once per word.
+    
+    With cosine set, each word contributes the product of the two documents'
+    weights rather than their sum. Added up by pairwise-reducer.py and divided
+    by the documents' norms (see norms-mapper.py), that's their cosine
+    similarity. Products are written with repr so they keep full precision.
+    
+    With new_ids (a set of document IDs) set, only pairs involving at least one
+    of those documents are produced. That's for adding new documents to an
+    existing set (see index-merge.py) without scoring every old pair again.
+    
+    word        docid:10.0
+    word2       docid1:5.0      docid2:weight2 ...
     
     Output:
     
@@ -53,19 +139,71 @@ def main():
     "docidx|docidy"        weight_product
     """
     input = read_mapper_input(sys.stdin)
+    totals = {}
+    emitted = 0
+    flushes = 0
     for line in input:
-        # Eval the dict part of the inverted index.
-        worddict = eval(line.split('\t')[1])
+        # Parse the posting list part of the inverted index.
+        word, postings, other = parse_blocks(line)
         
-        # Iterate over permutations of document pairs for a given word
-        for c in combinations(worddict.keys(), 2):
-            # Calculate the sum of weights for a given word and document pair
-            docid1, docid2 = c[0], c[1]
-            number = float(worddict[docid1]) + float(worddict[docid2])
+        # Iterate over permutations of document pairs for a given word (or
+        # across two blocks of its posting list)
+        if new_ids is not None:
+            pairs = new_pairs(postings, new_ids, other)
+        elif other is not None:
+            pairs = product(postings, other)
+        else:
+            pairs = combinations(postings, 2)
+        for c in pairs:
+            emitted += 1
+            # Calculate the sum (or product) of weights for a given word and
+            # document pair
+            (docid1, weight1), (docid2, weight2) = c[0], c[1]
+            if cosine:
+                number = weight1 * weight2
+            else:
+                number = weight1 + weight2
+            
+            # Always put the pair in the same order, so every word's share of
+            # its score ends up under the same key in the reducer.
+            if docid2 < docid1: docid1, docid2 = docid2, docid1
                 
             # Return output in the form of a document pair and weight for
             # a given word. These will later be combined in the reducer.
-            print '%s|%s\t%s' % (c[0], c[1], number)
+            if not aggregate:
+                if cosine:
+                    print '%s|%s\t%r' % (docid1, docid2, number)
+                else:
+                    print '%s|%s\t%s' % (docid1, docid2, number)
+                continue
+            
+            pair = (docid1, docid2)
+            try:
+                totals[pair] += number
+            except KeyError:
+                totals[pair] = number
+                if len(totals) >= max_pairs:
+                    write_totals(totals)
+                    flushes += 1
+    
+    # How many pairs this task produced, so tasks with a lot more work than
+    # the others stand out
+    report_counter('pairs emitted', emitted)
+    if aggregate:
+        write_totals(totals)
+        report_counter('aggregate flushes', flushes)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = OptionParser()
+    parser.add_option('--aggregate', action='store_true', default=False,
+        help='Add up scores for the same document pair before writing them')
+    parser.add_option('--max-pairs', type='int', default=AGGREGATE_MAX_PAIRS,
+        help='Most pairs to hold in memory with --aggregate (default: %default)')
+    parser.add_option('--cosine', action='store_true', default=False,
+        help='Emit products of weights, for cosine similarity, instead of sums')
+    parser.add_option('--new-ids', metavar='FILE',
+        help='Only emit pairs involving the document IDs listed in FILE')
+    (options, args) = parser.parse_args()
+    new_ids = None
+    if options.new_ids: new_ids = read_ids(options.new_ids)
+    main(options.aggregate, options.max_pairs, options.cosine, new_ids)
\ No newline at end of file
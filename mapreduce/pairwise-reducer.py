@@ -3,12 +3,16 @@
 from itertools import groupby
 from operator import itemgetter
 import sys
+from optparse import OptionParser
+from indexfiles import read_norms
 
 # Only print output that has a score exceeding this number. Defining this number
 # is a little tricky in this implementation, given that the output scores aren't
 # normalized. You'll want to play with this until you find a threshhold that matches
 # your application. Too high and some real matches might be omitted. Too low and
 # you're likely to have millions, if not hundreds of millions, of lines of output.
+# If what you're after is the closest matches to each document, you can set it
+# to 0 and feed the output to topk-mapper.py and topk-reducer.py instead.
 OUTPUT_THRESHOLD = 1.0
 
 def read_mapper_output(file, separator):
@@ -18,7 +22,7 @@ def read_mapper_output(file, separator):
     for line in file:
         yield line.rstrip().split(separator, 2)
 
-def main(separator='\t'):
+def main(threshold=OUTPUT_THRESHOLD, norms=None, separator='\t'):
     """
     Consolidates output from the mapper and sums document pair similarity scores to
     calculate a final similarity score for each document pair. Input comes as key/
@@ -37,6 +41,12 @@ def main(separator='\t'):
     "docid1|docid2"        15.0
     ...
     "docidx|docidy"        weight_sum
+    
+    If norms (a dictionary of document norms, see norms-reducer.py) is given,
+    the input should be products of weights from pairwise-mapper.py --cosine,
+    and each pair's total is divided by the two documents' norms to give their
+    cosine similarity. Cosine similarities run from 0 to 1 however long the
+    documents are, which makes choosing a threshold much easier.
     """
     data = read_mapper_output(sys.stdin, separator)
     
@@ -48,14 +58,28 @@ def main(separator='\t'):
         for docset_inner, count in group:
             totcount += float(count)
         
+        # Normalize the score into a cosine similarity. Documents with no
+        # weights at all have a norm of zero and aren't similar to anything.
+        if norms is not None:
+            norm = norms.get(doc1, 0.0) * norms.get(doc2, 0.0)
+            if not norm: continue
+            totcount /= norm
+        
         # Get document IDs for comparison purposes below.
         docid1 = doc1[:8]
         docid2 = doc2[:8]
         
         # Only print the output if the output score reaches a certain threshold,
         # and don't produce output for a document compared against itself.
-        if (not docid1 == docid2) and totcount > OUTPUT_THRESHOLD:
+        if (not docid1 == docid2) and totcount > threshold:
             print "%s\t%s" % (docset, totcount)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = OptionParser()
+    parser.add_option('--threshold', type='float', default=OUTPUT_THRESHOLD,
+        help='Only print pairs scoring more than this (default: %default)')
+    parser.add_option('--norms', metavar='FILE',
+        help='Divide scores by the document norms in FILE, for cosine similarity')
+    (options, args) = parser.parse_args()
+    norms = options.norms and read_norms(options.norms) or None
+    main(options.threshold, norms)
\ No newline at end of file
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+import sys
+from optparse import OptionParser
+
+# Posting lists longer than this are cut into blocks of this many postings
+BLOCK_SIZE = 1000
+
+def read_index(stdin):
+    """
+    Generator to limit memory usage while reading input.
+    """
+    for line in stdin:
+        yield line.rstrip()
+
+def report_counter(name, amount):
+    """
+    Reports a counter the way Hadoop Streaming expects it, on stderr.
+    """
+    sys.stderr.write('reporter:counter:posting-splitter,%s,%d\n' % (name, amount))
+
+def main(block_size=BLOCK_SIZE, separator='\t'):
+    """
+    Sits between inv-index-reducer.py (or df-filter.py) and pairwise-mapper.py,
+    and cuts long posting lists into pieces that can be spread across many map
+    tasks.
+
+    pairwise-mapper.py does work proportional to the square of the length of
+    each posting list it's given, and a single line of input can't be split
+    between map tasks. So one term in a lot of documents can leave one task
+    running for hours after all the others have finished (a "straggler"), and
+    the whole job waits on it.
+
+    A posting list with more than block_size postings is cut into blocks of
+    block_size. Every pair of documents in the list is then either inside one
+    block, or has one document in each of two blocks. So the list is written
+    out as one line per block, holding the block's postings (pairs within a
+    block), and one line per pair of blocks, holding both blocks' postings
+    separated by a field with just a | in it (pairs across the two):
+
+    term    docid1:weight1  docid2:weight2 ...
+    term    docid1:weight1  docid2:weight2 ...      |       docid3:weight3 ...
+
+    Each line is at most about block_size squared pairs of work, and the lines
+    can go to different map tasks. (On Hadoop, use NLineInputFormat so they
+    do.) Shorter posting lists are passed through unchanged.
+    """
+    split = blocks = 0
+    for line in read_index(sys.stdin):
+        fields = line.split(separator)
+        term, postings = fields[0], fields[1:]
+        if len(postings) <= block_size:
+            print line
+            continue
+
+        split += 1
+        starts = range(0, len(postings), block_size)
+        for (i, start) in enumerate(starts):
+            block = postings[start:start + block_size]
+            print separator.join([term] + block)
+            blocks += 1
+            for other in starts[i + 1:]:
+                print separator.join([term] + block + ['|'] + postings[other:other + block_size])
+                blocks += 1
+
+    report_counter('posting lists split', split)
+    report_counter('blocks', blocks)
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('--block-size', type='int', default=BLOCK_SIZE,
+        help='Cut posting lists into blocks of this many postings (default: %default)')
+    (options, args) = parser.parse_args()
+    main(options.block_size)
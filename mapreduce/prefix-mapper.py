@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+import sys
+from optparse import OptionParser
+from indexfiles import parse_postings, read_norms
+
+OUTPUT_BUFFER_LINES = 10000
+
+def read_mapper_input(stdin):
+    """
+    Generator to limit memory usage while reading input.
+    """
+    for line in stdin:
+        yield line.rstrip()
+
+def main(norms, output=sys.stdout):
+    """
+    The first step of the all-pairs similarity search (see allpairs-reducer.py):
+    turns the inverted index back into one record per document and term, with
+    everything the next step needs to decide which of a document's terms have
+    to be indexed.
+
+    Each weight is divided by its document's norm, so every document's vector
+    has a length of 1 and the dot product of two vectors is their cosine
+    similarity. Along with each weight goes the term's document frequency,
+    which puts terms in a fixed order, and its biggest weight in any document,
+    which puts a ceiling on how much the term can add to any pair's score.
+    Terms with a weight of zero (the ones in every document) are left out,
+    since they can't add anything.
+
+    Input (the inverted index):
+
+    word        docid1:0.5      docid2:1.0
+    ...
+
+    Output:
+
+    docid1      word    2       0.7071067811865475      0.8944271909999159
+    ...
+    docid       term    document_frequency      weight      term_max_weight
+    """
+    buffer = []
+    for line in read_mapper_input(sys.stdin):
+        term, postings = parse_postings(line)
+        df = len(postings)
+        weights = []
+        for (docid, weight) in postings:
+            norm = norms.get(docid, 0.0)
+            if not norm or not weight: continue
+            weights.append((docid, weight / norm))
+        if not weights: continue
+        maxweight = max([weight for (docid, weight) in weights])
+        for (docid, weight) in weights:
+            buffer.append('%s\t%s\t%d\t%r\t%r\n' % (docid, term, df, weight, maxweight))
+        if len(buffer) >= OUTPUT_BUFFER_LINES:
+            output.write(''.join(buffer))
+            buffer = []
+    output.write(''.join(buffer))
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('--norms', metavar='FILE',
+        help='Document norms written by norms-reducer.py')
+    (options, args) = parser.parse_args()
+    if not options.norms:
+        parser.error('--norms is required')
+    main(read_norms(options.norms))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+from itertools import groupby
+from operator import itemgetter
+import sys
+from optparse import OptionParser
+
+# Only find document pairs whose cosine similarity is above this. Must be the
+# same number allpairs-reducer.py is given.
+SIMILARITY_THRESHOLD = 0.9
+
+def read_mapper_output(file, separator):
+    """
+    Generator to limit memory usage while reading input.
+    """
+    for line in file:
+        yield line.rstrip().split(separator, 4)
+
+def report_counter(name, amount):
+    """
+    Reports a counter the way Hadoop Streaming expects it, on stderr.
+    """
+    sys.stderr.write('reporter:counter:allpairs,%s,%d\n' % (name, amount))
+
+def prefix_length(features, threshold):
+    """
+    Works out how many of a document's terms need to be indexed, given its
+    features as (document frequency, term, weight, term max weight) tuples
+    sorted from rarest term to most common.
+
+    The biggest a term can add to the document's similarity with any other
+    document is its weight times the term's biggest weight anywhere. Working
+    back from the most common term, we add those up for as long as the total
+    stays under the threshold. Those common terms don't need indexing: on their
+    own they can never make a pair similar enough, so any pair that is must
+    also share one of the rarer terms in front of them (the prefix), which is
+    where it will be found. The full vectors are still used for the score.
+    """
+    bound = 0.0
+    prefix = len(features)
+    for i in reversed(range(len(features))):
+        df, term, weight, maxweight = features[i]
+        bound += weight * maxweight
+        if bound >= threshold: break
+        prefix = i
+    return prefix
+
+def main(threshold=SIMILARITY_THRESHOLD, separator='\t'):
+    """
+    The second step of the all-pairs similarity search (see allpairs-reducer.py).
+    Gathers up each document's terms, sorts them from rarest to most common, and
+    indexes the document only under the terms in its prefix (see prefix_length
+    above). Common terms have long posting lists, which is where the pairwise
+    job spends nearly all of its time, and they're the ones left out.
+
+    Each record carries the whole document vector along with it, so the next
+    step can score pairs without looking anything else up. It also carries
+    the document's biggest weight and the sum of its weights, which give a
+    quick upper bound on the document's similarity to any other.
+
+    Input (from prefix-mapper.py, sorted):
+
+    docid       term    document_frequency      weight      term_max_weight
+    ...
+
+    Output, one line for each term in the document's prefix:
+
+    term    docid   prefix_length   max_weight  weight_sum  term1:df1:weight1   term2:df2:weight2 ...
+    """
+    data = read_mapper_output(sys.stdin, separator)
+    features_seen = features_indexed = 0
+
+    # Input from the mapper is sorted by key by map/reduce. This groups the
+    # input by document.
+    for docid, group in groupby(data, itemgetter(0)):
+        features = []
+        for docid_inner, term, df, weight, maxweight in group:
+            features.append((int(df), term, float(weight), float(maxweight)))
+        features.sort()
+        prefix = prefix_length(features, threshold)
+        features_seen += len(features)
+        features_indexed += prefix
+        if not prefix: continue
+
+        vector = separator.join(['%s:%d:%r' % (term, df, weight)
+            for (df, term, weight, maxweight) in features])
+        maxweight = max([weight for (df, term, weight, term_maxweight) in features])
+        total = sum([weight for (df, term, weight, term_maxweight) in features])
+        for (df, term, weight, term_maxweight) in features[:prefix]:
+            print separator.join([term, docid, str(prefix), repr(maxweight), repr(total), vector])
+
+    report_counter('features', features_seen)
+    report_counter('features indexed', features_indexed)
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('--threshold', type='float', default=SIMILARITY_THRESHOLD,
+        help='Cosine similarity pairs have to beat (default: %default)')
+    (options, args) = parser.parse_args()
+    main(options.threshold)
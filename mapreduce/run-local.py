@@ -0,0 +1,610 @@
+#!/usr/bin/env python
+
+import heapq, os, shutil, subprocess, sys, tempfile, zlib
+from multiprocessing import Pool
+from optparse import OptionParser
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# The number of input lines given to each map task, roughly
+SPLIT_LINES = 10000
+
+# The number of lines the shuffle sorts in memory before spilling them to disk
+SORT_BUFFER_LINES = 100000
+
+# The most sorted runs merged at once. Any more and they're merged in passes.
+MERGE_FAN_IN = 64
+
+# The file in an --archive directory holding the raw index of every document in it
+RAW_INDEX = 'raw-index.txt'
+
+# What a task writes to stderr to bump a counter, as in Hadoop Streaming:
+# reporter:counter:<group>,<counter>,<amount>
+COUNTER_PREFIX = 'reporter:counter:'
+
+def script(name, args=()):
+    """
+    The command line for running one of the scripts in this directory with the
+    same Python interpreter that's running this one.
+    """
+    return [sys.executable, os.path.join(HERE, name)] + list(args)
+
+def pipeline(workdir, combine=False, aggregate=False, prune=None, cosine=False,
+             threshold=None, documents=None, allpairs=False, top_k=None,
+             archive=None, block_size=None, reducers=1):
+    """
+    The jobs that make up the document similarity workflow, in the order they
+    run, as (name, inputs, mapper, combiner, reducer, reducers) tuples. The
+    inputs are the names of the jobs whose output the job reads, or None for
+    the documents themselves, and the mapper, combiner and reducer are command
+    lines. The combiner is None for jobs that don't use one, and the combiner
+    and reducer are both None for jobs that only have a mapper. reducers is the
+    number of reduce tasks the job runs. Each job's output is written to
+    <name>.out in workdir, except the last job's, which is the result.
+
+    combine = Pre-sum pair scores with pairwise-combiner.py before the shuffle
+    aggregate = Pre-sum pair scores inside pairwise-mapper.py instead
+    prune = Options for df-filter.py, which drops the most common terms from the
+        index before the pairwise job if given
+    cosine = Score pairs by cosine similarity, using document norms worked out
+        from the index
+    threshold = Only keep pairs scoring more than this
+    documents = The number of documents. If it isn't given, a statistics job
+        counts them first.
+    allpairs = Find the pairs with a cosine similarity above the threshold with
+        the prefix-filtering jobs (see allpairs-reducer.py) rather than scoring
+        every pair that shares a term
+    top_k = Only keep the top_k most similar documents to each document. Unless
+        a threshold is given too, every pair with a score above 0 is considered.
+    archive = A directory holding the raw index of documents that have already
+        been compared (see index-merge.py). The input documents are merged into
+        it, and only pairs involving at least one of them are scored.
+    block_size = Cut posting lists longer than this into blocks with
+        posting-splitter.py before the pairwise job, so one very common term
+        doesn't hold up the job in a single map task
+    reducers = The number of reduce tasks for the pairwise (or allpairs) job,
+        where almost all the work is. Every other job has just one, so the side
+        files they write, like the document count, come out in one piece.
+    """
+    def output(name):
+        return os.path.join(workdir, name + '.out')
+
+    jobs = []
+    if archive is not None:
+        # Index just the new documents, then merge them into the archive
+        jobs.append(('raw', None, script('inv-index-mapper.py'), None,
+                     script('inv-index-reducer.py', ['--raw']), 1))
+        merge_args = ['--raw-output', output('merged-raw'), '--new-ids', output('new-ids'),
+                      '--stats-output', output('stats')]
+        old = os.path.join(archive, RAW_INDEX)
+        if os.path.exists(old): merge_args += ['--old', old]
+        if documents is not None: merge_args += ['--documents', str(documents)]
+        jobs.append(('index', ['raw'], script('index-merge.py', merge_args), None, None, 1))
+        count = ['--stats', output('stats')]
+    else:
+        if documents is None:
+            jobs.append(('stats', None, script('inv-index-mapper.py', ['--stats']), None,
+                         script('stats-reducer.py'), 1))
+            count = ['--stats', output('stats')]
+        else:
+            count = ['--documents', str(documents)]
+        jobs.append(('index', None, script('inv-index-mapper.py'), None,
+                     script('inv-index-reducer.py', count), 1))
+    index = 'index'
+    if prune is not None:
+        jobs.append(('df-filter', ['index'], script('df-filter.py', prune + count), None, None, 1))
+        index = 'df-filter'
+
+    if top_k is not None and threshold is None:
+        threshold = 0.0
+    mapper_args = aggregate and ['--aggregate'] or []
+    if archive is not None:
+        mapper_args = mapper_args + ['--new-ids', output('new-ids')]
+    reducer_args = threshold is not None and ['--threshold', repr(threshold)] or []
+    if allpairs:
+        jobs.append(('norms', ['index'], script('norms-mapper.py'), None,
+                     script('norms-reducer.py'), 1))
+        jobs.append(('prefix', [index], script('prefix-mapper.py', ['--norms', output('norms')]),
+                     None, script('prefix-reducer.py', reducer_args), 1))
+        jobs.append(('allpairs', ['prefix'], ['cat'], None,
+                     script('allpairs-reducer.py', reducer_args), reducers))
+    elif cosine:
+        # Norms come from the whole index, common terms and all
+        jobs.append(('norms', ['index'], script('norms-mapper.py'), None,
+                     script('norms-reducer.py'), 1))
+        mapper_args = mapper_args + ['--cosine']
+        reducer_args = reducer_args + ['--norms', output('norms')]
+    if not allpairs:
+        if block_size is not None:
+            jobs.append(('posting-splitter', [index],
+                         script('posting-splitter.py', ['--block-size', str(block_size)]),
+                         None, None, 1))
+            index = 'posting-splitter'
+        jobs.append(('pairwise', [index], script('pairwise-mapper.py', mapper_args),
+                     combine and script('pairwise-combiner.py') or None,
+                     script('pairwise-reducer.py', reducer_args), reducers))
+    if top_k is not None:
+        jobs.append(('topk', [jobs[-1][0]], script('topk-mapper.py'), None,
+                     script('topk-reducer.py', ['-k', str(top_k)]), 1))
+    return jobs
+
+def add_counter(counters, group, name, amount):
+    counters[(group, name)] = counters.get((group, name), 0) + amount
+
+def read_counters(path, counters):
+    """
+    Reads the stderr a task left behind, adding up the counters it reported and
+    passing anything else it said along to our own stderr.
+    """
+    with open(path) as f:
+        for line in f:
+            if line.startswith(COUNTER_PREFIX):
+                group, name, amount = line[len(COUNTER_PREFIX):].rstrip('\n').rsplit(',', 2)
+                add_counter(counters, group, name, int(amount))
+            else:
+                sys.stderr.write(line)
+    return counters
+
+def split_input(paths, workdir, lines=SPLIT_LINES):
+    """
+    Divides the input files into splits of about the same number of lines, one
+    for each map task. Whole lines are dealt out to the splits in turn, like
+    cards, so no record is cut in two, and a run of expensive lines next to each
+    other (like the blocks of one long posting list from posting-splitter.py)
+    gets spread across the tasks rather than landing on one of them. The order
+    lines are mapped in doesn't matter, since the shuffle sorts them anyway.
+    """
+    total = 0
+    for path in paths:
+        with open(path) as f:
+            for line in f: total += 1
+    count = max(1, (total + lines - 1) // lines)
+    splits = [os.path.join(workdir, 'split-%05d' % i) for i in range(count)]
+    outs = [open(split, 'w') for split in splits]
+    try:
+        i = 0
+        for path in paths:
+            with open(path) as f:
+                for line in f:
+                    if not line.endswith('\n'): line += '\n'
+                    outs[i].write(line)
+                    i = (i + 1) % count
+    finally:
+        for out in outs: out.close()
+    return splits
+
+def partition(line, reducers):
+    """
+    Which reducer a line goes to. Lines are divided up by a hash of their key
+    (everything up to the first tab), so every line with the same key goes to
+    the same reducer, and keys are spread evenly across the reducers however
+    they're named. zlib.crc32 gives the same answer in every process, which
+    Python's own hash function doesn't promise to.
+    """
+    return (zlib.crc32(line.split('\t', 1)[0]) & 0xffffffff) % reducers
+
+def write_run(lines, path, combiner=None, stderr=None):
+    """
+    Sorts a batch of lines in memory and writes it out as one sorted run. If
+    there's a combiner, the sorted lines go through it on their way to disk.
+    """
+    lines.sort()
+    with open(path, 'w') as out:
+        if combiner is None:
+            for line in lines:
+                out.write(line)
+                out.write('\n')
+            return path
+        combine_task = subprocess.Popen(combiner, stdin=subprocess.PIPE, stdout=out, stderr=stderr)
+        try:
+            for line in lines:
+                combine_task.stdin.write(line)
+                combine_task.stdin.write('\n')
+        finally:
+            combine_task.stdin.close()
+            if combine_task.wait() != 0:
+                raise subprocess.CalledProcessError(combine_task.returncode, combiner)
+    return path
+
+def sort_runs(path, prefix, buffer_lines=SORT_BUFFER_LINES, combiner=None,
+              stderr=None, counters=None, reducers=1):
+    """
+    The first half of an external merge sort: reads a file in batches of at most
+    buffer_lines lines, and writes each batch out sorted (and combined, if
+    there's a combiner -- a combiner keeps its input's order, so its output is
+    still sorted). Each batch is divided up between the reducers first, and
+    the runs are returned as a list of runs for each reducer.
+
+    Lines are compared without their trailing newline. Python compares strings
+    byte by byte, so this puts them in exactly the order LC_ALL=C sort does when
+    the scripts are tested by piping them together. (With the newline left on,
+    "word" would sort after "word<TAB>...", because a newline is a bigger byte
+    than a tab.)
+    """
+    runs = [[] for r in range(reducers)]
+    lines = [[] for r in range(reducers)]
+    buffered = 0
+    records = size = 0
+    spills = 0
+    with open(path) as f:
+        for line in f:
+            records += 1
+            size += len(line)
+            line = line.rstrip('\n')
+            if reducers == 1:
+                lines[0].append(line)
+            else:
+                lines[partition(line, reducers)].append(line)
+            buffered += 1
+            if buffered >= buffer_lines:
+                spill(lines, runs, '%s-%05d' % (prefix, spills), combiner, stderr)
+                buffered = 0
+                spills += 1
+    spill(lines, runs, '%s-%05d' % (prefix, spills), combiner, stderr)
+    if counters is not None:
+        add_counter(counters, 'run-local', 'map output records', records)
+        add_counter(counters, 'run-local', 'map output bytes', size)
+    return runs
+
+def spill(lines, runs, prefix, combiner=None, stderr=None):
+    """
+    Writes out each reducer's share of a batch of lines as a sorted run, and
+    empties the batch.
+    """
+    for r in range(len(lines)):
+        if lines[r]:
+            runs[r].append(write_run(lines[r], '%s-r%03d' % (prefix, r), combiner, stderr))
+            lines[r] = []
+
+def read_run(f):
+    """
+    Generator to limit memory usage while reading a sorted run.
+    """
+    for line in f:
+        yield line[:-1]
+
+def merge_runs(runs, out, fan_in=MERGE_FAN_IN):
+    """
+    The second half of an external merge sort: merges sorted runs into one
+    sorted stream, reading only a line at a time from each of them. When there
+    are too many runs to keep open at once, they're merged in groups into bigger
+    runs first. Runs are deleted once they've been merged.
+
+    Returns the number of lines and bytes written to out.
+    """
+    runs = list(runs)
+    passes = 0
+    while len(runs) > fan_in:
+        merged = '%s.merge-%d' % (runs[0], passes)
+        with open(merged, 'w') as f:
+            merge_runs(runs[:fan_in], f, fan_in)
+        runs = runs[fan_in:] + [merged]
+        passes += 1
+    files = [open(run) for run in runs]
+    records = size = 0
+    try:
+        for line in heapq.merge(*[read_run(f) for f in files]):
+            out.write(line)
+            out.write('\n')
+            records += 1
+            size += len(line) + 1
+    finally:
+        for f in files: f.close()
+    for run in runs: os.remove(run)
+    return records, size
+
+def _map_task(task):
+    """
+    Runs one map task in a worker process: feeds an input split to the mapper,
+    then sorts (and combines) the mapper's output into runs for the shuffle.
+    Returns the paths of the runs for each reducer and the task's counters.
+    """
+    mapper, combiner, split, buffer_lines, reducers = task
+    output = split + '.map'
+    errors = split + '.err'
+    counters = {}
+    with open(errors, 'w') as stderr:
+        with open(split) as stdin:
+            with open(output, 'w') as stdout:
+                subprocess.check_call(mapper, stdin=stdin, stdout=stdout, stderr=stderr)
+        runs = sort_runs(output, split + '.run', buffer_lines, combiner, stderr,
+                         counters, reducers)
+    os.remove(output)
+    read_counters(errors, counters)
+    os.remove(errors)
+    return runs, counters
+
+def _reduce_task(task):
+    """
+    Runs one reduce task: streams the merged runs for one reducer through it.
+    Returns the task's counters.
+    """
+    reducer, runs, output, errors = task
+    counters = {}
+    with open(errors, 'w') as stderr:
+        with open(output, 'w') as stdout:
+            reduce_task = subprocess.Popen(reducer, stdin=subprocess.PIPE, stdout=stdout,
+                                           stderr=stderr)
+            try:
+                records, size = merge_runs(runs, reduce_task.stdin)
+            finally:
+                reduce_task.stdin.close()
+                if reduce_task.wait() != 0:
+                    raise subprocess.CalledProcessError(reduce_task.returncode, reducer)
+    read_counters(errors, counters)
+    os.remove(errors)
+    add_counter(counters, 'run-local', 'reduce input records', records)
+    add_counter(counters, 'run-local', 'reduce input bytes', size)
+    return counters
+
+def run_map_only(inputs, mapper, output, workdir):
+    """
+    Runs a job that only has a mapper, like df-filter.py. These are quick,
+    single passes that may write a report covering all of their input, so the
+    input goes through a single mapper, in order, rather than being split up.
+    """
+    counters = {}
+    errors = os.path.join(workdir, 'map.err')
+    with open(errors, 'w') as stderr:
+        map_task = subprocess.Popen(mapper, stdin=subprocess.PIPE, stdout=output, stderr=stderr)
+        try:
+            for path in inputs:
+                with open(path) as f:
+                    shutil.copyfileobj(f, map_task.stdin)
+        finally:
+            map_task.stdin.close()
+            if map_task.wait() != 0:
+                raise subprocess.CalledProcessError(map_task.returncode, mapper)
+    read_counters(errors, counters)
+    os.remove(errors)
+    return counters, [('map', counters)]
+
+def run_job(inputs, mapper, combiner, reducer, output, workdir, pool,
+            split_lines=SPLIT_LINES, buffer_lines=SORT_BUFFER_LINES, reducers=1):
+    """
+    Runs one MapReduce job. The input is cut into splits, and a mapper runs over
+    each split on the process pool. The mapper output is shuffled -- sorted, by
+    an external merge sort, and combined if there's a combiner -- and streamed
+    through the reducer, which writes to the file object output.
+
+    With more than one reducer, the mapper output is divided between them by
+    key (see partition above) and they run at the same time on the pool, each
+    writing its own part of the output, as Hadoop does. The parts are then
+    written to output one after another, so the output holds the same lines
+    as with one reducer, but not in the same order.
+
+    Returns the job's counters: the ones the tasks reported, plus the number of
+    lines and bytes that went into and came out of the shuffle. Also returns
+    each task's own counters, as a list of (task, counters) pairs, so a task
+    doing far more work than the rest can be spotted.
+    """
+    if reducer is None:
+        return run_map_only(inputs, mapper, output, workdir)
+    splits = split_input(inputs, workdir, split_lines)
+    runs = [[] for r in range(reducers)]
+    counters = {}
+    tasks = []
+    map_tasks = [(mapper, combiner, split, buffer_lines, reducers) for split in splits]
+    for (i, (task_runs, task_counters)) in enumerate(pool.map(_map_task, map_tasks)):
+        for r in range(reducers):
+            runs[r].extend(task_runs[r])
+        tasks.append(('map %d' % i, task_counters))
+    for split in splits: os.remove(split)
+
+    if reducers == 1:
+        # Stream straight into the output, without a part file in between
+        errors = os.path.join(workdir, 'reduce.err')
+        with open(errors, 'w') as stderr:
+            reduce_task = subprocess.Popen(reducer, stdin=subprocess.PIPE, stdout=output, stderr=stderr)
+            try:
+                records, size = merge_runs(runs[0], reduce_task.stdin)
+            finally:
+                reduce_task.stdin.close()
+                if reduce_task.wait() != 0:
+                    raise subprocess.CalledProcessError(reduce_task.returncode, reducer)
+        task_counters = read_counters(errors, {})
+        os.remove(errors)
+        add_counter(task_counters, 'run-local', 'reduce input records', records)
+        add_counter(task_counters, 'run-local', 'reduce input bytes', size)
+        tasks.append(('reduce 0', task_counters))
+    else:
+        parts = [os.path.join(workdir, 'part-%05d' % r) for r in range(reducers)]
+        reduce_tasks = [(reducer, runs[r], parts[r], parts[r] + '.err') for r in range(reducers)]
+        for (r, task_counters) in enumerate(pool.map(_reduce_task, reduce_tasks)):
+            tasks.append(('reduce %d' % r, task_counters))
+        for part in parts:
+            with open(part) as f:
+                shutil.copyfileobj(f, output)
+            os.remove(part)
+
+    for (task, task_counters) in tasks:
+        for ((group, name), amount) in task_counters.items():
+            add_counter(counters, group, name, amount)
+    return counters, tasks
+
+def print_counters(job, counters, tasks, verbose=False, out=sys.stderr):
+    """
+    Prints a job's counters. Where a counter was reported by more than one
+    task, the smallest and largest amounts from a single task are shown too,
+    and with verbose set, every task's counters are listed.
+    """
+    out.write('%s job counters:\n' % job)
+    for ((group, name), amount) in sorted(counters.items()):
+        amounts = [task_counters[(group, name)] for (task, task_counters) in tasks
+                   if (group, name) in task_counters]
+        if len(amounts) > 1:
+            out.write('    %s: %s = %d (per task: min %d, max %d)\n'
+                % (group, name, amount, min(amounts), max(amounts)))
+        else:
+            out.write('    %s: %s = %d\n' % (group, name, amount))
+    if verbose:
+        for (task, task_counters) in tasks:
+            for ((group, name), amount) in sorted(task_counters.items()):
+                out.write('    %s  %s: %s = %d\n' % (task, group, name, amount))
+
+def carry_pairs(previous, new_ids_path, output, separator='\t'):
+    """
+    Copies the pairs found by earlier --archive runs from the file previous to
+    output, leaving out every pair involving one of the documents just indexed.
+    A document that's indexed again has been changed, so its old pairs were
+    scored on its old text; the pairwise job has just scored them again.
+    """
+    with open(new_ids_path) as f:
+        new_ids = set(line.rstrip('\n') for line in f)
+    with open(previous) as f:
+        for line in f:
+            doc1, doc2 = line.split(separator, 1)[0].split('|')
+            if doc1 not in new_ids and doc2 not in new_ids:
+                output.write(line)
+
+def main(inputs, output=sys.stdout, processes=None, split_lines=SPLIT_LINES,
+         buffer_lines=SORT_BUFFER_LINES, workdir=None, quiet=False,
+         task_counters=False, previous=None, **options):
+    """
+    Runs the whole document similarity workflow on this machine, without Hadoop:
+
+    inv-index-mapper --stats -> sort -> stats-reducer
+    inv-index-mapper -> sort -> inv-index-reducer --stats
+    pairwise-mapper -> sort -> pairwise-reducer
+
+    with the extra jobs the options (see pipeline above) call for, like
+    df-filter.py between the index and pairwise jobs, or the norms job for
+    cosine similarity.
+
+    Mappers run in parallel, one per processor core by default, and the sorts are
+    done a batch at a time on disk so memory use stays bounded however big the
+    input is. By default there's only one reducer per job, so the output is
+    byte-for-byte what piping the scripts together with LC_ALL=C sort (or
+    Hadoop Streaming with a single reducer) produces. With more reducers for
+    the pairwise job, the same pairs come out, in a different order.
+
+    With an archive, previous can be the file of pairs found by earlier runs.
+    They're written to output after the new pairs, except for those involving
+    a document that's just been indexed again (see carry_pairs), so output
+    ends up with every pair in the archive, each scored once.
+
+    Intermediate files go in a temporary directory, which is removed afterward
+    unless workdir is given. Each job's counters are printed to stderr when it
+    finishes, unless quiet is set, with every task's own counters if
+    task_counters is set.
+    """
+    keep = workdir is not None
+    if workdir is None:
+        workdir = tempfile.mkdtemp(prefix='run-local-')
+    elif not os.path.isdir(workdir):
+        os.makedirs(workdir)
+    jobs = pipeline(os.path.abspath(workdir), **options)
+    pool = Pool(processes)
+    try:
+        for (i, (name, sources, mapper, combiner, reducer, reducers)) in enumerate(jobs):
+            last = i == len(jobs) - 1
+            stagedir = os.path.join(workdir, name)
+            if not os.path.isdir(stagedir): os.mkdir(stagedir)
+            if sources is None:
+                job_inputs = inputs
+            else:
+                job_inputs = [os.path.join(workdir, source + '.out') for source in sources]
+            if last:
+                job_output = output
+            else:
+                job_output = open(os.path.join(workdir, name + '.out'), 'w')
+            try:
+                counters, tasks = run_job(job_inputs, mapper, combiner, reducer, job_output,
+                                          stagedir, pool, split_lines, buffer_lines, reducers)
+            finally:
+                if not last: job_output.close()
+            if not quiet: print_counters(name, counters, tasks, task_counters)
+        if options.get('archive') is not None and previous is not None:
+            carry_pairs(previous, os.path.join(workdir, 'new-ids.out'), output)
+        # Only once everything has worked is the merged index kept for next time
+        if options.get('archive') is not None:
+            shutil.move(os.path.join(workdir, 'merged-raw.out'),
+                        os.path.join(options['archive'], RAW_INDEX))
+    finally:
+        pool.close()
+        pool.join()
+        if not keep: shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    parser = OptionParser(usage='%prog [options] INPUT...')
+    parser.add_option('-o', '--output', metavar='FILE',
+        help='Write the document pairs to FILE instead of standard output. With '
+             '--archive, the new pairs are added to the ones already in FILE.')
+    parser.add_option('-p', '--processes', type='int',
+        help='Number of mapper processes (default: one per core)')
+    parser.add_option('--split-lines', type='int', default=SPLIT_LINES,
+        help='Input lines per map task (default: %default)')
+    parser.add_option('--sort-buffer', type='int', default=SORT_BUFFER_LINES,
+        help='Lines to sort in memory before spilling to disk (default: %default)')
+    parser.add_option('--workdir', metavar='DIR',
+        help='Keep intermediate files in DIR rather than a temporary directory')
+    parser.add_option('--combine', action='store_true', default=False,
+        help='Pre-sum pair scores with pairwise-combiner.py before the shuffle')
+    parser.add_option('--aggregate', action='store_true', default=False,
+        help='Pre-sum pair scores inside pairwise-mapper.py before the shuffle')
+    parser.add_option('--max-postings', type='int',
+        help='Leave out terms that appear in more than this many documents')
+    parser.add_option('--max-df', type='float',
+        help='Leave out terms that appear in more than this share (0 to 1) of documents')
+    parser.add_option('--df-report', metavar='FILE',
+        help='Write the terms left out by --max-postings or --max-df to FILE')
+    parser.add_option('--cosine', action='store_true', default=False,
+        help='Score document pairs by cosine similarity')
+    parser.add_option('--allpairs', action='store_true', default=False,
+        help='Find pairs with a cosine similarity above --threshold by prefix filtering')
+    parser.add_option('--threshold', type='float',
+        help='Only output pairs scoring more than this')
+    parser.add_option('--top-k', type='int', metavar='K',
+        help='Output the K most similar documents to each document instead of pairs')
+    parser.add_option('--documents', type='int',
+        help="Number of documents, if it's known (default: count them first)")
+    parser.add_option('--archive', metavar='DIR',
+        help='Add the input documents to the ones already in DIR, and only score '
+             'pairs that involve them')
+    parser.add_option('--block-size', type='int',
+        help='Cut posting lists longer than this into blocks before the pairwise job')
+    parser.add_option('--reducers', type='int', default=1,
+        help='Number of reduce tasks for the pairwise job (default: %default)')
+    parser.add_option('-q', '--quiet', action='store_true', default=False,
+        help="Don't print job counters")
+    parser.add_option('--task-counters', action='store_true', default=False,
+        help='Print the counters of every task, not just the totals for each job')
+    (options, args) = parser.parse_args()
+    if not args:
+        parser.error('no input files')
+    if options.archive and (options.allpairs or options.top_k is not None):
+        parser.error("--archive can't be used with --allpairs or --top-k")
+    if options.allpairs and options.block_size is not None:
+        parser.error("--block-size can't be used with --allpairs")
+    if options.reducers < 1:
+        parser.error('--reducers must be at least 1')
+    if options.top_k is not None and options.top_k < 1:
+        parser.error('--top-k must be at least 1')
+    prune = None
+    if options.max_postings is not None or options.max_df is not None:
+        prune = []
+        if options.max_postings is not None: prune += ['--max-postings', str(options.max_postings)]
+        if options.max_df is not None: prune += ['--max-df', repr(options.max_df)]
+        if options.df_report: prune += ['--report', os.path.abspath(options.df_report)]
+    # With --archive, -o holds the pairs of every run so far. The old pairs
+    # are carried into a new file, which only replaces the old one once the
+    # run has worked.
+    previous = None
+    if options.output and options.archive:
+        if os.path.exists(options.output): previous = options.output
+        output = open(options.output + '.tmp', 'w')
+    else:
+        output = options.output and open(options.output, 'w') or sys.stdout
+    try:
+        main(args, output, options.processes, options.split_lines, options.sort_buffer,
+             options.workdir, options.quiet, options.task_counters, previous,
+             combine=options.combine, aggregate=options.aggregate, prune=prune,
+             cosine=options.cosine,
+             threshold=options.threshold, documents=options.documents,
+             allpairs=options.allpairs, top_k=options.top_k,
+             archive=options.archive and os.path.abspath(options.archive),
+             block_size=options.block_size, reducers=options.reducers)
+    finally:
+        if options.output: output.close()
+    if options.output and options.archive:
+        os.rename(options.output + '.tmp', options.output)
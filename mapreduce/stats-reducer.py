@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+from itertools import groupby
+import sys
+
+def read_mapper_output(file, separator):
+    """
+    Generator to limit memory usage while reading input.
+    """
+    for line in file:
+        yield line.rstrip().split(separator, 2)
+
+def record_key(record):
+    return record[0], record[1]
+
+def main(separator='\t'):
+    """
+    Adds up the document set statistics produced by inv-index-mapper.py --stats
+    into a small side file that later stages can read instead of being told how
+    many documents there are by hand.
+
+    Input (the counts from each map task):
+
+    count    documents   60
+    count    documents   40
+    df       document    2
+    length   docid       5
+    ...
+
+    Output:
+
+    count    documents   100
+    df       document    2
+    ...
+    df       term        document_frequency
+    length   docid       5
+    ...
+    length   docid       number_of_words
+
+    Sorted like this, the document count is on the first line, so a stage
+    that only needs that (like inv-index-reducer.py --stats) doesn't have to
+    read the rest of the file.
+    """
+    data = read_mapper_output(sys.stdin, separator)
+
+    # Input from the mapper is sorted, so all the counts for the same statistic
+    # come in one after another.
+    for (name, key), group in groupby(data, record_key):
+        total = 0
+        for record in group:
+            total += int(record[2])
+        print '%s\t%s\t%d' % (name, key, total)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+tokenizer.py
+
+Breaks documents into words, for inv-index-mapper.py and invindex.py, and for
+the text classifiers in the classify directory. Query text has to be broken up
+exactly the way the documents were when they were indexed, or its words won't
+match the index's terms, so they all use the code here, and the scripts take
+the same command-line options.
+
+On Hadoop Streaming, ship this file along with the mapper (-file tokenizer.py)
+so the mapper can import it.
+"""
+import string
+
+def make_tokenizer(lowercase=False, strip_punctuation=False, stopwords=None):
+    """
+    Builds the function used to break a document into words. By default it just
+    splits on whitespace, but it can also lowercase words (so "The" and "the"
+    count as the same word), strip punctuation out of them ("court," becomes
+    "court") and drop stopwords -- common words like "the" and "of" that show
+    up everywhere and say little about what a document is about.
+    """
+    return Tokenizer(lowercase, strip_punctuation, stopwords)
+
+class Tokenizer(object):
+    """
+    The function make_tokenizer builds: call it with a document to get its
+    words. It's an object rather than a function defined inside make_tokenizer
+    so that it can be pickled, and sent to other processes along with the
+    model using it (as naivebayes.train_parallel does).
+    """
+    def __init__(self, lowercase=False, strip_punctuation=False, stopwords=None):
+        self.lowercase = lowercase
+        self.deletions = strip_punctuation and string.punctuation or None
+        self.stopwords = stopwords
+
+    def __call__(self, document):
+        lowercase, deletions, stopwords = self.lowercase, self.deletions, self.stopwords
+        words = []
+        for word in document.split():
+            if lowercase: word = word.lower()
+            if deletions: word = word.translate(None, deletions)
+            if not word: continue
+            if stopwords and word in stopwords: continue
+            words.append(word)
+        return words
+
+def read_stopwords(path):
+    """
+    Reads a stopword list with one word per line. Anything after the word on a
+    line (like the document counts in a df-filter.py report) is ignored.
+    """
+    with open(path) as f:
+        return set([line.split()[0] for line in f if line.strip()])
+
+def add_options(parser, prefix=''):
+    """
+    Adds the tokenizer's options to an OptionParser. prefix goes in front of
+    each option's help, for scripts whose options only apply to one command
+    (as in "query: lowercase every word").
+    """
+    def describe(text):
+        return prefix and prefix + text[0].lower() + text[1:] or text
+    parser.add_option('--lowercase', action='store_true', default=False,
+        help=describe('Lowercase every word'))
+    parser.add_option('--strip-punctuation', action='store_true', default=False,
+        help=describe('Remove punctuation from words'))
+    parser.add_option('--stopwords', metavar='FILE',
+        help=describe('Skip the words listed in FILE, one per line'))
+
+def from_options(options):
+    """
+    Builds a tokenizer from the options add_options() added.
+    """
+    stopwords = options.stopwords and read_stopwords(options.stopwords) or None
+    return make_tokenizer(options.lowercase, options.strip_punctuation, stopwords)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+
+import sys
+
+def read_mapper_input(stdin):
+    """
+    Generator to limit memory usage while reading input.
+    """
+    for line in stdin:
+        yield line.rstrip()
+
+def main(separator='\t'):
+    """
+    The first half of finding the most similar documents to each document (see
+    topk-reducer.py). Similarity is symmetric, so each document pair scored by
+    pairwise-reducer.py (or allpairs-reducer.py) is a neighbor of both of its
+    documents. This writes it out once for each of them, keyed by document.
+
+    Input:
+
+    "docid1|docid2"        15.0
+    ...
+
+    Output:
+
+    docid1      docid2      15.0
+    docid2      docid1      15.0
+    ...
+    """
+    for line in read_mapper_input(sys.stdin):
+        docset, score = line.split(separator, 1)
+        doc1, doc2 = docset.split('|')
+        print '%s\t%s\t%s' % (doc1, doc2, score)
+        print '%s\t%s\t%s' % (doc2, doc1, score)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+from itertools import groupby
+from operator import itemgetter
+import heapq, sys
+from optparse import OptionParser
+
+# The number of most similar documents to print for each document
+TOP_K = 20
+
+def read_mapper_output(file, separator):
+    """
+    Generator that yields lines from the mapper.
+    """
+    for line in file:
+        yield line.rstrip().split(separator, 2)
+
+class Neighbor(object):
+    """
+    A neighbor in the heap. One neighbor is weaker than another if its score
+    is lower, or if the scores are the same and its document ID is higher, so
+    ties are settled in favor of the lower document IDs.
+    """
+    __slots__ = ('value', 'docid', 'score')
+
+    def __init__(self, value, docid, score):
+        self.value = value
+        self.docid = docid
+        self.score = score
+
+    def __lt__(self, other):
+        return (self.value, other.docid) < (other.value, self.docid)
+
+def main(k=TOP_K, separator='\t'):
+    """
+    Prints the k most similar documents to each document, rather than every
+    pair whose score beats a threshold. A threshold that's a little too low can
+    mean hundreds of millions of lines of output; this prints at most k lines
+    per document, however similar the documents are to each other.
+
+    For each document, the best k neighbors seen so far are kept in a heap
+    (http://docs.python.org/library/heapq.html) with the weakest on top. Each
+    new neighbor only has to beat that one to get in, and pushes it out when it
+    does, so memory stays at k neighbors no matter how many a document has.
+
+    Input (from topk-mapper.py, sorted):
+
+    docid1      docid2      15.0
+    docid1      docid3      3.0
+    ...
+
+    Output, strongest neighbor first:
+
+    docid1      docid2      15.0
+    docid1      docid3      3.0
+    ...
+    """
+    data = read_mapper_output(sys.stdin, separator)
+
+    # Input from the mapper is sorted by key by map/reduce. This groups the
+    # input by document.
+    for docid, group in groupby(data, itemgetter(0)):
+        heap = []
+        for docid_inner, neighbor, score in group:
+            item = Neighbor(float(score), neighbor, score)
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif heap[0] < item:
+                heapq.heapreplace(heap, item)
+        # Best first, and ties in order of document ID
+        heap.sort(reverse=True)
+        for item in heap:
+            print '%s\t%s\t%s' % (docid, item.docid, item.score)
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-k', type='int', default=TOP_K,
+        help='Number of most similar documents to print for each (default: %default)')
+    (options, args) = parser.parse_args()
+    if options.k < 1:
+        parser.error('-k must be at least 1')
+    main(options.k)